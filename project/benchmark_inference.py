@@ -0,0 +1,249 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Inference Benchmark Suite
+-------------------------
+Measures the server's classification pipeline on the bundled DATASET/TEST
+images: model load time, decode, preprocess, single-image and batched inference
+latency percentiles, throughput across batch sizes and thread counts, and peak
+memory. Results are written as JSON so runs can be compared across commits.
+"""
+
+import os
+import sys
+import json
+import time
+import glob
+import random
+import platform
+import argparse
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Add server directory to path so we can import the app module
+sys.path.append(os.path.join(PROJECT_DIR, 'server'))
+
+import app as server
+
+
+def percentiles(samples):
+    """Summarise a list of durations (seconds) as millisecond percentiles"""
+    values = np.asarray(samples) * 1000.0
+    return {
+        "count": int(len(values)),
+        "mean": round(float(values.mean()), 3),
+        "p50": round(float(np.percentile(values, 50)), 3),
+        "p95": round(float(np.percentile(values, 95)), 3),
+        "p99": round(float(np.percentile(values, 99)), 3),
+    }
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+def predict_quietly(model, batch):
+    return model.predict(batch, verbose=0)
+
+
+def peak_rss_mb():
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+    except ImportError:
+        return None
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=PROJECT_DIR, stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except (subprocess.SubprocessError, OSError):
+        return None
+
+
+def load_image(path):
+    img = Image.open(path)
+    if img.mode != 'RGB':
+        img = img.convert('RGB')
+    else:
+        img.load()
+    return img
+
+
+def bench_decode(paths):
+    timings, images = [], []
+    for path in paths:
+        img, seconds = timed(load_image, path)
+        timings.append(seconds)
+        images.append(img)
+    return images, percentiles(timings)
+
+
+def bench_preprocess(images):
+    timings, arrays = [], []
+    for img in images:
+        array, seconds = timed(server.preprocess_image_for_cnn, img)
+        timings.append(seconds)
+        arrays.append(array)
+    return np.concatenate(arrays), percentiles(timings)
+
+
+def bench_batches(model, inputs, batch_sizes, repeats):
+    """Latency per batch and images/sec for each batch size"""
+    results = {}
+    for batch_size in batch_sizes:
+        if batch_size > len(inputs):
+            continue
+        timings = []
+        for _ in range(repeats):
+            for i in range(0, len(inputs) - batch_size + 1, batch_size):
+                _, seconds = timed(predict_quietly, model, inputs[i:i + batch_size])
+                timings.append(seconds)
+        stats = percentiles(timings)
+        stats["imagesPerSec"] = round(batch_size * len(timings) / sum(timings), 2)
+        results[str(batch_size)] = stats
+    return results
+
+
+def bench_threads(classify_fn, images, thread_counts):
+    """End-to-end classify throughput with N concurrent callers"""
+    results = {}
+    for threads in thread_counts:
+        latencies = []
+
+        def work(img):
+            _, seconds = timed(classify_fn, img)
+            latencies.append(seconds)
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            list(pool.map(work, images))
+        wall = time.perf_counter() - start
+
+        stats = percentiles(latencies)
+        stats["imagesPerSec"] = round(len(images) / wall, 2)
+        results[str(threads)] = stats
+    return results
+
+
+def run(args):
+    paths = sorted(glob.glob(os.path.join(args.test_dir, '*', '*.jpg')))
+    if not paths:
+        print(f"Error: no images found under {args.test_dir}")
+        sys.exit(1)
+    random.Random(args.seed).shuffle(paths)
+    paths = paths[:args.images]
+
+    results = {
+        "meta": {
+            "revision": git_revision(),
+            "timestamp": time.time(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpuCount": os.cpu_count(),
+            "tensorflow": server.TENSORFLOW_AVAILABLE,
+            "images": len(paths),
+            "seed": args.seed,
+        }
+    }
+
+    images, results["decode"] = bench_decode(paths)
+
+    if server.TENSORFLOW_AVAILABLE and os.path.exists(args.model):
+        _, results["modelLoadSeconds"] = timed(server.tf.keras.models.load_model, args.model)
+        model, results["modelLoadAndWarmupSeconds"] = timed(server.load_cnn_model, args.model)
+
+        inputs, results["preprocess"] = bench_preprocess(images)
+
+        single = []
+        for i in range(len(inputs)):
+            _, seconds = timed(predict_quietly, model, inputs[i:i + 1])
+            single.append(seconds)
+        results["singleInference"] = percentiles(single)
+        results["batchedInference"] = bench_batches(model, inputs, args.batch_sizes, args.repeats)
+        results["endToEndThreads"] = bench_threads(server.classify_with_cnn, images, args.threads)
+    else:
+        # Without TensorFlow the server answers with the fallback classifier
+        fallback = server.FALLBACK_MODEL or server.COLOUR_CLASSIFIER
+        results["fallback"] = type(fallback).__name__
+        results["endToEndThreads"] = bench_threads(lambda img: fallback.classify([img]), images, args.threads)
+        results["batchedFallback"] = {}
+        for batch_size in args.batch_sizes:
+            timings = []
+            for i in range(0, len(images) - batch_size + 1, batch_size):
+                _, seconds = timed(fallback.classify, images[i:i + batch_size])
+                timings.append(seconds)
+            if timings:
+                stats = percentiles(timings)
+                stats["imagesPerSec"] = round(batch_size * len(timings) / sum(timings), 2)
+                results["batchedFallback"][str(batch_size)] = stats
+
+    results["peakRssMb"] = peak_rss_mb()
+    return results
+
+
+def flatten(results, prefix=""):
+    """Flatten nested results into {"a.b.c": number} for comparison"""
+    flat = {}
+    for key, value in results.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten(value, f"{name}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+    return flat
+
+
+def compare(baseline, current):
+    """Print the relative change of every shared metric"""
+    old, new = flatten(baseline), flatten(current)
+    print(f"{'metric':<50} {'baseline':>12} {'current':>12} {'change':>8}")
+    for name in sorted(old.keys() & new.keys()):
+        if name.startswith("meta."):
+            continue
+        change = (new[name] - old[name]) / old[name] * 100 if old[name] else 0.0
+        print(f"{name:<50} {old[name]:>12.3f} {new[name]:>12.3f} {change:>7.1f}%")
+
+
+def main():
+    """Run the benchmark suite and write JSON results"""
+    parser = argparse.ArgumentParser(description='Benchmark waste classification inference')
+    parser.add_argument('--test_dir', type=str, default=os.path.join(PROJECT_DIR, '..', 'DATASET', 'TEST'))
+    parser.add_argument('--model', type=str, default=server.MODEL_PATH, help='Path to the .h5 model')
+    parser.add_argument('--images', type=int, default=200, help='Number of test images to use')
+    parser.add_argument('--batch_sizes', type=int, nargs='+', default=[1, 8, 32])
+    parser.add_argument('--threads', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--repeats', type=int, default=1, help='Passes over the images per batch size')
+    parser.add_argument('--seed', type=int, default=0, help='Seed for the image sample')
+    parser.add_argument('--output', type=str, help='Write results JSON to this file')
+    parser.add_argument('--compare', type=str, help='Baseline results JSON to compare against')
+
+    args = parser.parse_args()
+
+    results = run(args)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=4)
+        print(f"Results saved to {args.output}")
+    else:
+        print(json.dumps(results, indent=4))
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Embedding Index Builder
+-----------------------
+Extracts the full model's pooled MobileNetV2 features for every DATASET/TRAIN
+image and writes the embedding index the server uses for near-duplicate
+lookups and the similar-images API. IVF partitioning and PQ compression are
+optional; with neither, search is exact.
+"""
+
+import os
+import sys
+import time
+import argparse
+
+import numpy as np
+from PIL import Image
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(PROJECT_DIR)
+
+# Add server directory to path so we can import the app module
+sys.path.append(os.path.join(PROJECT_DIR, 'server'))
+
+import app as server
+from colour_fallback import list_images
+from embedding_index import EmbeddingIndex
+
+
+def embed_paths(embedding_model, paths, batch_size):
+    """Pooled embeddings for every readable image; returns (embeddings, kept indices)"""
+    size = server.model_input_size(embedding_model)
+    embeddings, kept = [], []
+    for start in range(0, len(paths), batch_size):
+        batch, batch_kept = [], []
+        for i, path in enumerate(paths[start:start + batch_size], start):
+            try:
+                img = Image.open(path).convert('RGB')
+            except Exception as e:
+                print(f"Skipping {path}: {e}")
+                continue
+            batch.append(server.preprocess_image_for_cnn(img, size))
+            batch_kept.append(i)
+        if batch:
+            features, _ = embedding_model.predict(np.concatenate(batch), verbose=0)
+            embeddings.append(features)
+            kept.extend(batch_kept)
+        print(f"\rEmbedded {min(start + batch_size, len(paths))}/{len(paths)} images", end='', flush=True)
+    print()
+    return np.concatenate(embeddings), kept
+
+
+def main():
+    """Build the embedding index over the training images"""
+    parser = argparse.ArgumentParser(description='Build the embedding index used for near-duplicate lookups')
+    parser.add_argument('--train_dir', type=str, default=os.path.join(REPO_DIR, 'DATASET', 'TRAIN'))
+    parser.add_argument('--model', type=str, default=server.MODEL_PATH, help='Path to the .h5 model')
+    parser.add_argument('--output', type=str, default=server.EMBEDDING_INDEX_PATH)
+    parser.add_argument('--nlist', type=int, default=0, help='IVF partitions (0 = exact search)')
+    parser.add_argument('--nprobe', type=int, default=8, help='Partitions searched per query')
+    parser.add_argument('--pq_m', type=int, default=0,
+                        help='PQ sub-vectors, i.e. bytes per stored vector (0 = keep float32 vectors)')
+    parser.add_argument('--limit', type=int, help='Images per category')
+    parser.add_argument('--batch_size', type=int, default=32)
+
+    args = parser.parse_args()
+
+    if not server.TENSORFLOW_AVAILABLE:
+        print("Error: TensorFlow is required to extract embeddings")
+        sys.exit(1)
+
+    model = server.load_keras_model(args.model)
+    if model is None:
+        print(f"Error: could not load model from {args.model}")
+        sys.exit(1)
+    embedding_model = server.build_embedding_model(model)
+
+    paths, categories = list_images(args.train_dir, args.limit)
+    if not paths:
+        print(f"Error: no images found under {args.train_dir}")
+        sys.exit(1)
+
+    start = time.perf_counter()
+    embeddings, kept = embed_paths(embedding_model, paths, args.batch_size)
+    print(f"Extracted {len(kept)} embeddings in {time.perf_counter() - start:.1f}s")
+
+    index = EmbeddingIndex(embeddings.shape[1], nlist=args.nlist, pq_m=args.pq_m, nprobe=args.nprobe)
+    if args.nlist or args.pq_m:
+        print(f"Training index (nlist={args.nlist}, pq_m={args.pq_m})...")
+        index.train(embeddings)
+
+    items = [
+        {"category": categories[i], "source": "dataset", "path": os.path.relpath(paths[i], REPO_DIR)}
+        for i in kept
+    ]
+    index.add(embeddings, items)
+    index.save(args.output)
+
+    # Recall of the compressed index against exact search on a sample of queries
+    if args.nlist or args.pq_m:
+        exact = EmbeddingIndex(embeddings.shape[1])
+        exact.add(embeddings, items)
+        sample = np.random.default_rng(0).choice(len(embeddings), min(200, len(embeddings)), replace=False)
+        hits = sum(
+            index.search(embeddings[i], k=1)[0][1] == exact.search(embeddings[i], k=1)[0][1]
+            for i in sample
+        )
+        print(f"Recall@1 against exact search: {hits / len(sample):.3f}")
+
+    print(f"Index with {len(index)} items saved to {args.output} ({index.stats()['bytesPerVector']} bytes per vector)")
+
+
+if __name__ == "__main__":
+    main()
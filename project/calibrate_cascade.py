@@ -0,0 +1,145 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Cascade Calibration
+-------------------
+Runs the small (fast) model and the full model over DATASET/TEST and picks the
+lowest confidence threshold at which the two-stage cascade still reaches a
+target accuracy. Images the small model is less confident about than the
+threshold are forwarded to the full model. The chosen threshold is saved where
+the server reads it, along with the expected forward rate and compute savings.
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+
+import numpy as np
+from PIL import Image
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Add server directory to path so we can import the app module
+sys.path.append(os.path.join(PROJECT_DIR, 'server'))
+
+import app as server
+from colour_fallback import list_images
+
+
+def predict_all(model, images, batch_size):
+    """Class probabilities for every image, preprocessed the way the server does"""
+    size = server.model_input_size(model)
+    inputs = np.concatenate([server.preprocess_image_for_cnn(img, size) for img in images])
+    return model.predict(inputs, batch_size=batch_size, verbose=0)
+
+
+def single_image_seconds(model, images, samples):
+    """Mean latency of a batch-of-one prediction, which is how the server calls the model"""
+    size = server.model_input_size(model)
+    inputs = [server.preprocess_image_for_cnn(img, size) for img in images[:samples]]
+    model.predict(inputs[0], verbose=0)
+    start = time.perf_counter()
+    for x in inputs:
+        model.predict(x, verbose=0)
+    return (time.perf_counter() - start) / len(inputs)
+
+
+def sweep(small_probs, large_probs, labels, small_cost, large_cost):
+    """Cascade accuracy, forward rate and cost for every candidate threshold"""
+    small_pred = small_probs.argmax(axis=1)
+    large_pred = large_probs.argmax(axis=1)
+    confidence = small_probs.max(axis=1) * 100
+
+    rows = []
+    for threshold in np.arange(0, 100.5, 0.5):
+        forwarded = confidence < threshold
+        pred = np.where(forwarded, large_pred, small_pred)
+        forward_rate = float(forwarded.mean())
+        cost = small_cost + forward_rate * large_cost
+        rows.append({
+            "threshold": float(threshold),
+            "accuracy": float((pred == labels).mean()),
+            "forwardRate": round(forward_rate, 4),
+            "savings": round(1 - cost / large_cost, 4),
+        })
+    return rows
+
+
+def main():
+    """Calibrate the cascade threshold and write it for the server"""
+    parser = argparse.ArgumentParser(description='Calibrate the small/full model cascade threshold')
+    parser.add_argument('--test_dir', type=str, default=os.path.join(PROJECT_DIR, '..', 'DATASET', 'TEST'))
+    parser.add_argument('--small_model', type=str, default=server.FAST_MODEL_PATH)
+    parser.add_argument('--large_model', type=str, default=server.MODEL_PATH)
+    parser.add_argument('--target_accuracy', type=float,
+                        help='Required cascade accuracy (default: full model accuracy minus --tolerance)')
+    parser.add_argument('--tolerance', type=float, default=0.005,
+                        help='Accuracy the cascade may give up relative to the full model')
+    parser.add_argument('--limit', type=int, help='Images per category')
+    parser.add_argument('--batch_size', type=int, default=32)
+    parser.add_argument('--latency_samples', type=int, default=50, help='Images used to time each model')
+    parser.add_argument('--output', type=str, default=server.CASCADE_CALIBRATION_PATH)
+
+    args = parser.parse_args()
+
+    if not server.TENSORFLOW_AVAILABLE:
+        print("Error: TensorFlow is required to calibrate the cascade")
+        sys.exit(1)
+
+    small = server.load_keras_model(args.small_model)
+    large = server.load_keras_model(args.large_model)
+    if small is None or large is None:
+        print("Error: both the small and the large model must exist")
+        sys.exit(1)
+
+    paths, categories = list_images(args.test_dir, args.limit)
+    if not paths:
+        print(f"Error: no images found under {args.test_dir}")
+        sys.exit(1)
+    images = [Image.open(path).convert('RGB') for path in paths]
+    labels = np.array([server.CNN_CLASS_NAMES.index(c) for c in categories])
+
+    print(f"Running both models over {len(images)} images...")
+    small_probs = predict_all(small, images, args.batch_size)
+    large_probs = predict_all(large, images, args.batch_size)
+    small_cost = single_image_seconds(small, images, args.latency_samples)
+    large_cost = single_image_seconds(large, images, args.latency_samples)
+
+    small_accuracy = float((small_probs.argmax(axis=1) == labels).mean())
+    large_accuracy = float((large_probs.argmax(axis=1) == labels).mean())
+    target = args.target_accuracy if args.target_accuracy is not None else large_accuracy - args.tolerance
+
+    rows = sweep(small_probs, large_probs, labels, small_cost, large_cost)
+    # Lowest threshold forwards the fewest images; 100 forwards everything
+    chosen = next((row for row in rows if row["accuracy"] >= target), rows[-1])
+
+    report = {
+        "threshold": chosen["threshold"],
+        "targetAccuracy": round(target, 4),
+        "expectedAccuracy": round(chosen["accuracy"], 4),
+        "forwardRate": chosen["forwardRate"],
+        "expectedSavings": chosen["savings"],
+        "smallModelAccuracy": round(small_accuracy, 4),
+        "largeModelAccuracy": round(large_accuracy, 4),
+        "smallModelMs": round(small_cost * 1000, 3),
+        "largeModelMs": round(large_cost * 1000, 3),
+        "images": len(images),
+        "smallModel": os.path.basename(args.small_model),
+        "largeModel": os.path.basename(args.large_model),
+    }
+
+    print(json.dumps(report, indent=4))
+    if chosen["accuracy"] < target:
+        print("Warning: no threshold reaches the target, every image will be forwarded")
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, 'w') as f:
+        json.dump(dict(report, sweep=rows), f, indent=4)
+    print(f"Calibration saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Colour Fallback Tools
+---------------------
+Fits the thresholds of the colour-heuristic classifier used by the server when
+TensorFlow is not installed, and benchmarks its throughput in images/sec.
+"""
+
+import os
+import sys
+import json
+import time
+import glob
+import argparse
+from multiprocessing import Pool
+
+import numpy as np
+
+# Add server directory to path so we can import the colour_classifier module
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'server'))
+
+from colour_classifier import (
+    ColourHeuristicClassifier, FOLDER_CATEGORIES, colour_features, load_thumbnail
+)
+
+DEFAULT_OUTPUT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'models', 'colour_thresholds.json')
+
+
+def list_images(data_dir, limit=None):
+    """Return (paths, labels) for every known category folder under data_dir"""
+    paths, labels = [], []
+    for folder, category in FOLDER_CATEGORIES.items():
+        files = sorted(glob.glob(os.path.join(data_dir, folder, '*.jpg')))
+        if limit:
+            files = files[:limit]
+        paths.extend(files)
+        labels.extend([category] * len(files))
+    return paths, labels
+
+
+def _safe_thumbnail(path):
+    try:
+        return load_thumbnail(path)
+    except Exception:
+        return None
+
+
+def load_features(paths, labels, workers):
+    """Decode images in a process pool and compute their colour features"""
+    with Pool(workers) as pool:
+        thumbnails = pool.map(_safe_thumbnail, paths, chunksize=64)
+    keep = [i for i, t in enumerate(thumbnails) if t is not None]
+    if len(keep) < len(paths):
+        print(f"Skipped {len(paths) - len(keep)} unreadable images")
+    batch = np.stack([thumbnails[i] for i in keep])
+    return colour_features(batch), np.array([labels[i] for i in keep])
+
+
+def fit(args):
+    paths, labels = list_images(args.train_dir, args.limit)
+    if not paths:
+        print(f"Error: no images found under {args.train_dir}")
+        sys.exit(1)
+
+    print(f"Extracting colour features from {len(paths)} images...")
+    features, labels = load_features(paths, labels, args.workers)
+
+    classifier = ColourHeuristicClassifier()
+    baseline = classifier.score(features, labels)
+    accuracy = classifier.fit(features, labels)
+    # What always answering the most common category would score
+    categories, counts = np.unique(labels, return_counts=True)
+    majority = counts.max() / len(labels)
+
+    print(f"Default thresholds accuracy: {baseline:.4f}")
+    print(f"Fitted thresholds accuracy:  {accuracy:.4f}")
+    print(f"Majority class accuracy:     {majority:.4f} ({categories[counts.argmax()]})")
+    print(json.dumps(classifier.thresholds, indent=4))
+
+    # The rules always map some colours to each category, so a dataset missing
+    # a category (e.g. only O and R) can score below chance however they're tuned
+    if accuracy <= majority:
+        print(f"Error: the fitted thresholds don't beat the majority class, not saving them to {args.output}")
+        sys.exit(1)
+
+    classifier.save(args.output, trainAccuracy=accuracy, majorityAccuracy=majority, samples=int(len(labels)))
+    print(f"Thresholds saved to {args.output}")
+
+
+def benchmark(args):
+    paths, _ = list_images(args.test_dir, args.limit)
+    if not paths:
+        print(f"Error: no images found under {args.test_dir}")
+        sys.exit(1)
+
+    classifier = ColourHeuristicClassifier.from_file(args.output)
+
+    # Decode and downscale, single process
+    start = time.perf_counter()
+    thumbnails = [load_thumbnail(path) for path in paths]
+    decode_seconds = time.perf_counter() - start
+    batch = np.stack(thumbnails)
+
+    results = {
+        "images": len(paths),
+        "decodeImagesPerSec": round(len(paths) / decode_seconds, 1),
+        "classifyImagesPerSec": {},
+    }
+
+    fastest = float('inf')
+    for batch_size in args.batch_sizes:
+        start = time.perf_counter()
+        for i in range(0, len(batch), batch_size):
+            classifier.classify_features(colour_features(batch[i:i + batch_size]))
+        seconds = time.perf_counter() - start
+        fastest = min(fastest, seconds)
+        results["classifyImagesPerSec"][str(batch_size)] = round(len(batch) / seconds, 1)
+
+    results["endToEndImagesPerSec"] = round(len(paths) / (decode_seconds + fastest), 1)
+    print(json.dumps(results, indent=4))
+
+
+def main():
+    """Fit or benchmark the colour fallback classifier"""
+    parser = argparse.ArgumentParser(description='Fit and benchmark the colour fallback classifier')
+    parser.add_argument('command', choices=['fit', 'benchmark'])
+    parser.add_argument('--train_dir', type=str, default='DATASET/TRAIN', help='Labelled images used to fit thresholds')
+    parser.add_argument('--test_dir', type=str, default='DATASET/TEST', help='Images used for the benchmark')
+    parser.add_argument('--output', type=str, default=DEFAULT_OUTPUT, help='Thresholds JSON file')
+    parser.add_argument('--limit', type=int, default=None, help='Maximum images per category')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Decode processes used when fitting')
+    parser.add_argument('--batch_sizes', type=int, nargs='+', default=[1, 32, 256, 1024])
+
+    args = parser.parse_args()
+
+    if args.command == 'fit':
+        fit(args)
+    else:
+        benchmark(args)
+
+
+if __name__ == "__main__":
+    main()
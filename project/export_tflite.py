@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+TFLite Export
+-------------
+Converts the server's Keras models to .tflite flatbuffers saved next to them,
+which the server maps read-only when started with MODEL_FORMAT=tflite. The
+converted model is checked against the Keras model on a few DATASET/TEST images
+before it is written. A conversion whose top-1 agreement falls below
+--min_agreement is discarded and the script exits with an error.
+"""
+
+import os
+import sys
+import argparse
+
+import numpy as np
+from PIL import Image
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Add server directory to path so we can import the app module
+sys.path.append(os.path.join(PROJECT_DIR, 'server'))
+
+import app as server
+from colour_fallback import list_images
+from tflite_model import TFLiteModel
+
+
+def convert(model, quantize):
+    """Flatbuffer bytes for a Keras model, optionally with int8 dynamic-range weights"""
+    converter = server.tf.lite.TFLiteConverter.from_keras_model(model)
+    if quantize:
+        converter.optimizations = [server.tf.lite.Optimize.DEFAULT]
+    return converter.convert()
+
+
+def main():
+    """Convert the full and fast models and compare their predictions"""
+    parser = argparse.ArgumentParser(description='Convert Keras models to memory-mappable TFLite files')
+    parser.add_argument('--models', nargs='+', default=[server.MODEL_PATH, server.FAST_MODEL_PATH],
+                        help='.h5 models to convert; missing ones are skipped')
+    parser.add_argument('--test_dir', type=str, default=os.path.join(PROJECT_DIR, '..', 'DATASET', 'TEST'))
+    parser.add_argument('--samples', type=int, default=32, help='Test images used to compare predictions')
+    parser.add_argument('--quantize', action='store_true',
+                        help='Store weights as int8 (about 4x smaller, small accuracy cost)')
+    parser.add_argument('--min_agreement', type=float, default=0.95,
+                        help='Lowest top-1 agreement with Keras on the test images for a model to be written')
+
+    args = parser.parse_args()
+
+    if not server.TENSORFLOW_AVAILABLE:
+        print("Error: TensorFlow is required to convert models")
+        sys.exit(1)
+
+    paths, _ = list_images(args.test_dir, max(1, args.samples // 3))
+    images = [Image.open(path).convert('RGB') for path in paths[:args.samples]]
+
+    for model_path in args.models:
+        if not os.path.exists(model_path):
+            print(f"Skipping {model_path}: not found")
+            continue
+        model = server.load_keras_model(model_path)
+        if model is None:
+            print(f"Error: could not load model from {model_path}")
+            sys.exit(1)
+
+        output = os.path.splitext(model_path)[0] + '.tflite'
+        tmp_path = f"{output}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(convert(model, args.quantize))
+
+        # The server must give the same answers whichever format it loads
+        agreement = None
+        if images:
+            size = server.model_input_size(model)
+            inputs = np.concatenate([server.preprocess_image_for_cnn(img, size) for img in images])
+            keras_pred = model.predict(inputs, verbose=0).argmax(axis=1)
+            tflite_pred = TFLiteModel(tmp_path).predict(inputs).argmax(axis=1)
+            agreement = float((keras_pred == tflite_pred).mean())
+        else:
+            print(f"Warning: no test images in {args.test_dir}, {output} is written unchecked")
+
+        if agreement is not None and agreement < args.min_agreement:
+            os.remove(tmp_path)
+            print(f"Error: {model_path} converted with top-1 agreement {agreement:.3f} on {len(images)} test images, "
+                  f"below --min_agreement {args.min_agreement}; {output} was not written")
+            sys.exit(1)
+        os.replace(tmp_path, output)
+
+        h5_mb = os.path.getsize(model_path) / 1e6
+        tflite_mb = os.path.getsize(output) / 1e6
+        print(f"{model_path} ({h5_mb:.1f} MB) -> {output} ({tflite_mb:.1f} MB)")
+        if agreement is not None:
+            print(f"  Top-1 agreement with Keras on {len(images)} test images: {agreement:.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,221 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+API Load Test
+-------------
+Drives /api/classify, /api/health and /api/sample-image with a configurable
+number of concurrent clients using real DATASET images, then reports
+throughput, latency percentiles and error rates per endpoint.
+
+Run the server with MODEL_BACKEND=stub to isolate web-stack overhead from
+model cost:
+
+    MODEL_BACKEND=stub STUB_LATENCY_MS=20 python server/app.py
+    python load_test.py --concurrency 16 --duration 30
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import glob
+import base64
+import random
+import argparse
+import threading
+import http.client
+from urllib.parse import urlparse
+from collections import defaultdict
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+SAMPLE_CATEGORIES = ['Recyclable', 'Biodegradable', 'Non-recyclable']
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(q / 100.0 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def load_payloads(image_dir, count, max_side, seed):
+    """Build base64 JSON bodies from dataset images, optionally resized"""
+    paths = sorted(glob.glob(os.path.join(image_dir, '*', '*.jpg')))
+    if not paths:
+        print(f"Error: no images found under {image_dir}")
+        sys.exit(1)
+    random.Random(seed).shuffle(paths)
+
+    payloads = []
+    for path in paths[:count]:
+        with open(path, 'rb') as f:
+            data = f.read()
+        if max_side:
+            # Pillow is only needed when resizing payloads
+            from PIL import Image
+            img = Image.open(io.BytesIO(data)).convert('RGB')
+            scale = max_side / max(img.size)
+            img = img.resize((max(1, int(img.width * scale)), max(1, int(img.height * scale))))
+            buffer = io.BytesIO()
+            img.save(buffer, format='JPEG', quality=90)
+            data = buffer.getvalue()
+        body = json.dumps({"image": "data:image/jpeg;base64," + base64.b64encode(data).decode('ascii')})
+        payloads.append(body.encode('utf-8'))
+    return payloads
+
+
+def parse_mix(mix):
+    """Parse 'classify=8,health=1,sample=1' into a weighted choice list"""
+    weights = {}
+    for part in mix.split(','):
+        name, _, weight = part.partition('=')
+        if name not in ('classify', 'health', 'sample'):
+            raise argparse.ArgumentTypeError(f"Unknown endpoint in mix: {name}")
+        weights[name] = int(weight or 1)
+    return [name for name, weight in weights.items() for _ in range(weight)]
+
+
+class Results:
+    """Thread-safe collection of per-endpoint latencies and outcomes"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.statuses = defaultdict(lambda: defaultdict(int))
+        self.errors = defaultdict(int)
+        self.bytes_sent = 0
+
+    def add(self, endpoint, seconds, status, sent):
+        with self._lock:
+            self.latencies[endpoint].append(seconds)
+            self.statuses[endpoint][status] += 1
+            self.bytes_sent += sent
+            if not isinstance(status, int) or status >= 400:
+                self.errors[endpoint] += 1
+
+    def summary(self, wall_seconds):
+        report = {"wallSeconds": round(wall_seconds, 2), "endpoints": {}}
+        total = 0
+        for endpoint, values in self.latencies.items():
+            values = sorted(values)
+            total += len(values)
+            report["endpoints"][endpoint] = {
+                "requests": len(values),
+                "requestsPerSec": round(len(values) / wall_seconds, 2),
+                "errorRate": round(self.errors[endpoint] / len(values), 4),
+                "statuses": {str(k): v for k, v in self.statuses[endpoint].items()},
+                "latencyMs": {
+                    "p50": round(percentile(values, 50) * 1000, 2),
+                    "p95": round(percentile(values, 95) * 1000, 2),
+                    "p99": round(percentile(values, 99) * 1000, 2),
+                    "max": round(values[-1] * 1000, 2),
+                },
+            }
+        report["totalRequests"] = total
+        report["totalRequestsPerSec"] = round(total / wall_seconds, 2)
+        report["uploadMbPerSec"] = round(self.bytes_sent / wall_seconds / 1e6, 2)
+        return report
+
+
+def worker(url, mix, payloads, deadline, max_requests, counter, results, timeout, seed, accept):
+    rng = random.Random(seed)
+    conn = None
+    while time.time() < deadline:
+        with counter['lock']:
+            if max_requests and counter['sent'] >= max_requests:
+                return
+            counter['sent'] += 1
+
+        endpoint = rng.choice(mix)
+        if endpoint == 'classify':
+            method, path, body = 'POST', '/api/classify', rng.choice(payloads)
+        elif endpoint == 'health':
+            method, path, body = 'GET', '/api/health', None
+        else:
+            method, path, body = 'GET', f"/api/sample-image/{rng.choice(SAMPLE_CATEGORIES)}", None
+
+        headers = {'Content-Type': 'application/json'} if body else {}
+        if endpoint == 'classify':
+            headers['Accept'] = accept
+        start = time.perf_counter()
+        try:
+            if conn is None:
+                conn = http.client.HTTPConnection(url.hostname, url.port or 80, timeout=timeout)
+            conn.request(method, path, body=body, headers=headers)
+            response = conn.getresponse()
+            response.read()
+            status = response.status
+            if response.getheader('Connection', '').lower() == 'close' or response.version == 10:
+                conn.close()
+                conn = None
+        except Exception as e:
+            status = type(e).__name__
+            if conn is not None:
+                conn.close()
+            conn = None
+        results.add(endpoint, time.perf_counter() - start, status, len(body) if body else 0)
+
+
+def main():
+    """Run the load test and print a JSON report"""
+    parser = argparse.ArgumentParser(description='Load test the waste classification API')
+    parser.add_argument('--url', type=str, default='http://localhost:5000', help='Server base URL')
+    parser.add_argument('--concurrency', type=int, default=8, help='Number of concurrent clients')
+    parser.add_argument('--duration', type=float, default=30, help='Test length in seconds')
+    parser.add_argument('--requests', type=int, default=0, help='Stop after this many requests (0 = no limit)')
+    parser.add_argument('--mix', type=parse_mix, default=parse_mix('classify=8,health=1,sample=1'),
+                        help='Weighted endpoint mix, e.g. classify=8,health=1,sample=1')
+    parser.add_argument('--image_dir', type=str, default=os.path.join(PROJECT_DIR, '..', 'DATASET', 'TEST'))
+    parser.add_argument('--images', type=int, default=50, help='Number of distinct images to upload')
+    parser.add_argument('--max_side', type=int, default=0,
+                        help='Resize uploads so the longest side is this many pixels (0 = original files)')
+    parser.add_argument('--timeout', type=float, default=30, help='Per-request timeout in seconds')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--accept', type=str, default='application/json',
+                        help='Accept header for classify, e.g. application/msgpack')
+    parser.add_argument('--output', type=str, help='Write the JSON report to this file')
+
+    args = parser.parse_args()
+    url = urlparse(args.url)
+
+    payloads = load_payloads(args.image_dir, args.images, args.max_side, args.seed) if 'classify' in args.mix else []
+    if payloads:
+        sizes = sorted(len(p) for p in payloads)
+        print(f"Loaded {len(payloads)} payloads, median body {sizes[len(sizes) // 2] / 1024:.1f} KiB")
+
+    results = Results()
+    counter = {'lock': threading.Lock(), 'sent': 0}
+    deadline = time.time() + args.duration
+    threads = [
+        threading.Thread(
+            target=worker,
+            args=(url, args.mix, payloads, deadline, args.requests, counter, results, args.timeout, args.seed + i,
+                  args.accept),
+            daemon=True
+        )
+        for i in range(args.concurrency)
+    ]
+
+    print(f"Running {args.concurrency} clients against {args.url} for up to {args.duration}s...")
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    report = results.summary(time.perf_counter() - start)
+    report["config"] = {
+        "url": args.url, "concurrency": args.concurrency,
+        "mix": {name: args.mix.count(name) for name in dict.fromkeys(args.mix)},
+        "images": len(payloads), "maxSide": args.max_side, "accept": args.accept,
+    }
+
+    print(json.dumps(report, indent=4))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=4)
+
+
+if __name__ == "__main__":
+    main()
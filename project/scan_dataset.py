@@ -0,0 +1,224 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Dataset Integrity Scan
+----------------------
+Checks every image under DATASET/ in a process pool. For each file it verifies
+the image decodes, records its dimensions and size, and computes a 64-bit
+difference hash (dHash). It then reports perceptual duplicates within each
+split and train/test leakage.
+
+Results go to DATASET/manifest.json. Its "skip" list is read by
+waste_classifier.py and the server, so bad files are left out without being
+re-checked. Unchanged files keep their manifest entry on the next scan.
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+from multiprocessing import Pool
+from collections import defaultdict
+
+from PIL import Image
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_DATA_DIR = os.path.join(PROJECT_DIR, '..', 'DATASET')
+MANIFEST_NAME = 'manifest.json'
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.gif', '.webp')
+HASH_BITS = 64
+
+
+def dhash(img):
+    """64-bit difference hash: brightness gradients of a 9x8 greyscale thumbnail"""
+    small = img.convert('L').resize((9, 8), Image.BILINEAR)
+    pixels = list(small.getdata())
+    value = 0
+    for row in range(8):
+        for col in range(8):
+            left, right = pixels[row * 9 + col], pixels[row * 9 + col + 1]
+            value = (value << 1) | (left > right)
+    return value
+
+
+def scan_file(args):
+    """Inspect one file; returns its manifest entry"""
+    path, rel_path = args
+    stat = os.stat(path)
+    entry = {'path': rel_path, 'bytes': stat.st_size, 'mtime': stat.st_mtime}
+    try:
+        # verify() catches truncated and corrupt files without decoding pixels
+        with Image.open(path) as img:
+            img.verify()
+        with Image.open(path) as img:
+            entry.update(format=img.format, width=img.width, height=img.height, mode=img.mode)
+            # Hashing only needs a tiny image, so let JPEG decode at reduced size
+            img.draft('RGB', (64, 64))
+            entry['hash'] = f"{dhash(img):016x}"
+        entry['status'] = 'ok'
+    except Exception as e:
+        entry.update(status='corrupt', error=str(e))
+    return entry
+
+
+def list_files(data_dir):
+    """All image files under the split/category folders, relative to data_dir"""
+    files = []
+    for root, _, names in os.walk(data_dir):
+        for name in sorted(names):
+            if name.lower().endswith(IMAGE_EXTENSIONS):
+                path = os.path.join(root, name)
+                files.append((path, os.path.relpath(path, data_dir).replace(os.sep, '/')))
+    return sorted(files, key=lambda f: f[1])
+
+
+def load_manifest(data_dir):
+    """Return the manifest dict for a dataset directory, or None if it hasn't been scanned"""
+    try:
+        with open(os.path.join(data_dir, MANIFEST_NAME)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def popcount(value):
+    return bin(value).count('1')
+
+
+def find_duplicates(entries, max_distance):
+    """Pairs of entries whose hashes differ in at most max_distance bits.
+
+    Splitting the hash into max_distance + 1 bands means any such pair matches
+    exactly on at least one band, so only files sharing a band are compared.
+    """
+    hashed = [(int(e['hash'], 16), e['path']) for e in entries if e.get('hash')]
+    bands = max_distance + 1
+    width = HASH_BITS // bands
+    pairs = {}
+    for band in range(bands):
+        shift = band * width
+        bits = HASH_BITS - shift if band == bands - 1 else width
+        mask = (1 << bits) - 1
+        buckets = defaultdict(list)
+        for value, path in hashed:
+            buckets[(value >> shift) & mask].append((value, path))
+        for bucket in buckets.values():
+            for i in range(len(bucket)):
+                for j in range(i + 1, len(bucket)):
+                    distance = popcount(bucket[i][0] ^ bucket[j][0])
+                    if distance <= max_distance:
+                        pairs[tuple(sorted((bucket[i][1], bucket[j][1])))] = distance
+    return sorted((a, b, d) for (a, b), d in pairs.items())
+
+
+def split_of(path):
+    return path.split('/', 1)[0]
+
+
+def main():
+    """Scan the dataset and write the manifest"""
+    parser = argparse.ArgumentParser(description='Validate dataset images and find duplicates')
+    parser.add_argument('--data_dir', type=str, default=DEFAULT_DATA_DIR, help='Dataset root with TRAIN/ and TEST/')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Scanner processes')
+    parser.add_argument('--max_mb', type=float, default=2.0, help='Skip files larger than this')
+    parser.add_argument('--max_ratio', type=float, default=10.0,
+                        help='Skip files more than this many times the median file size')
+    parser.add_argument('--max_pixels', type=int, default=16_000_000, help='Skip images with more pixels than this')
+    parser.add_argument('--min_side', type=int, default=32, help='Skip images with a side shorter than this')
+    parser.add_argument('--hamming', type=int, default=4, help='Max hash distance counted as a duplicate')
+    parser.add_argument('--skip_duplicates', action='store_true',
+                        help='Also skip the later copy of duplicates within a split')
+    parser.add_argument('--skip_leaked', action='store_true',
+                        help='Also skip TEST images that duplicate a TRAIN image')
+    parser.add_argument('--rescan', action='store_true', help='Ignore the previous manifest and check every file')
+
+    args = parser.parse_args()
+    data_dir = os.path.abspath(args.data_dir)
+
+    files = list_files(data_dir)
+    if not files:
+        print(f"Error: no images found under {data_dir}")
+        sys.exit(1)
+
+    # Reuse entries for files whose size and mtime haven't changed
+    previous = {} if args.rescan else {e['path']: e for e in (load_manifest(data_dir) or {}).get('files', [])}
+    entries, to_scan = {}, []
+    for path, rel_path in files:
+        old = previous.get(rel_path)
+        stat = os.stat(path)
+        if old and old.get('bytes') == stat.st_size and old.get('mtime') == stat.st_mtime:
+            entries[rel_path] = old
+        else:
+            to_scan.append((path, rel_path))
+
+    print(f"Scanning {len(to_scan)} of {len(files)} files with {args.workers} workers...")
+    start = time.perf_counter()
+    with Pool(args.workers) as pool:
+        for entry in pool.imap_unordered(scan_file, to_scan, chunksize=64):
+            entries[entry['path']] = entry
+    print(f"Scanned in {time.perf_counter() - start:.1f}s")
+
+    # Size limits are applied here so changing them doesn't need a rescan
+    sizes = sorted(e['bytes'] for e in entries.values())
+    max_bytes = min(args.max_mb * 1e6, args.max_ratio * sizes[len(sizes) // 2])
+    for entry in entries.values():
+        if entry['status'] == 'corrupt':
+            continue
+        pixels = entry['width'] * entry['height']
+        if entry['bytes'] > max_bytes or pixels > args.max_pixels:
+            entry['status'] = 'oversized'
+        elif min(entry['width'], entry['height']) < args.min_side:
+            entry['status'] = 'undersized'
+        else:
+            entry['status'] = 'ok'
+
+    ordered = [entries[rel_path] for _, rel_path in files]
+    pairs = find_duplicates([e for e in ordered if e['status'] != 'corrupt'], args.hamming)
+    duplicates = [{'a': a, 'b': b, 'distance': d} for a, b, d in pairs if split_of(a) == split_of(b)]
+    leaked = [{'train': a if split_of(a) == 'TRAIN' else b, 'test': b if split_of(a) == 'TRAIN' else a, 'distance': d}
+              for a, b, d in pairs if {split_of(a), split_of(b)} == {'TRAIN', 'TEST'}]
+
+    skip = {e['path'] for e in ordered if e['status'] != 'ok'}
+    if args.skip_duplicates:
+        skip.update(pair['b'] for pair in duplicates)
+    if args.skip_leaked:
+        skip.update(pair['test'] for pair in leaked)
+
+    summary = {
+        'files': len(ordered),
+        'byStatus': {status: sum(e['status'] == status for e in ordered)
+                     for status in ('ok', 'corrupt', 'oversized', 'undersized')},
+        'medianBytes': sizes[len(sizes) // 2],
+        'maxBytes': sizes[-1],
+        'duplicatePairs': len(duplicates),
+        'leakedPairs': len(leaked),
+        'skipped': len(skip),
+    }
+    manifest = {
+        'generated': time.time(),
+        'settings': {'maxMb': args.max_mb, 'maxRatio': args.max_ratio, 'maxPixels': args.max_pixels,
+                     'minSide': args.min_side, 'hamming': args.hamming},
+        'summary': summary,
+        'skip': sorted(skip),
+        'duplicates': duplicates,
+        'leaked': leaked,
+        'files': ordered,
+    }
+
+    output = os.path.join(data_dir, MANIFEST_NAME)
+    tmp_path = f"{output}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f)
+    os.replace(tmp_path, output)
+
+    print(json.dumps(summary, indent=4))
+    for entry in ordered:
+        if entry['status'] != 'ok':
+            print(f"{entry['status']:>10}  {entry['path']}  ({entry['bytes'] / 1e6:.2f} MB)")
+    print(f"Manifest saved to {output}")
+
+
+if __name__ == "__main__":
+    main()
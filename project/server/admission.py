@@ -0,0 +1,110 @@
+"""
+Admission Control
+-----------------
+Bounds how many inferences run at once and how many requests may wait for a
+slot. Requests beyond the wait queue are rejected immediately, and waiting
+requests give up after a timeout, so latency and memory stay predictable when
+the server is saturated.
+"""
+
+import math
+import time
+import threading
+from contextlib import contextmanager
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request can't be admitted; carries the HTTP status to send"""
+
+    def __init__(self, status, reason, retry_after):
+        super().__init__(reason)
+        self.status = status
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """Counting semaphore with a bounded, time-limited wait queue"""
+
+    def __init__(self, max_in_flight=4, max_queue=16, queue_timeout=5.0):
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+
+        self._cond = threading.Condition()
+        self.in_flight = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected_full = 0
+        self.rejected_timeout = 0
+        # Exponentially weighted average service time, used for Retry-After
+        self.avg_service_time = 0.5
+
+    def retry_after(self):
+        """Seconds a rejected client should wait before retrying"""
+        backlog = (self.waiting + self.in_flight) / max(1, self.max_in_flight)
+        return max(1, math.ceil(backlog * self.avg_service_time))
+
+    def acquire(self):
+        with self._cond:
+            if self.in_flight < self.max_in_flight and self.waiting == 0:
+                self.in_flight += 1
+                self.admitted += 1
+                return
+
+            if self.waiting >= self.max_queue:
+                self.rejected_full += 1
+                raise AdmissionRejected(429, "Server is at capacity, try again later", self.retry_after())
+
+            self.waiting += 1
+            deadline = time.monotonic() + self.queue_timeout
+            try:
+                while self.in_flight >= self.max_in_flight:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.rejected_timeout += 1
+                        raise AdmissionRejected(503, "Timed out waiting for an inference slot", self.retry_after())
+                    self._cond.wait(remaining)
+            finally:
+                self.waiting -= 1
+
+            self.in_flight += 1
+            self.admitted += 1
+
+    def release(self, service_time=None):
+        with self._cond:
+            self.in_flight -= 1
+            if service_time is not None:
+                self.avg_service_time = 0.9 * self.avg_service_time + 0.1 * service_time
+            self._cond.notify()
+
+    def set_max_in_flight(self, max_in_flight, max_queue=None):
+        """Resize the slot pool (and the queue), e.g. once the thread topology is tuned; waiters are woken"""
+        with self._cond:
+            self.max_in_flight = max(1, max_in_flight)
+            if max_queue is not None:
+                self.max_queue = max_queue
+            self._cond.notify_all()
+
+    @contextmanager
+    def slot(self):
+        """Hold an inference slot for the duration of the block"""
+        self.acquire()
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.release(time.monotonic() - start)
+
+    def stats(self):
+        with self._cond:
+            return {
+                "inFlight": self.in_flight,
+                "waiting": self.waiting,
+                "maxInFlight": self.max_in_flight,
+                "maxQueue": self.max_queue,
+                "admitted": self.admitted,
+                "rejectedFull": self.rejected_full,
+                "rejectedTimeout": self.rejected_timeout,
+                "avgServiceSeconds": round(self.avg_service_time, 4),
+            }
@@ -1,13 +1,19 @@
-from flask import Flask, request, jsonify, send_file, render_template_string
+from flask import Flask, Response, g, request, jsonify, send_file, render_template_string, redirect, url_for
 from flask_cors import CORS
 import os
 import sys
 import time
 import threading
 import base64
+import binascii
 import logging
 import random
 import glob
+import json
+import queue
+import atexit
+import signal
+import functools
 from PIL import Image
 import io
 import numpy as np
@@ -42,9 +48,41 @@ except ImportError:
 # Add parent directory to path so we can import the classify_waste module
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+from thumbnails import ThumbnailStore
+from webcam_stream import WebcamStream
+from scene_gate import SceneChangeGate
+from colour_classifier import ColourHeuristicClassifier
+from feature_model import FeatureModelClassifier
+from history_store import HistoryStore, BUCKETS
+from stats_aggregator import StatsAggregator, RESOLUTIONS
+from metrics import Registry, process_rss_bytes, process_memory
+from profiler import SamplingProfiler, RequestProfiler
+from admission import AdmissionController, AdmissionRejected
+from degradation import DegradationRouter
+from embedding_index import EmbeddingIndex
+from online_learning import OnlineHeadTrainer
+from event_bus import EventBus
+from tflite_model import TFLiteModel
+from thread_tuning import load_or_tune
+from image_guard import ImageRejected, PixelBudget, open_image
+import serialization
+
 app = Flask(__name__)
 CORS(app)
 
+# Reject oversized uploads before their body is read or parsed
+MAX_UPLOAD_MB = float(os.environ.get('MAX_UPLOAD_MB', '10'))
+app.config['MAX_CONTENT_LENGTH'] = int(MAX_UPLOAD_MB * 1024 * 1024)
+
+# Uploaded images are checked from their headers before pixels are decoded: more
+# than MAX_IMAGE_PIXELS is rejected, a longer side than DECODE_MAX_SIDE is decoded
+# at reduced size, and one request decodes at most REQUEST_PIXEL_BUDGET pixels
+MAX_IMAGE_PIXELS = int(os.environ.get('MAX_IMAGE_PIXELS', '40000000'))
+DECODE_MAX_SIDE = int(os.environ.get('DECODE_MAX_SIDE', '1024'))
+REQUEST_PIXEL_BUDGET = int(os.environ.get('REQUEST_PIXEL_BUDGET', '48000000'))
+# Also guards every other Image.open in the server, e.g. dataset images
+Image.MAX_IMAGE_PIXELS = MAX_IMAGE_PIXELS
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -53,18 +91,46 @@ logger = logging.getLogger(__name__)
 MODEL = None
 MODEL_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'models', 'waste_classification_model.h5')
 CNN_MODEL = None
+FAST_MODEL = None
+EMBEDDING_MODEL = None
 TRAINING_STATUS = {
     "is_training": False,
     "progress": 0,
     "status": "idle",
     "message": "Model not training"
 }
+TRAINING_STATUS_LOCK = threading.Lock()
+
+# Server events (training progress, classifications) pushed to /api/events subscribers
+EVENTS = EventBus()
+
+def set_training_status(status):
+    """Replace the training status and publish it to event subscribers"""
+    global TRAINING_STATUS
+    with TRAINING_STATUS_LOCK:
+        TRAINING_STATUS = dict(status)
+        EVENTS.publish("training", dict(status))
+
+def read_training_status():
+    """Copy of the training status, taken under its lock"""
+    with TRAINING_STATUS_LOCK:
+        return dict(TRAINING_STATUS)
+
+EVENTS.publish("training", dict(TRAINING_STATUS))
 
 # Class names for CNN model
 CNN_CLASS_NAMES = ['Recyclable', 'Biodegradable', 'Non-recyclable']
 
-# New webcam capture variable
-webcam = None
+# 'auto' uses the CNN with colour fallbacks; 'stub' answers deterministically after a
+# fixed delay so load tests can measure the web stack without model cost
+MODEL_BACKEND = os.environ.get('MODEL_BACKEND', 'auto')
+STUB_LATENCY_MS = float(os.environ.get('STUB_LATENCY_MS', '20'))
+STUB_WASTE_TYPES = {'Recyclable': 'plastic', 'Biodegradable': 'organic', 'Non-recyclable': 'mixed'}
+
+# 'keras' loads the .h5 models onto each process's heap; 'tflite' maps the .tflite
+# file next to each one read-only, so worker processes share the weights (see prefork.py)
+MODEL_FORMAT = os.environ.get('MODEL_FORMAT', 'keras')
+TFLITE_THREADS = int(os.environ['TFLITE_THREADS']) if os.environ.get('TFLITE_THREADS') else None
 
 # Dataset path
 # DATASET_PATH = "C:/Users/omsud/Downloads/archive/DATASET/TRAIN/"
@@ -73,11 +139,154 @@ RECYCLABLE_PATH = os.path.join(DATASET_PATH, "R")
 ORGANIC_PATH = os.path.join(DATASET_PATH, "O")  # Assuming O is for organic/biodegradable
 NON_RECYCLABLE_PATH = os.path.join(DATASET_PATH, "N")  # Assuming N is for non-recyclable
 
-# Function to load CNN model
-def load_cnn_model(model_path=MODEL_PATH):
-    """Load the TensorFlow CNN model for waste classification"""
-    global CNN_MODEL
-    
+# Written by scan_dataset.py; its skip list names corrupt or outlier files
+DATASET_MANIFEST_PATH = os.path.join(os.path.dirname(os.path.normpath(DATASET_PATH)), 'manifest.json')
+
+# Thumbnail cache for dataset images and classified uploads
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+THUMBNAIL_CACHE_DIR = os.environ.get('THUMBNAIL_CACHE_DIR', os.path.join(PROJECT_DIR, 'cache', 'thumbnails'))
+THUMBNAIL_SIZE = int(os.environ.get('THUMBNAIL_SIZE', '256'))
+THUMBNAIL_MAX_AGE = 365 * 24 * 3600  # Thumbnails are content-addressed, so they never change
+THUMBNAILS = ThumbnailStore(THUMBNAIL_CACHE_DIR, size=THUMBNAIL_SIZE)
+
+# Colour-heuristic fallback, with thresholds fitted by colour_fallback.py if present
+COLOUR_THRESHOLDS_PATH = os.environ.get('COLOUR_THRESHOLDS_PATH', os.path.join(PROJECT_DIR, 'models', 'colour_thresholds.json'))
+COLOUR_CLASSIFIER = ColourHeuristicClassifier.from_file(COLOUR_THRESHOLDS_PATH)
+
+# Colour/texture model trained by train_fallback_model.py, preferred over the
+# colour rules when it exists
+FALLBACK_MODEL_PATH = os.environ.get('FALLBACK_MODEL_PATH', os.path.join(PROJECT_DIR, 'models', 'fallback_model.npz'))
+FALLBACK_MODEL = FeatureModelClassifier.load_if_exists(FALLBACK_MODEL_PATH)
+
+# Server-side classification history
+HISTORY_DB_PATH = os.environ.get('HISTORY_DB_PATH', os.path.join(PROJECT_DIR, 'data', 'history.db'))
+HISTORY = HistoryStore(HISTORY_DB_PATH)
+HISTORY_MAX_PAGE_SIZE = 500
+
+# Running statistics, updated as each classification is produced
+STATS = StatsAggregator()
+
+# Prometheus-style metrics exposed on /metrics
+METRICS = Registry()
+STAGE_SECONDS = METRICS.histogram(
+    'waste_classify_stage_seconds', 'Time spent in each stage of the classify path', labels=('stage',)
+)
+REQUEST_SECONDS = METRICS.histogram(
+    'waste_http_request_seconds', 'HTTP request latency by endpoint', labels=('endpoint', 'status')
+)
+CLASSIFY_OUTCOMES = METRICS.counter(
+    'waste_classifications_total', 'Classifications by the path that produced them', labels=('outcome',)
+)
+METRICS.gauge('process_resident_memory_bytes', 'Resident memory size in bytes', process_rss_bytes)
+METRICS.gauge('process_proportional_memory_bytes', 'Proportional set size: resident memory with shared pages split between processes', lambda: process_memory()["pss"] or 0)
+METRICS.gauge('process_threads', 'Number of live Python threads', threading.active_count)
+METRICS.gauge('waste_event_subscribers', 'Clients subscribed to /api/events', lambda: EVENTS.stats()["subscribers"])
+METRICS.gauge('waste_cnn_model_loaded', 'Whether the CNN model is loaded', lambda: int(CNN_MODEL is not None))
+
+# Admission control: at most MAX_INFLIGHT inferences run at once and at most
+# MAX_QUEUE requests wait for a slot; the rest are shed with 429/503
+MAX_INFLIGHT = int(os.environ.get('MAX_INFLIGHT', str(max(1, os.cpu_count() or 1))))
+
+def default_queue_limits(max_in_flight):
+    """(MAX_QUEUE, DEGRADE_QUEUE_DEPTH) for a slot count, unless set in the environment"""
+    max_queue = int(os.environ.get('MAX_QUEUE', str(4 * max_in_flight)))
+    return max_queue, int(os.environ.get('DEGRADE_QUEUE_DEPTH', str(max(1, max_queue // 4))))
+
+MAX_QUEUE, DEGRADE_QUEUE_DEPTH = default_queue_limits(MAX_INFLIGHT)
+QUEUE_TIMEOUT = float(os.environ.get('QUEUE_TIMEOUT', '5'))
+ADMISSION = AdmissionController(max_in_flight=MAX_INFLIGHT, max_queue=MAX_QUEUE, queue_timeout=QUEUE_TIMEOUT)
+ADMISSION_REJECTIONS = METRICS.counter(
+    'waste_admission_rejections_total', 'Requests shed by admission control', labels=('status',)
+)
+METRICS.gauge('waste_inflight_inferences', 'Classify requests currently holding an inference slot', lambda: ADMISSION.in_flight)
+IMAGE_REJECTIONS = METRICS.counter(
+    'waste_image_rejections_total', 'Uploaded images rejected from their headers', labels=('reason',)
+)
+IMAGES_DOWNSAMPLED = METRICS.counter(
+    'waste_images_downsampled_total', 'Uploaded images decoded at reduced size'
+)
+METRICS.gauge('waste_admission_queue_depth', 'Classify requests waiting for an inference slot', lambda: ADMISSION.waiting)
+
+# Graceful degradation: under load, requests step down from the full CNN to a
+# smaller fast model (if one is trained) and then to the cheap fallback classifier
+FAST_MODEL_PATH = os.environ.get('FAST_MODEL_PATH', os.path.join(PROJECT_DIR, 'models', 'waste_classification_model_fast.h5'))
+DEGRADE_LATENCY_MS = float(os.environ.get('DEGRADE_LATENCY_MS', '1000'))
+DEGRADE_COOLDOWN = float(os.environ.get('DEGRADE_COOLDOWN', '10'))
+MODEL_TIERS = ['full', 'fast', 'fallback']
+ROUTER = DegradationRouter(
+    MODEL_TIERS,
+    queue_threshold=DEGRADE_QUEUE_DEPTH,
+    latency_threshold=DEGRADE_LATENCY_MS / 1000.0,
+    cooldown=DEGRADE_COOLDOWN
+)
+METRICS.gauge('waste_degradation_level', 'Current model tier (0 = full model)', lambda: ROUTER.level)
+
+# CPU thread topology: threads per inference, concurrent inferences and the bulk
+# batch size are benchmarked on this host once and saved (see thread_tuning.py).
+# THREAD_AUTOTUNE is '1' to tune when nothing matching is saved, 'force' to always
+# retune and '0' to leave TensorFlow's defaults. Explicit MAX_INFLIGHT and
+# TFLITE_THREADS settings win over the tuned values.
+THREAD_AUTOTUNE = os.environ.get('THREAD_AUTOTUNE', '1')
+THREAD_CONFIG_PATH = os.environ.get('THREAD_CONFIG_PATH', os.path.join(PROJECT_DIR, 'models', 'thread_config.json'))
+AUTOTUNE_CPUS = int(os.environ.get('AUTOTUNE_CPUS', str(os.cpu_count() or 1)))
+AUTOTUNE_LATENCY_MS = float(os.environ.get('AUTOTUNE_LATENCY_MS', str(DEGRADE_LATENCY_MS)))
+AUTOTUNE_BATCH_SIZES = [int(b) for b in os.environ.get('AUTOTUNE_BATCH_SIZES', '1,8,32').split(',')]
+THREAD_CONFIG = None
+
+# Confidence-gated cascade: the fast model answers first and only images it is
+# unsure about (confidence below the threshold, in percent) reach the full model.
+# The threshold comes from CASCADE_THRESHOLD or calibrate_cascade.py's output.
+CASCADE_CALIBRATION_PATH = os.environ.get('CASCADE_CALIBRATION_PATH', os.path.join(PROJECT_DIR, 'models', 'cascade_calibration.json'))
+
+def load_cascade_threshold():
+    """Return the cascade threshold, or None to always use the full model"""
+    if os.environ.get('CASCADE_THRESHOLD'):
+        return float(os.environ['CASCADE_THRESHOLD'])
+    try:
+        with open(CASCADE_CALIBRATION_PATH) as f:
+            return float(json.load(f)['threshold'])
+    except (OSError, ValueError, KeyError):
+        return None
+
+CASCADE_THRESHOLD = load_cascade_threshold()
+
+# Embedding index: the full model's pooled features are looked up among
+# DATASET/TRAIN (see build_embedding_index.py) and past classifications, and a
+# near-duplicate within EMBEDDING_MATCH_DISTANCE (cosine) reuses its label
+EMBEDDING_INDEX_PATH = os.environ.get('EMBEDDING_INDEX_PATH', os.path.join(PROJECT_DIR, 'models', 'embedding_index'))
+EMBEDDING_MATCH_DISTANCE = float(os.environ.get('EMBEDDING_MATCH_DISTANCE', '0.05'))
+EMBEDDING_ADD_CONFIDENCE = float(os.environ.get('EMBEDDING_ADD_CONFIDENCE', '90'))
+EMBEDDING_MAX_ITEMS = int(os.environ.get('EMBEDDING_MAX_ITEMS', '200000'))
+EMBEDDING_INDEX = None
+# Online learning: corrections posted to /api/train refit the Dense head in the
+# background and the updated model is swapped in; state survives restarts
+ONLINE_HEAD_PATH = os.environ.get('ONLINE_HEAD_PATH', os.path.join(PROJECT_DIR, 'models', 'online_head.npz'))
+ONLINE_REPLAY_PER_CLASS = int(os.environ.get('ONLINE_REPLAY_PER_CLASS', '16'))
+ONLINE_TRAINER = None
+
+INDEX_LOOKUPS = METRICS.counter('waste_embedding_lookups_total', 'Embedding index lookups by result', labels=('result',))
+
+# Opt-in profiling endpoints; when PROFILER_TOKEN is set, requests must send it as X-Admin-Token
+PROFILER_ENABLED = os.environ.get('PROFILER_ENABLED', '0') == '1'
+PROFILER_TOKEN = os.environ.get('PROFILER_TOKEN')
+PROFILER_MAX_SECONDS = 60
+PROFILE_DIR = os.environ.get('PROFILE_DIR', os.path.join(PROJECT_DIR, 'cache', 'profiles'))
+SAMPLING_PROFILER = SamplingProfiler()
+REQUEST_PROFILER = RequestProfiler(PROFILE_DIR)
+
+# Webcam streaming: how often frames are classified while clients are listening
+WEBCAM_INDEX = int(os.environ.get('WEBCAM_INDEX', '0'))
+WEBCAM_MIN_INTERVAL = float(os.environ.get('WEBCAM_MIN_INTERVAL', '0.1'))
+WEBCAM_IDLE_TIMEOUT = float(os.environ.get('WEBCAM_IDLE_TIMEOUT', '60'))
+
+# Scene-change gating: camera frames within this mean pixel difference of the
+# last classified frame reuse its result (re-checked at least every max age)
+SCENE_CHANGE_THRESHOLD = float(os.environ.get('SCENE_CHANGE_THRESHOLD', '8.0'))
+SCENE_CHANGE_MAX_AGE = float(os.environ.get('SCENE_CHANGE_MAX_AGE', '5.0'))
+
+# Load a Keras model and warm it up
+def load_keras_model(model_path):
+    """Load a Keras model from disk and run one warm-up prediction"""
     if not TENSORFLOW_AVAILABLE:
         logger.warning("TensorFlow not available, skipping CNN model loading")
         return None
@@ -87,15 +296,15 @@ def load_cnn_model(model_path=MODEL_PATH):
             logger.info(f"Loading CNN model from {model_path}")
             
             # Load the model
-            CNN_MODEL = tf.keras.models.load_model(model_path)
+            model = tf.keras.models.load_model(model_path)
             logger.info("CNN model loaded successfully")
             
-            # Warm up the model with a test prediction
-            dummy_input = np.zeros((1, 224, 224, 3), dtype=np.float32)
-            CNN_MODEL.predict(dummy_input)
+            # Warm up the model with a test prediction at its own input size
+            dummy_input = np.zeros((1, *model_input_size(model), 3), dtype=np.float32)
+            model.predict(dummy_input)
             logger.info("CNN model warmed up with test prediction")
             
-            return CNN_MODEL
+            return model
         else:
             logger.warning(f"Model file not found at {model_path}")
             return None
@@ -103,12 +312,116 @@ def load_cnn_model(model_path=MODEL_PATH):
         logger.error(f"Error loading CNN model: {str(e)}")
         return None
 
+def load_tflite_model(model_path):
+    """Map a .tflite model read-only and run one warm-up prediction"""
+    if not os.path.exists(model_path):
+        logger.warning(f"TFLite model not found at {model_path}, convert it with export_tflite.py")
+        return None
+    try:
+        logger.info(f"Mapping TFLite model {model_path}")
+        model = TFLiteModel(model_path, num_threads=TFLITE_THREADS)
+        model.predict(np.zeros((1, *model_input_size(model), 3), dtype=np.float32))
+        logger.info("TFLite model warmed up with test prediction")
+        return model
+    except Exception as e:
+        logger.error(f"Error loading TFLite model: {str(e)}")
+        return None
+
+def model_file_path(model_path):
+    """Path of the file actually loaded for a .h5 model path under MODEL_FORMAT"""
+    if MODEL_FORMAT == 'tflite':
+        return os.path.splitext(model_path)[0] + '.tflite'
+    return model_path
+
+def load_model_file(model_path):
+    """Load a model in the configured MODEL_FORMAT"""
+    if MODEL_FORMAT == 'tflite':
+        return load_tflite_model(model_file_path(model_path)) if TENSORFLOW_AVAILABLE else None
+    return load_keras_model(model_path)
+
+def model_input_size(model):
+    """(height, width) expected by a Keras image model, defaulting to 224x224"""
+    shape = getattr(model, 'input_shape', None)
+    if shape and len(shape) == 4 and shape[1] and shape[2]:
+        return int(shape[1]), int(shape[2])
+    return 224, 224
+
+def tune_threads():
+    """Saved thread topology for this host and model, benchmarking it first if needed"""
+    if not TENSORFLOW_AVAILABLE or THREAD_AUTOTUNE == '0':
+        return None
+    try:
+        return load_or_tune(THREAD_CONFIG_PATH, model_file_path(MODEL_PATH), MODEL_FORMAT, AUTOTUNE_CPUS,
+                            AUTOTUNE_LATENCY_MS, AUTOTUNE_BATCH_SIZES, retune=THREAD_AUTOTUNE == 'force')
+    except Exception as e:
+        logger.error(f"Error tuning inference threads: {str(e)}")
+        return None
+
+def resize_admission(max_in_flight):
+    """Change the inference slot count, rescaling the queue limits derived from it"""
+    global MAX_INFLIGHT, MAX_QUEUE, DEGRADE_QUEUE_DEPTH
+    
+    MAX_INFLIGHT = max_in_flight
+    MAX_QUEUE, DEGRADE_QUEUE_DEPTH = default_queue_limits(max_in_flight)
+    ADMISSION.set_max_in_flight(MAX_INFLIGHT, MAX_QUEUE)
+    ROUTER.set_queue_threshold(DEGRADE_QUEUE_DEPTH)
+
+def configure_threads():
+    """Apply the tuned thread topology; must run before the first model is loaded"""
+    global THREAD_CONFIG, TFLITE_THREADS
+    
+    # A TFLite interpreter runs one inference at a time, so more slots would only queue on its lock
+    if MODEL_FORMAT == 'tflite' and 'MAX_INFLIGHT' not in os.environ:
+        resize_admission(1)
+    
+    THREAD_CONFIG = tune_threads()
+    if THREAD_CONFIG is None:
+        return None
+    chosen = THREAD_CONFIG["chosen"]
+    try:
+        tf.config.threading.set_intra_op_parallelism_threads(chosen["intraOp"])
+        tf.config.threading.set_inter_op_parallelism_threads(chosen["interOp"])
+    except RuntimeError as e:
+        # Pool sizes are fixed once TensorFlow has run its first op
+        logger.warning(f"Could not resize TensorFlow thread pools: {str(e)}")
+    if TFLITE_THREADS is None:
+        TFLITE_THREADS = chosen["intraOp"]
+    if 'MAX_INFLIGHT' not in os.environ:
+        resize_admission(chosen["concurrency"])
+    logger.info(f"Inference threads: {chosen['intraOp']} per inference, {chosen['concurrency']} concurrent, "
+                f"batch size {chosen['batchSize']} ({THREAD_CONFIG['source']})")
+    return THREAD_CONFIG
+
+def bulk_batch_size():
+    """Batch size for predictions over many images at once"""
+    return THREAD_CONFIG["chosen"]["batchSize"] if THREAD_CONFIG is not None else 32
+
+# Function to load CNN model
+def load_cnn_model(model_path=MODEL_PATH):
+    """Load the TensorFlow CNN model for waste classification"""
+    global CNN_MODEL
+    
+    model = load_model_file(model_path)
+    if model is not None:
+        CNN_MODEL = model
+    return model
+
+def load_fast_model(model_path=FAST_MODEL_PATH):
+    """Load the optional smaller model used when the server is degraded"""
+    global FAST_MODEL
+    
+    if not os.path.exists(model_file_path(model_path)):
+        logger.info(f"No fast model at {model_file_path(model_path)}, degraded requests will use the fallback classifier")
+        return None
+    FAST_MODEL = load_model_file(model_path)
+    return FAST_MODEL
+
 # Function to preprocess image for CNN
-def preprocess_image_for_cnn(img):
+def preprocess_image_for_cnn(img, size=(224, 224)):
     """Preprocess image for CNN model input"""
     try:
-        # Resize to model input size (assuming 224x224)
-        img_resized = img.resize((224, 224))
+        # Resize to model input size (height, width)
+        img_resized = img.resize((size[1], size[0]))
         
         # Convert to numpy array
         img_array = np.array(img_resized)
@@ -131,25 +444,29 @@ def preprocess_image_for_cnn(img):
         return None
 
 # Function to classify with CNN
-def classify_with_cnn(img):
-    """Classify image using the CNN model"""
+def classify_with_cnn(img, model=None):
+    """Classify image using the CNN model, or another Keras model such as the fast tier"""
     global CNN_MODEL
     
     try:
         # Make sure the model is loaded
-        if CNN_MODEL is None:
-            CNN_MODEL = load_cnn_model()
+        if model is None:
             if CNN_MODEL is None:
-                logger.warning("CNN model not available, using fallback classification")
-                return None
+                CNN_MODEL = load_cnn_model()
+                if CNN_MODEL is None:
+                    logger.warning("CNN model not available, using fallback classification")
+                    return None
+            model = CNN_MODEL
         
         # Preprocess the image
-        img_processed = preprocess_image_for_cnn(img)
+        with STAGE_SECONDS.time('preprocess'):
+            img_processed = preprocess_image_for_cnn(img, model_input_size(model))
         if img_processed is None:
             return None
         
         # Make prediction
-        predictions = CNN_MODEL.predict(img_processed)[0]
+        with STAGE_SECONDS.time('inference'):
+            predictions = model.predict(img_processed)[0]
         
         # Get the predicted class
         class_index = np.argmax(predictions)
@@ -158,32 +475,170 @@ def classify_with_cnn(img):
         # Map to category
         category = CNN_CLASS_NAMES[class_index]
         
-        # Select a waste type based on category
-        if category == "Recyclable":
-            waste_type = random.choice(['paper', 'cardboard', 'plastic', 'metal', 'glass'])
-        elif category == "Biodegradable":
-            waste_type = random.choice(['organic', 'food waste', 'plant matter', 'garden waste'])
-        else:
-            waste_type = random.choice(['mixed materials', 'composite', 'contaminated', 'styrofoam'])
-        
         logger.info(f"CNN predicted category: {category}, confidence: {confidence:.2f}%")
         
-        return {
-            "category": category,
-            "accuracy": round(confidence, 1),
-            "wasteType": waste_type,
-            "details": {
-                "recyclable": category == "Recyclable",
-                "biodegradable": category == "Biodegradable",
-                "hazardous": random.choice([True, False]) if category == "Non-recyclable" else False,
-                "decompositionTime": getDecompositionTime(waste_type),
-                "disposalMethod": getDisposalMethod(category, waste_type)
-            }
-        }
+        return build_cnn_result(category, confidence)
     except Exception as e:
         logger.error(f"Error during CNN classification: {str(e)}")
         return None
 
+def build_cnn_result(category, confidence, waste_type=None):
+    """Classification response for a category predicted by a model"""
+    # Select a waste type based on category
+    if waste_type is None:
+        waste_type = random.choice(CATEGORY_WASTE_TYPES.get(category, CATEGORY_WASTE_TYPES["Non-recyclable"]))
+    
+    hazardous = random.choice([True, False]) if category == "Non-recyclable" else False
+    return {
+        "category": category,
+        "accuracy": round(confidence, 1),
+        "wasteType": waste_type,
+        "details": waste_details(category, waste_type, hazardous)
+    }
+
+def build_embedding_model(model):
+    """Model returning the pooled backbone features and the class probabilities in one pass"""
+    pooling = next(layer for layer in model.layers if isinstance(layer, tf.keras.layers.GlobalAveragePooling2D))
+    return tf.keras.Model(model.inputs, [pooling.output, model.outputs[0]])
+
+def load_embedding_index():
+    """Prepare the embedding model and open (or start) the index"""
+    global EMBEDDING_MODEL, EMBEDDING_INDEX
+    
+    if CNN_MODEL is None:
+        return None
+    try:
+        EMBEDDING_MODEL = build_embedding_model(CNN_MODEL)
+    except Exception as e:
+        logger.error(f"Error building embedding model: {str(e)}")
+        return None
+    
+    dim = int(EMBEDDING_MODEL.outputs[0].shape[-1])
+    index = EmbeddingIndex.load_if_exists(EMBEDDING_INDEX_PATH)
+    if index is not None and index.dim != dim:
+        logger.warning(f"Embedding index has {index.dim}-d vectors but the model produces {dim}-d, starting a new index")
+        index = None
+    EMBEDDING_INDEX = index or EmbeddingIndex(dim)
+    logger.info(f"Embedding index ready with {len(EMBEDDING_INDEX)} items")
+    return EMBEDDING_INDEX
+
+def swap_cnn_model(model):
+    """Atomically replace the full model (and its embedding view) with an updated one"""
+    global CNN_MODEL, EMBEDDING_MODEL
+    
+    # Warm up before swapping so no request pays for graph building
+    model.predict(np.zeros((1, *model_input_size(model), 3), dtype=np.float32), verbose=0)
+    embedding_model = build_embedding_model(model) if EMBEDDING_MODEL is not None else None
+    CNN_MODEL, EMBEDDING_MODEL = model, embedding_model
+
+def sample_replay_images():
+    """A few dataset images per category, replayed so head updates don't forget them"""
+    images, labels = [], []
+    for category, paths in SAMPLE_IMAGES.items():
+        for path in random.Random(0).sample(paths, min(ONLINE_REPLAY_PER_CLASS, len(paths))):
+            try:
+                images.append(Image.open(path).convert('RGB'))
+                labels.append(CNN_CLASS_NAMES.index(category))
+            except Exception as e:
+                logger.warning(f"Skipping replay image {path}: {str(e)}")
+    return images, labels
+
+def start_online_trainer():
+    """Start the background head trainer for the loaded CNN model"""
+    global ONLINE_TRAINER
+    
+    if CNN_MODEL is None:
+        return None
+    try:
+        feature_model = build_embedding_model(CNN_MODEL)
+        size = model_input_size(CNN_MODEL)
+        
+        def extract_features(images):
+            batch = np.concatenate([preprocess_image_for_cnn(img, size) for img in images])
+            features, _ = feature_model.predict(batch, batch_size=bulk_batch_size(), verbose=0)
+            return features
+        
+        ONLINE_TRAINER = OnlineHeadTrainer(
+            CNN_MODEL, CNN_CLASS_NAMES, extract_features, swap_cnn_model,
+            status_fn=set_training_status,
+            replay_fn=sample_replay_images,
+            features_fn=index_corrections,
+            state_path=ONLINE_HEAD_PATH
+        )
+        ONLINE_TRAINER.start()
+        return ONLINE_TRAINER
+    except Exception as e:
+        logger.error(f"Error starting online head trainer: {str(e)}")
+        return None
+
+def embed_image(img):
+    """(embedding, class probabilities) for one image from the full model"""
+    with STAGE_SECONDS.time('preprocess'):
+        img_processed = preprocess_image_for_cnn(img, model_input_size(CNN_MODEL))
+    with STAGE_SECONDS.time('inference'):
+        embeddings, predictions = EMBEDDING_MODEL.predict(img_processed, verbose=0)
+    return embeddings[0], predictions[0]
+
+def classify_with_embedding(img):
+    """Full-model classification that reuses the label of a near-duplicate image when one is indexed"""
+    try:
+        embedding, predictions = embed_image(img)
+        
+        with STAGE_SECONDS.time('index'):
+            matches = EMBEDDING_INDEX.search(embedding, k=1)
+        if matches and matches[0][0] <= EMBEDDING_MATCH_DISTANCE:
+            distance, item_id, item = matches[0]
+            INDEX_LOOKUPS.inc('hit')
+            # Confidence falls from 100% at an exact duplicate to 90% at the threshold
+            confidence = 100.0 - 10.0 * distance / max(EMBEDDING_MATCH_DISTANCE, 1e-9)
+            result = build_cnn_result(item['category'], confidence, item.get('wasteType'))
+            result.update(embeddingId=item_id, indexMatch={"distance": round(distance, 4), "source": item.get('source')})
+            return result
+        INDEX_LOOKUPS.inc('miss')
+        
+        class_index = int(np.argmax(predictions))
+        confidence = float(predictions[class_index] * 100)
+        result = build_cnn_result(CNN_CLASS_NAMES[class_index], confidence)
+        
+        # Remember confident new images so repeats of them hit the index
+        if confidence >= EMBEDDING_ADD_CONFIDENCE and len(EMBEDDING_INDEX) < EMBEDDING_MAX_ITEMS:
+            item = {"category": result["category"], "wasteType": result["wasteType"], "source": "classification"}
+            result["embeddingId"] = EMBEDDING_INDEX.add(embedding, [item])[0]
+        return result
+    except Exception as e:
+        logger.error(f"Error during embedding classification: {str(e)}")
+        return None
+
+def index_corrections(embeddings, labels):
+    """Relabel indexed near-duplicates of corrected images, or index the images themselves.
+
+    Without this, classify_with_embedding would keep answering a near-duplicate
+    with its old label, whatever the retrained head predicts. The online
+    trainer calls this with the pooled features it extracts for each batch of
+    corrections, which are the embeddings the index holds.
+    """
+    if EMBEDDING_INDEX is None or not len(embeddings):
+        return 0
+    try:
+        changed = 0
+        for embedding, label in zip(embeddings, labels):
+            matches = [m for m in EMBEDDING_INDEX.search(embedding, k=8) if m[0] <= EMBEDDING_MATCH_DISTANCE]
+            for _, item_id, item in matches:
+                if item['category'] != label:
+                    EMBEDDING_INDEX.update_item(item_id, category=label, source="correction",
+                                                wasteType=random.choice(CATEGORY_WASTE_TYPES[label]))
+                    changed += 1
+            if not matches and len(EMBEDDING_INDEX) < EMBEDDING_MAX_ITEMS:
+                item = {"category": label, "wasteType": random.choice(CATEGORY_WASTE_TYPES[label]),
+                        "source": "correction"}
+                EMBEDDING_INDEX.add(embedding, [item])
+                changed += 1
+        logger.info(f"Corrections relabelled or added {changed} embedding index items")
+        return changed
+    except Exception as e:
+        logger.error(f"Error indexing corrections: {str(e)}")
+        return 0
+
 # Pre-load some images for testing
 def load_sample_images():
     sample_images = {
@@ -216,11 +671,38 @@ def load_sample_images():
     else:
         logger.warning(f"Non-recyclable dataset path not found: {NON_RECYCLABLE_PATH}")
     
+    # Leave out files the dataset scan flagged, without opening them here
+    skips = load_dataset_skips()
+    if skips:
+        for category, paths in sample_images.items():
+            sample_images[category] = [p for p in paths if os.path.normpath(p) not in skips]
+        logger.info(f"Skipping sample images listed in {DATASET_MANIFEST_PATH}")
+    
     return sample_images
 
+def load_dataset_skips():
+    """Normalised paths of dataset files the manifest marks as unusable"""
+    root = os.path.dirname(DATASET_MANIFEST_PATH)
+    try:
+        with open(DATASET_MANIFEST_PATH) as f:
+            return {os.path.normpath(os.path.join(root, path)) for path in json.load(f).get('skip', [])}
+    except (OSError, ValueError):
+        return set()
+
 # Global variable for sample images
 SAMPLE_IMAGES = {}
 
+# Set once load_model_on_startup has finished; reported by /api/ready
+READY = threading.Event()
+
+# Port used when run directly (prefork.py binds its own)
+SERVER_PORT = int(os.environ.get('SERVER_PORT', '5000'))
+
+# Worker processes serving this port, set by prefork.py. Requests land on any
+# worker, so webcam capture, event streams and online learning, which keep
+# their state in one process, are only available with a single worker
+SERVER_WORKERS = int(os.environ.get('SERVER_WORKERS', '1'))
+
 # Waste categories for mock data
 WASTE_CATEGORIES = ['paper', 'cardboard', 'plastic', 'metal', 'glass', 'organic', 'e-waste', 'hazardous', 'mixed']
 
@@ -233,8 +715,34 @@ def load_model_on_startup():
         # Load sample images
         SAMPLE_IMAGES = load_sample_images()
         
+        # Start the thumbnail workers before TensorFlow spins up its threads
+        try:
+            THUMBNAILS.start()
+            THUMBNAILS.warm([path for paths in SAMPLE_IMAGES.values() for path in paths])
+        except Exception as e:
+            logger.error(f"Error starting thumbnail store: {str(e)}")
+        
+        # Open the classification history database
+        try:
+            HISTORY.start()
+            STATS.seed(HISTORY, follow=SERVER_WORKERS > 1)
+        except Exception as e:
+            logger.error(f"Error opening classification history: {str(e)}")
+        
         # Try to load CNN model
-        CNN_MODEL = load_cnn_model()
+        if MODEL_BACKEND == 'stub':
+            logger.info(f"Using stub model backend ({STUB_LATENCY_MS} ms per image)")
+        else:
+            configure_threads()
+            CNN_MODEL = load_cnn_model()
+            load_fast_model()
+            # Embeddings and head updates need the Keras graph, not a flat TFLite file
+            if isinstance(CNN_MODEL, TFLiteModel):
+                logger.info("TFLite model format: embedding index and online learning are disabled")
+            else:
+                load_embedding_index()
+                if SERVER_WORKERS == 1:
+                    start_online_trainer()
         
         class MockModel:
             def predict(self, image):
@@ -245,41 +753,95 @@ def load_model_on_startup():
         logger.info("Mock model created successfully")
     except Exception as e:
         logger.error(f"Error creating mock model: {str(e)}")
+    
+    # Classification works from here on, with whichever models did load
+    READY.set()
+
+def decode_base64_image(base64_string):
+    """
+    Decode a base64 string (with or without data URL prefix) to raw image bytes
+    """
+    # Remove data URL prefix if present
+    if ',' in base64_string:
+        base64_string = base64_string.split(',')[1]
+    
+    return base64.b64decode(base64_string)
 
-def load_image_from_base64(base64_string):
+def load_image_from_base64(base64_string, image_data=None, budget=None):
     """
-    Load image from base64 string
+    Load image from base64 string, within the upload size limits.
+    Raises ImageRejected for images over a limit.
     """
     try:
-        # Remove data URL prefix if present
-        if ',' in base64_string:
-            base64_string = base64_string.split(',')[1]
-            
-        # Decode base64 string
-        image_data = base64.b64decode(base64_string)
-        
-        # Create PIL Image
-        img = Image.open(io.BytesIO(image_data))
+        # Decode base64 string unless the caller already did
+        if image_data is None:
+            image_data = decode_base64_image(base64_string)
         
-        # Convert to RGB if needed
-        if img.mode != 'RGB':
-            img = img.convert('RGB')
+        # Check the header, then decode to RGB (at reduced size for large images)
+        img, info = open_image(image_data, MAX_IMAGE_PIXELS, DECODE_MAX_SIDE, budget=budget)
+        if info["downsampled"]:
+            IMAGES_DOWNSAMPLED.inc()
             
         return img
+    except ImageRejected as e:
+        IMAGE_REJECTIONS.inc(e.code)
+        logger.warning(f"Rejected upload: {e.reason}")
+        raise
     except Exception as e:
         logger.error(f"Error loading image from base64: {str(e)}")
         return None
 
+def classify_with_stub(image):
+    """Deterministic fixed-latency classification for load testing"""
+    time.sleep(STUB_LATENCY_MS / 1000.0)
+    
+    # Derive the category from the image size so results are repeatable
+    size = sum(image.size) if isinstance(image, Image.Image) else len(str(image))
+    category = CNN_CLASS_NAMES[size % len(CNN_CLASS_NAMES)]
+    waste_type = STUB_WASTE_TYPES[category]
+    
+    return {
+        "category": category,
+        "accuracy": 90.0,
+        "wasteType": waste_type,
+        "details": waste_details(category, waste_type)
+    }
+
 def predict(model, image):
     """
     Classification function using real dataset images or CNN model
     """
     global SAMPLE_IMAGES, CNN_MODEL
     
-    # First try using the CNN model if available
-    if TENSORFLOW_AVAILABLE and isinstance(image, Image.Image):
-        cnn_result = classify_with_cnn(image)
+    # Pick the tier for current load; degraded tiers trade accuracy for speed
+    tier = ROUTER.choose(ADMISSION.waiting, available_tiers())
+    
+    # Load-testing backend stands in for the full model
+    if MODEL_BACKEND == 'stub' and tier == 'full':
+        CLASSIFY_OUTCOMES.inc('stub')
+        return dict(classify_with_stub(image), tier='stub')
+    
+    # First try using the CNN model (or the fast model when degraded) if available
+    if tier in ('full', 'fast') and TENSORFLOW_AVAILABLE and isinstance(image, Image.Image):
+        cascade = tier == 'full' and FAST_MODEL is not None and CASCADE_THRESHOLD is not None
+        
+        # Let the fast model answer confident cases on its own
+        if cascade:
+            small_result = classify_with_cnn(image, FAST_MODEL)
+            if small_result and small_result["accuracy"] >= CASCADE_THRESHOLD:
+                CLASSIFY_OUTCOMES.inc('cascade_small')
+                small_result.update(tier=tier, cascade='small')
+                return small_result
+        
+        if tier == 'full' and EMBEDDING_INDEX is not None:
+            cnn_result = classify_with_embedding(image)
+        else:
+            cnn_result = classify_with_cnn(image, FAST_MODEL if tier == 'fast' else None)
         if cnn_result:
+            CLASSIFY_OUTCOMES.inc('cnn' if tier == 'full' else 'fast_model')
+            cnn_result["tier"] = tier
+            if cascade:
+                cnn_result["cascade"] = 'large'
             return cnn_result
     
     # Fallback to color-based classification if CNN fails or isn't available
@@ -312,49 +874,12 @@ def predict(model, image):
         # - Green/brown tones often indicate biodegradable
         # - Blue/white/clear often indicate recyclable
         # - Black/complex mixed colors often indicate non-recyclable
-        
-        # Resize for faster processing
-        img_small = img.resize((50, 50))
-        img_array = np.array(img_small)
-        
-        # Calculate average color values
-        r_avg = np.mean(img_array[:,:,0])
-        g_avg = np.mean(img_array[:,:,1])
-        b_avg = np.mean(img_array[:,:,2])
-        
-        # Calculate color variance (complexity)
-        color_variance = np.std(img_array)
-        
-        # Dominant color determination
-        max_channel = max(r_avg, g_avg, b_avg)
-        
-        # Category determination based on simple rules
-        # This is a very simplified approach - real ML would be much more sophisticated
-        if g_avg > r_avg and g_avg > b_avg:
-            # Green dominant - likely organic/biodegradable
-            category = "Biodegradable"
-            waste_type = random.choice(['organic', 'food waste', 'plant matter', 'garden waste'])
-            accuracy = random.randint(78, 92)
-        elif b_avg > r_avg and b_avg > g_avg:
-            # Blue dominant - often plastic/recyclable
-            category = "Recyclable"
-            waste_type = random.choice(['plastic', 'paper', 'cardboard', 'glass'])
-            accuracy = random.randint(82, 95)
-        elif r_avg > 120 and g_avg > 120 and b_avg > 120:
-            # Light colors - often paper/recyclable
-            category = "Recyclable"
-            waste_type = random.choice(['paper', 'cardboard', 'light plastic'])
-            accuracy = random.randint(80, 93)
-        elif color_variance > 50:
-            # High variance - complex materials, often non-recyclable
-            category = "Non-recyclable"
-            waste_type = random.choice(['mixed materials', 'composite', 'contaminated'])
-            accuracy = random.randint(75, 88)
-        else:
-            # Default case
-            category = "Non-recyclable"
-            waste_type = random.choice(['mixed', 'unknown', 'composite'])
-            accuracy = random.randint(70, 85)
+        # The rules are deterministic and vectorized, see colour_classifier.py.
+        # A trained fallback model replaces the rules when one is available.
+        fallback = FALLBACK_MODEL or COLOUR_CLASSIFIER
+        with STAGE_SECONDS.time('fallback'):
+            category, waste_type, accuracy = fallback.classify([img])[0]
+        CLASSIFY_OUTCOMES.inc('fallback_model' if FALLBACK_MODEL else 'colour_rules')
         
         # Save the image to a temporary file for display
         img_byte_arr = io.BytesIO()
@@ -368,41 +893,76 @@ def predict(model, image):
             "accuracy": accuracy,
             "wasteType": waste_type,
             "imageData": f"data:image/jpeg;base64,{img_base64}",
-            "details": {
-                "recyclable": category == "Recyclable",
-                "biodegradable": category == "Biodegradable",
-                "hazardous": random.choice([True, False]) if category == "Non-recyclable" else False,
-                "decompositionTime": getDecompositionTime(waste_type),
-                "disposalMethod": getDisposalMethod(category, waste_type)
-            }
+            "tier": "fallback",
+            "details": waste_details(category, waste_type, waste_type == "contaminated")
         }
     except Exception as e:
         logger.error(f"Error during classification: {str(e)}")
         # Fallback to random classification
-        return defaultClassification()
+        CLASSIFY_OUTCOMES.inc('default')
+        return dict(defaultClassification(), tier='default')
+
+def available_tiers():
+    """Model tiers that can currently answer a request"""
+    tiers = {'fallback'}
+    if MODEL_BACKEND == 'stub' or TENSORFLOW_AVAILABLE:
+        tiers.add('full')
+    if FAST_MODEL is not None:
+        tiers.add('fast')
+    return tiers
+
+def record_classification(result, source, thumbnail_key=None):
+    """Add a classification produced by predict() to the history and running stats"""
+    timestamp = time.time()
+    # Several workers follow the shared history instead, see get_stats
+    if SERVER_WORKERS == 1:
+        STATS.record(result, timestamp)
+    HISTORY.record(result, source=source, thumbnail_key=thumbnail_key, timestamp=timestamp)
+    
+    EVENTS.publish("classification", {
+        "category": result.get("category"),
+        "wasteType": result.get("wasteType"),
+        "accuracy": result.get("accuracy"),
+        "tier": result.get("tier"),
+        "source": source,
+        "thumbnailKey": thumbnail_key,
+        "timestamp": timestamp
+    })
+    
+    # Link newly indexed images to their thumbnail for the similar-images API
+    if thumbnail_key and EMBEDDING_INDEX is not None and "embeddingId" in result:
+        EMBEDDING_INDEX.update_item(result["embeddingId"], thumbnailKey=thumbnail_key)
+
+# Waste types reported for each model category
+CATEGORY_WASTE_TYPES = {
+    "Recyclable": ['paper', 'cardboard', 'plastic', 'metal', 'glass'],
+    "Biodegradable": ['organic', 'food waste', 'plant matter', 'garden waste'],
+    "Non-recyclable": ['mixed materials', 'composite', 'contaminated', 'styrofoam']
+}
+
+DECOMPOSITION_TIMES = {
+    'paper': '2-6 weeks',
+    'cardboard': '2 months',
+    'organic': '2-4 weeks',
+    'food waste': '1-2 weeks',
+    'plant matter': '1-3 weeks',
+    'garden waste': '2-5 weeks',
+    'plastic': '450+ years',
+    'glass': '1,000,000+ years',
+    'metal': '50-500 years',
+    'light plastic': '450+ years',
+    'mixed materials': 'varies',
+    'composite': '50-100 years',
+    'contaminated': 'varies',
+    'mixed': 'varies',
+    'unknown': 'unknown',
+    'e-waste': '1,000+ years',
+    'styrofoam': '500+ years'
+}
 
 def getDecompositionTime(waste_type):
     """Helper function to get decomposition time based on waste type"""
-    decomposition_times = {
-        'paper': '2-6 weeks',
-        'cardboard': '2 months',
-        'organic': '2-4 weeks',
-        'food waste': '1-2 weeks',
-        'plant matter': '1-3 weeks',
-        'garden waste': '2-5 weeks',
-        'plastic': '450+ years',
-        'glass': '1,000,000+ years',
-        'metal': '50-500 years',
-        'light plastic': '450+ years',
-        'mixed materials': 'varies',
-        'composite': '50-100 years',
-        'contaminated': 'varies',
-        'mixed': 'varies',
-        'unknown': 'unknown',
-        'e-waste': '1,000+ years',
-        'styrofoam': '500+ years'
-    }
-    return decomposition_times.get(waste_type, 'unknown')
+    return DECOMPOSITION_TIMES.get(waste_type, 'unknown')
 
 def getDisposalMethod(category, waste_type):
     """Helper function to get disposal method"""
@@ -423,6 +983,29 @@ def getDisposalMethod(category, waste_type):
         else:
             return "General waste bin"
 
+# Result "details" blocks by (category, waste type, hazardous). They are built
+# once and shared between responses, so they must never be modified.
+WASTE_DETAILS = {}
+
+def waste_details(category, waste_type, hazardous=False):
+    """Precomputed details block for a classification result"""
+    key = (category, waste_type, bool(hazardous))
+    details = WASTE_DETAILS.get(key)
+    if details is None:
+        details = WASTE_DETAILS[key] = {
+            "recyclable": category == "Recyclable",
+            "biodegradable": category == "Biodegradable",
+            "hazardous": bool(hazardous),
+            "decompositionTime": getDecompositionTime(waste_type),
+            "disposalMethod": getDisposalMethod(category, waste_type)
+        }
+    return details
+
+for _category in CNN_CLASS_NAMES:
+    for _waste_type in DECOMPOSITION_TIMES.keys() | {t for types in CATEGORY_WASTE_TYPES.values() for t in types}:
+        for _hazardous in (False, True):
+            waste_details(_category, _waste_type, _hazardous)
+
 def defaultClassification():
     """Return a default classification when analysis fails"""
     category = random.choice(["Recyclable", "Biodegradable", "Non-recyclable"])
@@ -437,15 +1020,150 @@ def defaultClassification():
         "category": category,
         "accuracy": random.randint(70, 85),
         "wasteType": waste_type,
-        "details": {
-            "recyclable": category == "Recyclable",
-            "biodegradable": category == "Biodegradable",
-            "hazardous": False,
-            "decompositionTime": getDecompositionTime(waste_type),
-            "disposalMethod": getDisposalMethod(category, waste_type)
-        }
+        "details": waste_details(category, waste_type)
     }
 
+# Request latency for every endpoint
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+
+@app.after_request
+def observe_request_time(response):
+    start = g.get('request_start')
+    if start is not None:
+        REQUEST_SECONDS.observe(time.perf_counter() - start, request.endpoint or 'unknown', response.status_code)
+    return response
+
+def profiler_authorized():
+    """Whether this request may use the profiling features"""
+    if not PROFILER_ENABLED:
+        return False
+    return PROFILER_TOKEN is None or request.headers.get('X-Admin-Token') == PROFILER_TOKEN
+
+# Per-request cProfile capture, triggered by the X-Profile header; skipped
+# (no X-Profile-Id) while another request is being profiled
+@app.before_request
+def start_request_profile():
+    if request.headers.get('X-Profile') and profiler_authorized():
+        profile = REQUEST_PROFILER.start()
+        if profile is not None:
+            g.request_profile = profile
+
+@app.after_request
+def finish_request_profile(response):
+    profile = g.pop('request_profile', None)
+    if profile is not None:
+        name = REQUEST_PROFILER.finish(profile, request.endpoint or 'unknown')
+        response.headers['X-Profile-Id'] = name
+    return response
+
+@app.teardown_request
+def discard_request_profile(exc):
+    # Only left over when the response was never finalised
+    profile = g.pop('request_profile', None)
+    if profile is not None:
+        REQUEST_PROFILER.discard(profile)
+
+# Sampling profiler across all threads, returned as collapsed stacks for flamegraphs
+@app.route('/api/admin/profile', methods=['GET'])
+def sample_profile():
+    if not profiler_authorized():
+        return jsonify({"error": "Not found"}), 404
+    
+    seconds = min(request.args.get('seconds', 10, type=float), PROFILER_MAX_SECONDS)
+    interval = max(request.args.get('interval', 5, type=float), 1) / 1000.0
+    try:
+        collapsed, samples = SAMPLING_PROFILER.run(seconds, interval, skip_idle=request.args.get('idle') != '1')
+    except RuntimeError as e:
+        return jsonify({"error": str(e)}), 409
+    
+    response = Response(collapsed, mimetype='text/plain')
+    response.headers['X-Profile-Samples'] = str(samples)
+    return response
+
+# Saved per-request profiles, rendered with pstats
+@app.route('/api/admin/profiles/<name>', methods=['GET'])
+def get_request_profile(name):
+    if not profiler_authorized():
+        return jsonify({"error": "Not found"}), 404
+    
+    if request.args.get('format') == 'prof':
+        path = REQUEST_PROFILER.path_for(name)
+        if path is None:
+            return jsonify({"error": "Profile not found"}), 404
+        return send_file(path, mimetype='application/octet-stream', as_attachment=True)
+    
+    try:
+        report = REQUEST_PROFILER.report(name, sort=request.args.get('sort', 'cumulative'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if report is None:
+        return jsonify({"error": "Profile not found"}), 404
+    return Response(report, mimetype='text/plain')
+
+# Uploads over MAX_CONTENT_LENGTH get a JSON error like every other API failure
+@app.errorhandler(413)
+def payload_too_large(e):
+    return jsonify({"error": f"Upload exceeds the {MAX_UPLOAD_MB:g} MB limit"}), 413
+
+def negotiated_response(payload, status=200):
+    """Response in the format the client accepts: JSON by default, MessagePack on request"""
+    mimetype = serialization.negotiate(request.accept_mimetypes)
+    response = Response(serialization.encode(payload, mimetype), status=status, mimetype=mimetype)
+    response.headers['Vary'] = 'Accept'
+    return response
+
+@app.errorhandler(ImageRejected)
+def image_rejected(e):
+    return jsonify({"error": e.reason}), e.status
+
+def admission_controlled(view):
+    """Run the view only when an inference slot is free, shedding load otherwise"""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        # Checked before the body is read, so rejected uploads are never buffered
+        limit = app.config['MAX_CONTENT_LENGTH']
+        if request.content_length is not None and request.content_length > limit:
+            return payload_too_large(None)
+        
+        start = time.monotonic()
+        try:
+            with ADMISSION.slot():
+                response = view(*args, **kwargs)
+            # Queue wait plus service time drives the degradation router
+            ROUTER.observe(time.monotonic() - start)
+            return response
+        except AdmissionRejected as e:
+            ADMISSION_REJECTIONS.inc(e.status)
+            response = jsonify({"error": e.reason, "retryAfter": e.retry_after})
+            response.status_code = e.status
+            response.headers['Retry-After'] = str(e.retry_after)
+            return response
+    return wrapper
+
+def single_process_only(view):
+    """503 for views whose state lives in one process, when several workers share the port"""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        if SERVER_WORKERS > 1:
+            return jsonify({"error": f"{request.path} needs a single server process, "
+                                     f"but {SERVER_WORKERS} workers are running"}), 503
+        return view(*args, **kwargs)
+    return wrapper
+
+# Prometheus metrics endpoint
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    return Response(METRICS.expose(), mimetype='text/plain; version=0.0.4')
+
+# Readiness probe: 503 until the models are loaded, so supervisors and load
+# balancers only send traffic to workers that can classify
+@app.route('/api/ready', methods=['GET'])
+def readiness_check():
+    ready = READY.is_set()
+    return jsonify({"ready": ready, "pid": os.getpid()}), 200 if ready else 503
+
 # Health check endpoint
 @app.route('/api/health', methods=['GET'])
 def health_check():
@@ -453,7 +1171,20 @@ def health_check():
         "status": "ok",
         "serverTime": time.time(),
         "modelLoaded": MODEL is not None,
-        "sampleImagesLoaded": {k: len(v) for k, v in SAMPLE_IMAGES.items()}
+        "modelBackend": MODEL_BACKEND,
+        "modelFormat": MODEL_FORMAT,
+        "process": {"pid": os.getpid(), "memory": process_memory()},
+        "fallbackModelLoaded": FALLBACK_MODEL is not None,
+        "fastModelLoaded": FAST_MODEL is not None,
+        "cascadeThreshold": CASCADE_THRESHOLD if FAST_MODEL is not None else None,
+        "embeddingIndex": EMBEDDING_INDEX.stats() if EMBEDDING_INDEX is not None else None,
+        "onlineLearning": ONLINE_TRAINER.stats() if ONLINE_TRAINER is not None else None,
+        "sampleImagesLoaded": {k: len(v) for k, v in SAMPLE_IMAGES.items()},
+        "admission": ADMISSION.stats(),
+        "serialization": serialization.stats(),
+        "threadConfig": dict(THREAD_CONFIG["chosen"], source=THREAD_CONFIG["source"],
+                             tunedAt=THREAD_CONFIG["tunedAt"]) if THREAD_CONFIG is not None else None,
+        "degradation": ROUTER.stats()
     })
 
 # Get sample image endpoint
@@ -465,6 +1196,12 @@ def get_sample_image(category):
     # Get a random image from the category
     image_path = random.choice(SAMPLE_IMAGES[category])
     
+    # Send list views to the cached thumbnail when one exists
+    if request.args.get('thumbnail'):
+        key = THUMBNAILS.key_for_file(image_path)
+        if key is not None:
+            return redirect(url_for('get_thumbnail', key=key))
+    
     try:
         # Open the image and convert to bytes
         img = Image.open(image_path)
@@ -478,11 +1215,30 @@ def get_sample_image(category):
         logger.error(f"Error sending image: {str(e)}")
         return jsonify({"error": "Failed to load image"}), 500
 
+# Thumbnail endpoint
+@app.route('/api/thumbnails/<key>', methods=['GET'])
+def get_thumbnail(key):
+    if len(key) != 64 or any(c not in '0123456789abcdef' for c in key):
+        return jsonify({"error": "Invalid thumbnail key"}), 400
+    
+    if request.headers.get('If-None-Match') == f'"{key}"':
+        return '', 304
+    
+    path = THUMBNAILS.get(key)
+    if path is None:
+        return jsonify({"error": "Thumbnail not found"}), 404
+    
+    response = send_file(path, mimetype=THUMBNAILS.mimetype, max_age=THUMBNAIL_MAX_AGE, etag=key)
+    response.headers['Cache-Control'] = f"public, max-age={THUMBNAIL_MAX_AGE}, immutable"
+    return response
+
 # Image classification endpoint
 @app.route('/api/classify', methods=['POST'])
+@admission_controlled
 def classify_image():
     try:
-        data = request.json
+        with STAGE_SECONDS.time('parse'):
+            data = request.json
         
         if not data or 'image' not in data:
             return jsonify({
@@ -492,18 +1248,38 @@ def classify_image():
         # Get base64 image data
         image_data = data['image']
         
-        # Remove data URL prefix if present
-        if ',' in image_data:
-            image_data = image_data.split(',')[1]
+        # Decode once so the thumbnail store can reuse the raw bytes
+        with STAGE_SECONDS.time('decode'):
+            try:
+                image_bytes = decode_base64_image(image_data)
+            except (binascii.Error, ValueError, TypeError) as e:
+                return jsonify({
+                    "error": "Image data is not valid base64",
+                    "details": str(e)
+                }), 400
         
         # Load and process the image
-        image = load_image_from_base64(image_data)
+        with STAGE_SECONDS.time('open'):
+            image = load_image_from_base64(image_data, image_bytes, PixelBudget(REQUEST_PIXEL_BUDGET))
         
         # Make prediction
         result = predict(MODEL, image)
         
-        return jsonify(result)
+        # Render a small thumbnail for list views in the background
+        key = None
+        if image is not None:
+            key = THUMBNAILS.submit_bytes(image_bytes)
+            result["thumbnailUrl"] = url_for('get_thumbnail', key=key)
+        
+        record_classification(result, "upload", thumbnail_key=key)
+        
+        with STAGE_SECONDS.time('serialize'):
+            response = negotiated_response(result)
+        response.headers['X-Model-Tier'] = result.get("tier", "unknown")
+        return response
     
+    except ImageRejected:
+        raise
     except Exception as e:
         logger.error(f"Error during classification: {str(e)}")
         return jsonify({
@@ -511,147 +1287,349 @@ def classify_image():
             "details": str(e)
         }), 500
 
+# Similar images from the embedding index
+def similar_item_json(distance, item_id, item):
+    return {
+        "id": item_id,
+        "distance": round(distance, 4),
+        "category": item.get("category"),
+        "wasteType": item.get("wasteType"),
+        "source": item.get("source"),
+        "imageUrl": url_for('get_embedding_image', item_id=item_id)
+    }
+
+@app.route('/api/similar', methods=['POST'])
+@admission_controlled
+def find_similar_images():
+    """Nearest indexed images to an uploaded one"""
+    if EMBEDDING_INDEX is None:
+        return jsonify({"error": "Embedding index is not available"}), 503
+    
+    data = request.json
+    if not data or 'image' not in data:
+        return jsonify({"error": "No image data provided"}), 400
+    
+    image = load_image_from_base64(data['image'], budget=PixelBudget(REQUEST_PIXEL_BUDGET))
+    if image is None:
+        return jsonify({"error": "Could not decode image"}), 400
+    
+    k = min(max(int(data.get('k', 8)), 1), 50)
+    embedding, _ = embed_image(image)
+    matches = EMBEDDING_INDEX.search(embedding, k=k)
+    return jsonify({"results": [similar_item_json(*match) for match in matches]})
+
+@app.route('/api/similar/<int:item_id>', methods=['GET'])
+def find_similar_to_item(item_id):
+    """Nearest indexed images to one already in the index, e.g. a result's embeddingId"""
+    if EMBEDDING_INDEX is None or not 0 <= item_id < len(EMBEDDING_INDEX):
+        return jsonify({"error": "Item not found"}), 404
+    
+    k = min(max(request.args.get('k', 8, type=int), 1), 50)
+    matches = EMBEDDING_INDEX.search(EMBEDDING_INDEX.vector(item_id), k=k + 1)
+    results = [similar_item_json(*match) for match in matches if match[1] != item_id][:k]
+    return jsonify({"results": results})
+
+@app.route('/api/embeddings/<int:item_id>/image', methods=['GET'])
+def get_embedding_image(item_id):
+    """Image behind an index item: its thumbnail, or the dataset file it came from"""
+    if EMBEDDING_INDEX is None or not 0 <= item_id < len(EMBEDDING_INDEX):
+        return jsonify({"error": "Item not found"}), 404
+    
+    item = EMBEDDING_INDEX.items[item_id]
+    if item.get('thumbnailKey'):
+        return redirect(url_for('get_thumbnail', key=item['thumbnailKey']))
+    if item.get('path'):
+        # Dataset paths are stored relative to the repository root
+        path = os.path.join(os.path.dirname(PROJECT_DIR), item['path'])
+        key = THUMBNAILS.key_for_file(item['path']) or THUMBNAILS.key_for_file(path)
+        if key is not None:
+            return redirect(url_for('get_thumbnail', key=key))
+        if os.path.exists(path):
+            return send_file(path, mimetype='image/jpeg', max_age=THUMBNAIL_MAX_AGE)
+    return jsonify({"error": "No image stored for this item"}), 404
+
+# Classification history endpoints
+@app.route('/api/history', methods=['GET'])
+def get_history():
+    try:
+        limit = min(int(request.args.get('limit', 50)), HISTORY_MAX_PAGE_SIZE)
+        before_id = request.args.get('before', type=int)
+    except ValueError:
+        return jsonify({"error": "limit must be an integer"}), 400
+    
+    records = HISTORY.history(limit=limit, before_id=before_id, category=request.args.get('category'))
+    for record in records:
+        if record["thumbnailKey"]:
+            record["thumbnailUrl"] = url_for('get_thumbnail', key=record["thumbnailKey"])
+    
+    return jsonify({
+        "records": records,
+        # Pass this back as ?before= to fetch the next page
+        "nextBefore": records[-1]["id"] if len(records) == limit else None
+    })
+
+@app.route('/api/history/counts', methods=['GET'])
+def get_history_counts():
+    bucket = request.args.get('bucket', 'hour')
+    if bucket not in BUCKETS:
+        return jsonify({"error": f"bucket must be one of: {', '.join(BUCKETS)}"}), 400
+    
+    since = request.args.get('since', type=float)
+    until = request.args.get('until', type=float)
+    return jsonify({
+        "bucket": bucket,
+        "bucketSeconds": BUCKETS[bucket],
+        "buckets": HISTORY.counts(bucket, since=since, until=until)
+    })
+
+# Aggregate statistics endpoint
+@app.route('/api/stats', methods=['GET'])
+def get_stats():
+    bucket = request.args.get('bucket', 'hour')
+    if bucket not in RESOLUTIONS:
+        return jsonify({"error": f"bucket must be one of: {', '.join(RESOLUTIONS)}"}), 400
+    limit = request.args.get('buckets', 24, type=int)
+    
+    # Pick up what every worker wrote to the shared history (a no-op for one worker)
+    STATS.sync(HISTORY)
+    
+    # Cheap revalidation: the ETag only changes when a classification is recorded
+    etag = STATS.etag
+    if request.headers.get('If-None-Match') == etag:
+        return '', 304
+    
+    response = jsonify(STATS.snapshot(bucket, limit))
+    response.headers['ETag'] = etag
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
 # Training status endpoint
 @app.route('/api/training-status', methods=['GET'])
 def get_training_status():
-    return jsonify(TRAINING_STATUS)
+    return jsonify(read_training_status())
 
-# Model training endpoint
+# Push channel for server events as Server-Sent Events
+@app.route('/api/events', methods=['GET'])
+@single_process_only
+def stream_events():
+    """Stream training progress and classification events; ?topics=training,classification"""
+    topics = [t for t in request.args.get('topics', '').split(',') if t] or None
+    last_event_id = request.headers.get('Last-Event-ID', request.args.get('lastEventId'))
+    try:
+        last_event_id = int(last_event_id) if last_event_id else None
+    except ValueError:
+        last_event_id = None
+    
+    subscription = EVENTS.subscribe(topics, last_event_id=last_event_id)
+    
+    def generate():
+        try:
+            # Reconnect quickly if the connection drops
+            yield "retry: 2000\n\n"
+            while True:
+                try:
+                    event = subscription.get(timeout=15)
+                except queue.Empty:
+                    # Comment line keeps proxies from closing an idle connection
+                    yield ": keep-alive\n\n"
+                    continue
+                yield event.to_sse()
+        finally:
+            EVENTS.unsubscribe(subscription)
+    
+    return Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+# Model training endpoint: labelled corrections update the classification head
 @app.route('/api/train', methods=['POST'])
+@single_process_only
 def train_model():
-    global TRAINING_STATUS
-    
-    # Check if already training
-    if TRAINING_STATUS["is_training"]:
-        return jsonify({
-            "error": "Model is already being trained",
-            "status": TRAINING_STATUS
-        }), 400
+    if ONLINE_TRAINER is None:
+        return jsonify({"error": "Online training needs the CNN model, which is not loaded"}), 503
     
-    # Get training parameters from request
     data = request.json or {}
-    epochs = data.get('epochs', 10)
+    samples = data.get('trainingData') or []
+    if not samples:
+        return jsonify({"error": "No training data provided"}), 400
     
-    # Start training in a separate thread
-    def training_process():
-        global TRAINING_STATUS, MODEL
-        
-        try:
-            # Update status
-            TRAINING_STATUS = {
-                "is_training": True,
-                "progress": 0,
-                "status": "preparing",
-                "message": "Preparing training data"
-            }
-            
-            # Simulate data preparation
-            time.sleep(2)
-            
-            # Update status for training
-            TRAINING_STATUS["status"] = "training"
-            TRAINING_STATUS["message"] = "Training in progress"
-            
-            # Simulate training process
-            for i in range(epochs):
-                # Update progress
-                TRAINING_STATUS["progress"] = (i + 1) / epochs * 100
-                TRAINING_STATUS["message"] = f"Training epoch {i + 1}/{epochs}"
-                
-                # Simulate epoch time
-                time.sleep(1)
-            
-            # Update status for completion
-            TRAINING_STATUS = {
-                "is_training": False,
-                "progress": 100,
-                "status": "complete",
-                "message": "Training completed successfully",
-                "results": {
-                    "accuracy": 0.92,
-                    "loss": 0.23,
-                    "epochsCompleted": epochs
-                }
-            }
-            
-        except Exception as e:
-            logger.error(f"Error during training: {str(e)}")
-            
-            # Update status for error
-            TRAINING_STATUS = {
-                "is_training": False,
-                "progress": 0,
-                "status": "error",
-                "message": f"Training failed: {str(e)}"
-            }
+    # Labels are category names; match them case-insensitively
+    names = {name.lower(): name for name in CNN_CLASS_NAMES}
+    images, labels = [], []
+    # One budget for the whole batch, so many images can't add up to a huge decode
+    budget = PixelBudget(REQUEST_PIXEL_BUDGET)
+    for sample in samples:
+        label = names.get(str(sample.get('label', '')).lower())
+        image = load_image_from_base64(sample.get('imageData', ''), budget=budget) if label else None
+        if image is not None:
+            images.append(image)
+            labels.append(label)
     
-    # Start the training thread
-    threading.Thread(target=training_process).start()
+    # Embedding happens on the trainer's thread, which also corrects the
+    # embedding index before it refits the head
+    accepted = ONLINE_TRAINER.submit(images, labels)
+    if accepted:
+        set_training_status({
+            "is_training": True,
+            "progress": 0,
+            "status": "queued",
+            "message": f"{accepted} corrections queued for the next head update"
+        })
     
     return jsonify({
-        "status": "training started",
-        "trainingStatus": TRAINING_STATUS
-    })
+        "status": "training queued" if accepted else "nothing to train",
+        "message": f"Queued {accepted} of {len(samples)} labelled images for training",
+        "accepted": accepted,
+        "rejected": len(samples) - accepted,
+        "trainingStatus": read_training_status()
+    }), 200 if accepted else 400
+
+def encode_frame_jpeg(frame):
+    """Encode a BGR webcam frame as JPEG bytes"""
+    ok, buffer = cv2.imencode('.jpg', frame)
+    if not ok:
+        raise ValueError("Could not encode webcam frame")
+    return buffer.tobytes()
+
+# Skips inference on near-identical consecutive camera frames
+WEBCAM_GATE = SceneChangeGate(threshold=SCENE_CHANGE_THRESHOLD, max_age=SCENE_CHANGE_MAX_AGE)
+
+def classify_webcam_frame(frame, reused_image=False):
+    """Classify a BGR webcam frame, reusing the last result while the scene is unchanged.
+
+    New results get a thumbnailUrl, small enough for clients to keep in their
+    history. It is attached before the gate caches the result, so reused
+    results carry the same thumbnail. Reused results only get the frame's
+    imageData, and are only recorded, when reused_image is set; the stream
+    drops them, so encoding the frame would be wasted.
+    """
+    encoded = {}
+    
+    def classify(f):
+        result = predict(MODEL, WebcamStream.to_pil(f))
+        encoded["jpeg"] = encode_frame_jpeg(f)
+        key = THUMBNAILS.submit_bytes(encoded["jpeg"])
+        # Built by hand: the stream classifies outside any request, where url_for can't run
+        result["thumbnailUrl"] = f"/api/thumbnails/{key}"
+        record_classification(result, "webcam", thumbnail_key=key)
+        return result
+
+    result = WEBCAM_GATE.run(frame, classify)
+    if result is None:
+        return None
+    if result.get("sceneReused"):
+        if not reused_image:
+            return result
+        # A capture the client adds to its history, so record it here as well
+        record_classification(result, "webcam", thumbnail_key=result["thumbnailUrl"].rsplit('/', 1)[-1])
+    
+    result = dict(result)
+    jpeg = encoded.get("jpeg") or encode_frame_jpeg(frame)
+    result["imageData"] = f"data:image/jpeg;base64,{base64.b64encode(jpeg).decode('utf-8')}"
+    return result
+
+# Shared webcam reader, opened on first use and kept open between requests
+WEBCAM_STREAM = WebcamStream(
+    classify_webcam_frame,
+    camera_index=WEBCAM_INDEX,
+    min_interval=WEBCAM_MIN_INTERVAL,
+    idle_timeout=WEBCAM_IDLE_TIMEOUT
+)
 
 # New endpoint for webcam capture
 @app.route('/api/webcam-capture', methods=['GET'])
+@single_process_only
+@admission_controlled
 def webcam_capture():
     """Capture an image from the webcam and return it"""
-    global webcam
-    
     if not OPENCV_AVAILABLE:
         return jsonify({"error": "OpenCV is not available on the server"}), 503
     
     try:
-        # Initialize webcam if not already done
-        if webcam is None:
-            webcam = cv2.VideoCapture(0)  # Use default camera (index 0)
-            
-            # Check if webcam opened successfully
-            if not webcam.isOpened():
-                return jsonify({"error": "Could not open webcam"}), 500
-                
-            # Give webcam time to initialize
-            time.sleep(1)
+        # Open the shared webcam if it isn't streaming already
+        if not WEBCAM_STREAM.start():
+            return jsonify({"error": "Could not open webcam"}), 500
         
-        # Capture frame
-        ret, frame = webcam.read()
+        # Take the newest frame from the capture thread
+        frame_id, frame = WEBCAM_STREAM.latest_frame()
         
-        if not ret:
+        if frame is None:
             return jsonify({"error": "Failed to capture image from webcam"}), 500
         
-        # Convert the image from BGR to RGB (for PIL)
-        frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        
-        # Convert to PIL Image
-        pil_img = Image.fromarray(frame_rgb)
-        
-        # Convert to base64 for sending to frontend
-        img_byte_arr = io.BytesIO()
-        pil_img.save(img_byte_arr, format='JPEG')
-        img_byte_arr.seek(0)
-        img_base64 = base64.b64encode(img_byte_arr.read()).decode('utf-8')
-        
-        # Classify the image
-        result = predict(MODEL, pil_img)
-        
-        # Add the image data
-        result["imageData"] = f"data:image/jpeg;base64,{img_base64}"
+        # Classify the image and add the image data
+        result = classify_webcam_frame(frame, reused_image=True)
         
-        return jsonify(result)
+        return negotiated_response(result)
         
     except Exception as e:
         logger.error(f"Error during webcam capture: {str(e)}")
         return jsonify({"error": f"Webcam error: {str(e)}"}), 500
 
-# Cleanup webcam on shutdown
-@app.teardown_appcontext
-def cleanup_webcam(exception):
-    global webcam
-    if webcam is not None:
-        webcam.release()
-        webcam = None
-        logger.info("Webcam released")
+# Continuous webcam classification pushed as Server-Sent Events
+@app.route('/api/webcam-stream', methods=['GET'])
+@single_process_only
+def webcam_stream():
+    """Stream classification results for the live webcam feed"""
+    if not OPENCV_AVAILABLE:
+        return jsonify({"error": "OpenCV is not available on the server"}), 503
+    
+    try:
+        if not WEBCAM_STREAM.start():
+            return jsonify({"error": "Could not open webcam"}), 500
+    except Exception as e:
+        logger.error(f"Error starting webcam stream: {str(e)}")
+        return jsonify({"error": f"Webcam error: {str(e)}"}), 500
+    
+    subscription = WEBCAM_STREAM.subscribe()
+    
+    def generate():
+        try:
+            while WEBCAM_STREAM.is_running:
+                try:
+                    result = subscription.get(timeout=15)
+                except queue.Empty:
+                    # Comment line keeps proxies from closing an idle connection
+                    yield ": keep-alive\n\n"
+                    continue
+                yield f"event: classification\ndata: {json.dumps(result)}\n\n"
+        finally:
+            WEBCAM_STREAM.unsubscribe(subscription)
+    
+    return Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+@app.route('/api/webcam-stream/status', methods=['GET'])
+@single_process_only
+def webcam_stream_status():
+    return jsonify(dict(WEBCAM_STREAM.status(), sceneGate=WEBCAM_GATE.stats()))
+
+@app.route('/api/webcam-stream/stop', methods=['POST'])
+@single_process_only
+def webcam_stream_stop():
+    WEBCAM_STREAM.stop()
+    WEBCAM_GATE.reset()
+    return jsonify(dict(WEBCAM_STREAM.status(), sceneGate=WEBCAM_GATE.stats()))
+
+# Release the webcam, flush history, stop the thumbnail workers and save the
+# embedding index on shutdown
+@atexit.register
+def cleanup_webcam():
+    WEBCAM_STREAM.stop()
+    HISTORY.close()
+    THUMBNAILS.shutdown()
+    if ONLINE_TRAINER is not None:
+        ONLINE_TRAINER.stop()
+    
+    # Keep images indexed during this run for the next one; save() merges with
+    # what other worker processes saved to the same path
+    if EMBEDDING_INDEX is not None and EMBEDDING_INDEX.dirty:
+        try:
+            EMBEDDING_INDEX.save(EMBEDDING_INDEX_PATH)
+        except Exception as e:
+            logger.error(f"Error saving embedding index: {str(e)}")
 
 # Basic index route
 @app.route('/', methods=['GET'])
@@ -736,5 +1714,14 @@ if __name__ == '__main__':
     # Load the model before starting the server
     load_model_on_startup()
     
-    # Run the Flask app
-    app.run(host='0.0.0.0', port=5000, debug=True) 
\ No newline at end of file
+    if os.environ.get('SERVER_SUPERVISED'):
+        # start.py stops the server with SIGTERM; exit through SystemExit so the
+        # atexit handler flushes history and saves the embedding index
+        from prefork import exit_on_sigterm
+        signal.signal(signal.SIGTERM, exit_on_sigterm)
+        # Supervised by start.py where prefork.py can't fork (Windows): no reloader,
+        # so the pid stays this process
+        app.run(host='0.0.0.0', port=SERVER_PORT, threaded=True)
+    else:
+        # Run the Flask app
+        app.run(host='0.0.0.0', port=SERVER_PORT, debug=True)
@@ -0,0 +1,88 @@
+"""
+Degradation Router
+------------------
+Picks which model tier answers a classification based on current load. When
+the admission queue grows or recent latency passes a threshold the router
+steps down to a cheaper tier, and it steps back up once load has stayed low
+for a cooldown period. Separate enter/exit thresholds keep it from flapping.
+"""
+
+import time
+import threading
+from collections import deque
+
+
+class DegradationRouter:
+    """Load-aware tier selection with hysteresis"""
+
+    def __init__(self, tiers, queue_threshold=4, latency_threshold=1.0,
+                 recover_ratio=0.5, cooldown=10.0, min_dwell=2.0, window=50):
+        # Tiers are ordered from most accurate to cheapest
+        self.tiers = list(tiers)
+        self.queue_threshold = queue_threshold
+        self.latency_threshold = latency_threshold
+        self.recover_ratio = recover_ratio
+        self.cooldown = cooldown
+        self.min_dwell = min_dwell
+
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=window)
+        self.level = 0
+        self.changed_at = time.monotonic()
+        self.transitions = 0
+
+    def set_queue_threshold(self, queue_threshold):
+        """Change the queue depth that counts as overloaded, e.g. after the slot pool is resized"""
+        with self._lock:
+            self.queue_threshold = queue_threshold
+
+    def observe(self, seconds):
+        """Record the end-to-end latency of a finished classify request"""
+        with self._lock:
+            self._latencies.append(seconds)
+
+    def _p95(self):
+        if not self._latencies:
+            return 0.0
+        values = sorted(self._latencies)
+        return values[min(len(values) - 1, int(0.95 * len(values)))]
+
+    def _move(self, level, now):
+        self.level = level
+        self.changed_at = now
+        self.transitions += 1
+        # Latencies measured on the previous tier say little about the new one
+        self._latencies.clear()
+
+    def choose(self, queue_depth, available):
+        """Return the tier to use; tiers not in available are skipped"""
+        now = time.monotonic()
+        with self._lock:
+            p95 = self._p95()
+            dwell = now - self.changed_at
+            overloaded = queue_depth >= self.queue_threshold or p95 > self.latency_threshold
+            healthy = (queue_depth <= self.queue_threshold * self.recover_ratio
+                       and p95 < self.latency_threshold * self.recover_ratio)
+
+            if overloaded and self.level < len(self.tiers) - 1 and dwell >= self.min_dwell:
+                self._move(self.level + 1, now)
+            elif healthy and self.level > 0 and dwell >= self.cooldown:
+                self._move(self.level - 1, now)
+
+            for tier in self.tiers[self.level:]:
+                if tier in available:
+                    return tier
+            return self.tiers[-1]
+
+    def stats(self):
+        with self._lock:
+            return {
+                "tier": self.tiers[self.level],
+                "level": self.level,
+                "tiers": self.tiers,
+                "p95LatencySeconds": round(self._p95(), 4),
+                "queueThreshold": self.queue_threshold,
+                "latencyThresholdSeconds": self.latency_threshold,
+                "transitions": self.transitions,
+                "secondsSinceChange": round(time.monotonic() - self.changed_at, 1),
+            }
@@ -0,0 +1,324 @@
+"""
+Embedding Index
+---------------
+Nearest-neighbour search over L2-normalised CNN embeddings, used to answer
+near-duplicate images with a cached label and to find similar images.
+
+Vectors are searched exactly by default. An inverted file (IVF) restricts a
+query to the few closest k-means partitions, and product quantisation (PQ)
+replaces each vector with one byte per sub-vector, shrinking a 1280-d float
+vector from 5 KiB to pq_m bytes. Saved indexes are memory-mapped on load, so
+several server processes share one copy through the page cache.
+
+Each process only appends to its own copy. save() therefore takes a file lock
+and merges: rows and item updates added since this copy was loaded are applied
+on top of what other processes saved in the meantime. This only happens while
+both copies come from the same build, so a rebuilt index replaces the old one.
+
+Distances are cosine distances (1 - cosine similarity), in [0, 2].
+"""
+
+import os
+import json
+import uuid
+import logging
+import threading
+import contextlib
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:
+    # Windows runs the server as a single process, so there is nothing to lock against
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+PQ_CODES = 256
+KMEANS_CHUNK = 8192
+
+
+def normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def _nearest(data, centroids):
+    """Index of the nearest centroid (squared L2) for every row, computed in chunks"""
+    centroid_norms = (centroids ** 2).sum(axis=1)
+    labels = np.empty(len(data), dtype=np.int32)
+    for start in range(0, len(data), KMEANS_CHUNK):
+        chunk = data[start:start + KMEANS_CHUNK]
+        distances = centroid_norms - 2 * chunk @ centroids.T
+        labels[start:start + KMEANS_CHUNK] = distances.argmin(axis=1)
+    return labels
+
+
+def kmeans(data, k, iterations=20, seed=0):
+    """Plain Lloyd's k-means; empty clusters are re-seeded from random points"""
+    rng = np.random.default_rng(seed)
+    data = np.asarray(data, dtype=np.float32)
+    k = min(k, len(data))
+    centroids = data[rng.choice(len(data), k, replace=False)].copy()
+    for _ in range(iterations):
+        labels = _nearest(data, centroids)
+        counts = np.bincount(labels, minlength=k)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, labels, data)
+        empty = counts == 0
+        centroids[~empty] = sums[~empty] / counts[~empty, None]
+        if empty.any():
+            centroids[empty] = data[rng.choice(len(data), int(empty.sum()), replace=False)]
+    return centroids
+
+
+@contextlib.contextmanager
+def _locked(path):
+    """Exclusive lock on a file, held for the with block"""
+    with open(path, 'a') as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+class EmbeddingIndex:
+    """Append-only vector index with optional IVF partitioning and PQ compression"""
+
+    def __init__(self, dim=1280, nlist=0, pq_m=0, nprobe=8):
+        if pq_m and dim % pq_m:
+            raise ValueError(f"pq_m must divide the embedding size {dim}")
+        self.dim = dim
+        self.nlist = nlist
+        self.pq_m = pq_m
+        self.nprobe = nprobe
+
+        self._lock = threading.Lock()
+        self.centroids = None   # (nlist, dim) IVF partition centres
+        self.codebooks = None   # (pq_m, 256, dim / pq_m) PQ sub-vector centres
+        self.items = []
+        # Stored rows: float vectors, or uint8 PQ codes, plus IVF partition ids
+        self._data = np.zeros((0, pq_m or dim), dtype=np.uint8 if pq_m else np.float32)
+        self._lists = np.zeros(0, dtype=np.int32)
+        self._count = 0
+        self._saved_count = 0
+        self._changed_ids = set()   # saved items whose metadata was updated since
+        # Identifies one build; rows can only be merged between copies of the same one
+        self.generation = uuid.uuid4().hex
+
+    def __len__(self):
+        return self._count
+
+    @property
+    def dirty(self):
+        """Whether items were added since the index was loaded or saved"""
+        return bool(self._changed_ids) or self._count != self._saved_count
+
+    @property
+    def trained(self):
+        return (not self.nlist or self.centroids is not None) and (not self.pq_m or self.codebooks is not None)
+
+    def train(self, vectors, iterations=20, seed=0):
+        """Fit IVF centroids and PQ codebooks on a sample of embeddings"""
+        vectors = normalize(vectors)
+        self.generation = uuid.uuid4().hex
+        if self.nlist:
+            self.centroids = kmeans(vectors, self.nlist, iterations, seed)
+            self.nlist = len(self.centroids)
+        if self.pq_m:
+            sub = self.dim // self.pq_m
+            self.codebooks = np.stack([
+                kmeans(vectors[:, m * sub:(m + 1) * sub], PQ_CODES, iterations, seed + m)
+                for m in range(self.pq_m)
+            ])
+
+    def _encode(self, vectors):
+        if not self.pq_m:
+            return vectors
+        sub = self.dim // self.pq_m
+        codes = np.empty((len(vectors), self.pq_m), dtype=np.uint8)
+        for m in range(self.pq_m):
+            codes[:, m] = _nearest(vectors[:, m * sub:(m + 1) * sub], self.codebooks[m])
+        return codes
+
+    def add(self, vectors, items):
+        """Append embeddings with their metadata dicts; returns the new item ids"""
+        if not self.trained:
+            raise RuntimeError("Index must be trained before adding vectors")
+        vectors = normalize(np.atleast_2d(vectors))
+        rows = self._encode(vectors)
+        lists = _nearest(vectors, self.centroids) if self.nlist else np.zeros(len(vectors), dtype=np.int32)
+
+        with self._lock:
+            first = self._count
+            self._reserve(first + len(rows))
+            self._data[first:first + len(rows)] = rows
+            self._lists[first:first + len(rows)] = lists
+            self.items.extend(items)
+            self._count += len(rows)
+        return list(range(first, first + len(rows)))
+
+    def update_item(self, item_id, **fields):
+        with self._lock:
+            self.items[item_id] = dict(self.items[item_id], **fields)
+            if item_id < self._saved_count:
+                self._changed_ids.add(item_id)
+
+    def vector(self, item_id):
+        """Stored embedding of an item, reconstructed from its codes when PQ is used"""
+        row = self._data[item_id]
+        if not self.pq_m:
+            return np.array(row, dtype=np.float32)
+        return self.codebooks[np.arange(self.pq_m), row.astype(np.intp)].reshape(-1)
+
+    def _reserve(self, size):
+        """Grow the row buffers geometrically; memory-mapped rows are copied on first growth"""
+        if size <= len(self._data) and self._data.flags.writeable:
+            return
+        capacity = max(size, 2 * len(self._data), 1024)
+        data = np.zeros((capacity, self._data.shape[1]), dtype=self._data.dtype)
+        data[:self._count] = self._data[:self._count]
+        lists = np.zeros(capacity, dtype=np.int32)
+        lists[:self._count] = self._lists[:self._count]
+        self._data, self._lists = data, lists
+
+    def _distances(self, query, rows):
+        if not self.pq_m:
+            return 1.0 - rows @ query
+        # Asymmetric distance: look up each code's squared distance to the query
+        sub = self.dim // self.pq_m
+        parts = query.reshape(self.pq_m, 1, sub)
+        table = ((self.codebooks - parts) ** 2).sum(axis=2)
+        squared = table[np.arange(self.pq_m), rows.astype(np.intp)].sum(axis=1)
+        # For unit vectors, cosine distance is half the squared L2 distance
+        return squared / 2.0
+
+    def search(self, query, k=5, nprobe=None):
+        """Return up to k (distance, item id, item) tuples, nearest first"""
+        query = normalize(query).reshape(-1)
+        with self._lock:
+            count = self._count
+            data, lists = self._data, self._lists
+        if count == 0:
+            return []
+
+        if self.nlist:
+            # Same squared L2 metric that add() used to assign the vectors to lists;
+            # k-means centroids aren't unit length, so inner product would disagree
+            centroid_distances = (self.centroids ** 2).sum(axis=1) - 2 * self.centroids @ query
+            probe = np.argsort(centroid_distances)[:nprobe or self.nprobe]
+            candidates = np.flatnonzero(np.isin(lists[:count], probe))
+            if len(candidates) == 0:
+                return []
+            rows = data[candidates]
+        else:
+            # A slice is a view; fancy indexing would copy the whole index per query
+            candidates = None
+            rows = data[:count]
+
+        distances = self._distances(query, rows)
+        k = min(k, len(distances))
+        top = np.argpartition(distances, k - 1)[:k]
+        top = top[np.argsort(distances[top])]
+        ids = top if candidates is None else candidates[top]
+        return [(float(distances[i]), int(item_id), self.items[item_id]) for i, item_id in zip(top, ids)]
+
+    def save(self, path):
+        """Write the index to a directory, merged with what other processes saved to it.
+
+        Item ids added since the index was loaded may change, if another
+        process saved its own additions first.
+        """
+        os.makedirs(path, exist_ok=True)
+        with _locked(os.path.join(path, 'lock')):
+            on_disk = self.load_if_exists(path)
+            with self._lock:
+                if (on_disk is not None and on_disk.generation == self.generation
+                        and len(on_disk) >= self._saved_count):
+                    self._merge_into(on_disk)
+                self._write(path)
+
+    def _merge_into(self, saved):
+        """Rebase this copy's additions and item updates onto a saved copy of the same build"""
+        added = slice(self._saved_count, self._count)
+        items = list(saved.items)
+        for item_id in self._changed_ids:
+            items[item_id] = dict(items[item_id], **self.items[item_id])
+        items.extend(self.items[added])
+
+        count = saved._count + (self._count - self._saved_count)
+        data = np.zeros((max(count, 1024), self._data.shape[1]), dtype=self._data.dtype)
+        lists = np.zeros(len(data), dtype=np.int32)
+        data[:saved._count], lists[:saved._count] = saved._data[:saved._count], saved._lists[:saved._count]
+        data[saved._count:count], lists[saved._count:count] = self._data[added], self._lists[added]
+        self._data, self._lists, self.items, self._count = data, lists, items, count
+        self._saved_count = saved._count
+
+    def _write(self, path):
+        """Replace the saved files with this copy; the caller holds both locks"""
+        count = self._count
+        arrays = {'data': self._data[:count], 'lists': self._lists[:count]}
+        if self.centroids is not None:
+            arrays['centroids'] = self.centroids
+        if self.codebooks is not None:
+            arrays['codebooks'] = self.codebooks
+
+        for name, array in arrays.items():
+            tmp_path = os.path.join(path, f"{name}.tmp.npy")
+            np.save(tmp_path, np.ascontiguousarray(array))
+            os.replace(tmp_path, os.path.join(path, f"{name}.npy"))
+
+        meta = {'dim': self.dim, 'nlist': self.nlist, 'pqM': self.pq_m, 'nprobe': self.nprobe,
+                'generation': self.generation, 'count': count, 'items': self.items}
+        tmp_path = os.path.join(path, 'meta.json.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, os.path.join(path, 'meta.json'))
+        self._saved_count = count
+        self._changed_ids = set()
+
+    @classmethod
+    def load(cls, path):
+        """Open a saved index with its rows memory-mapped read-only"""
+        with open(os.path.join(path, 'meta.json')) as f:
+            meta = json.load(f)
+        index = cls(meta['dim'], meta['nlist'], meta['pqM'], meta.get('nprobe', 8))
+
+        def array(name, mmap_mode=None):
+            file_path = os.path.join(path, f"{name}.npy")
+            return np.load(file_path, mmap_mode=mmap_mode) if os.path.exists(file_path) else None
+
+        index._data = array('data', 'r')
+        index._lists = array('lists', 'r')
+        index.centroids = array('centroids')
+        index.codebooks = array('codebooks')
+        index.items = meta['items']
+        # Indexes saved before generations were recorded can't be merged into
+        index.generation = meta.get('generation', index.generation)
+        index._count = index._saved_count = meta['count']
+        return index
+
+    @classmethod
+    def load_if_exists(cls, path):
+        if not os.path.exists(os.path.join(path, 'meta.json')):
+            return None
+        try:
+            return cls.load(path)
+        except Exception as e:
+            logger.warning(f"Could not load embedding index from {path}: {str(e)}")
+            return None
+
+    def stats(self):
+        with self._lock:
+            return {
+                "items": self._count,
+                "dim": self.dim,
+                "nlist": self.nlist,
+                "pqM": self.pq_m,
+                "bytesPerVector": self._data.shape[1] * self._data.itemsize,
+            }
@@ -0,0 +1,116 @@
+"""
+Event Bus
+---------
+In-process publish/subscribe for server events such as training progress and
+new classifications. Each subscriber gets a bounded queue. When a slow client
+falls behind, its oldest events are dropped so publishers never block. Recent
+events are kept so reconnecting SSE clients can resume from Last-Event-ID, and
+the latest event per topic is replayed to new subscribers.
+"""
+
+import json
+import time
+import queue
+import threading
+from collections import deque
+
+
+class Event:
+    __slots__ = ("id", "topic", "data", "timestamp")
+
+    def __init__(self, event_id, topic, data):
+        self.id = event_id
+        self.topic = topic
+        self.data = data
+        self.timestamp = time.time()
+
+    def to_sse(self):
+        return f"id: {self.id}\nevent: {self.topic}\ndata: {json.dumps(self.data)}\n\n"
+
+
+class Subscription:
+    def __init__(self, topics, maxsize):
+        self.topics = set(topics) if topics else None
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.dropped = 0
+
+    def wants(self, topic):
+        return self.topics is None or topic in self.topics
+
+    def get(self, timeout=None):
+        return self.queue.get(timeout=timeout)
+
+
+class EventBus:
+    """Thread-safe fan-out of events to subscriber queues"""
+
+    def __init__(self, history=256):
+        self._lock = threading.Lock()
+        self._subscribers = []
+        self._history = deque(maxlen=history)
+        self._latest = {}
+        self._next_id = 1
+        self.published = 0
+
+    def publish(self, topic, data):
+        with self._lock:
+            event = Event(self._next_id, topic, data)
+            self._next_id += 1
+            self.published += 1
+            self._history.append(event)
+            self._latest[topic] = event
+            subscribers = [s for s in self._subscribers if s.wants(topic)]
+        for subscription in subscribers:
+            self._offer(subscription, event)
+        return event
+
+    @staticmethod
+    def _offer(subscription, event):
+        # Drop the oldest queued event rather than blocking the publisher
+        while True:
+            try:
+                subscription.queue.put_nowait(event)
+                return
+            except queue.Full:
+                try:
+                    subscription.queue.get_nowait()
+                    subscription.dropped += 1
+                except queue.Empty:
+                    pass
+
+    def subscribe(self, topics=None, last_event_id=None, maxsize=100):
+        """Subscribe to topics (None for all).
+
+        With last_event_id, missed events still in the history are queued first;
+        otherwise the latest event of each topic is, so clients start from the
+        current state.
+        """
+        subscription = Subscription(topics, maxsize)
+        with self._lock:
+            if last_event_id is not None:
+                backlog = [e for e in self._history if e.id > last_event_id]
+            else:
+                backlog = sorted(self._latest.values(), key=lambda e: e.id)
+            for event in backlog:
+                if subscription.wants(event.topic):
+                    self._offer(subscription, event)
+            self._subscribers.append(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            if subscription in self._subscribers:
+                self._subscribers.remove(subscription)
+
+    def latest(self, topic):
+        with self._lock:
+            event = self._latest.get(topic)
+        return event.data if event else None
+
+    def stats(self):
+        with self._lock:
+            return {
+                "subscribers": len(self._subscribers),
+                "published": self.published,
+                "dropped": sum(s.dropped for s in self._subscribers),
+            }
@@ -0,0 +1,190 @@
+"""
+Feature Model Classifier
+------------------------
+Small classical-ML fallback for machines without TensorFlow. Images are reduced
+to a compact colour/texture feature vector (HSV histograms, edge density and an
+LBP-style texture histogram) and classified with a softmax linear model that is
+trained by ../train_fallback_model.py and stored as a NumPy .npz file.
+"""
+
+import os
+import logging
+
+import numpy as np
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+THUMBNAIL_SIZE = (64, 64)
+HUE_BINS = 12
+SAT_BINS = 4
+VAL_BINS = 4
+LBP_BINS = 9  # Number of neighbours brighter than the centre pixel, 0-8
+EDGE_THRESHOLD = 32.0
+
+FEATURE_NAMES = (
+    [f"hue_{i}" for i in range(HUE_BINS)]
+    + [f"sat_{i}" for i in range(SAT_BINS)]
+    + [f"val_{i}" for i in range(VAL_BINS)]
+    + [f"lbp_{i}" for i in range(LBP_BINS)]
+    + ["edge_density", "gradient_mean", "r_mean", "g_mean", "b_mean", "r_std", "g_std", "b_std"]
+)
+
+# Waste types for each category, picked by image brightness
+CATEGORY_WASTE_TYPES = {
+    "Recyclable": ['plastic', 'glass', 'cardboard', 'paper'],
+    "Biodegradable": ['food waste', 'organic', 'plant matter', 'garden waste'],
+    "Non-recyclable": ['contaminated', 'composite', 'mixed materials'],
+}
+
+
+def load_thumbnails(img):
+    """Return (rgb, hsv) uint8 arrays of THUMBNAIL_SIZE for a PIL image or path"""
+    if not isinstance(img, Image.Image):
+        img = Image.open(img)
+        img.draft('RGB', (THUMBNAIL_SIZE[0] * 2, THUMBNAIL_SIZE[1] * 2))
+    if img.mode != 'RGB':
+        img = img.convert('RGB')
+    small = img.resize(THUMBNAIL_SIZE)
+    return np.asarray(small, dtype=np.uint8), np.asarray(small.convert('HSV'), dtype=np.uint8)
+
+
+def _batched_histogram(values, bins):
+    """Normalised histograms of (N, P) integer bin indices, computed with one bincount"""
+    n, p = values.shape
+    offsets = values + (np.arange(n) * bins)[:, None]
+    counts = np.bincount(offsets.ravel(), minlength=n * bins).reshape(n, bins)
+    return counts.astype(np.float32) / p
+
+
+def extract_features(rgb, hsv):
+    """Compute the feature matrix for (N, H, W, 3) uint8 RGB and HSV batches"""
+    n = len(rgb)
+    hsv = hsv.reshape(n, -1, 3).astype(np.int32)
+    hue = _batched_histogram(hsv[:, :, 0] * HUE_BINS // 256, HUE_BINS)
+    sat = _batched_histogram(hsv[:, :, 1] * SAT_BINS // 256, SAT_BINS)
+    val = _batched_histogram(hsv[:, :, 2] * VAL_BINS // 256, VAL_BINS)
+
+    gray = rgb.astype(np.float32).mean(axis=3)
+
+    # LBP-style texture: count of the 8 neighbours at least as bright as the centre
+    centre = gray[:, 1:-1, 1:-1]
+    brighter = np.zeros(centre.shape, dtype=np.int32)
+    for dy in (-1, 0, 1):
+        for dx in (-1, 0, 1):
+            if dy == 0 and dx == 0:
+                continue
+            neighbour = gray[:, 1 + dy:gray.shape[1] - 1 + dy, 1 + dx:gray.shape[2] - 1 + dx]
+            brighter += neighbour >= centre
+    lbp = _batched_histogram(brighter.reshape(n, -1), LBP_BINS)
+
+    # Edge density from simple finite-difference gradients
+    gx = gray[:, 1:-1, 2:] - gray[:, 1:-1, :-2]
+    gy = gray[:, 2:, 1:-1] - gray[:, :-2, 1:-1]
+    magnitude = np.sqrt(gx * gx + gy * gy).reshape(n, -1)
+    edge_density = (magnitude > EDGE_THRESHOLD).mean(axis=1)
+    gradient_mean = magnitude.mean(axis=1) / 255.0
+
+    pixels = rgb.reshape(n, -1, 3).astype(np.float32) / 255.0
+    return np.column_stack([
+        hue, sat, val, lbp, edge_density, gradient_mean, pixels.mean(axis=1), pixels.std(axis=1)
+    ]).astype(np.float32)
+
+
+def features_for_images(images):
+    """Load PIL images or paths and return their feature matrix"""
+    thumbnails = [load_thumbnails(img) for img in images]
+    rgb = np.stack([t[0] for t in thumbnails])
+    hsv = np.stack([t[1] for t in thumbnails])
+    return extract_features(rgb, hsv)
+
+
+class FeatureModelClassifier:
+    """Standardised features followed by a softmax linear layer"""
+
+    def __init__(self, classes, mean, scale, weights, bias):
+        self.classes = list(classes)
+        self.mean = mean
+        self.scale = scale
+        self.weights = weights
+        self.bias = bias
+
+    @classmethod
+    def fit(cls, features, labels, epochs=500, learning_rate=0.5, l2=1e-4):
+        """Fit multinomial logistic regression with full-batch gradient descent"""
+        classes = sorted(set(labels))
+        y = np.searchsorted(classes, labels)
+        mean = features.mean(axis=0)
+        scale = features.std(axis=0) + 1e-6
+        x = (features - mean) / scale
+
+        weights = np.zeros((x.shape[1], len(classes)), dtype=np.float32)
+        bias = np.zeros(len(classes), dtype=np.float32)
+        targets = np.eye(len(classes), dtype=np.float32)[y]
+
+        for _ in range(epochs):
+            probs = _softmax(x @ weights + bias)
+            error = (probs - targets) / len(x)
+            weights -= learning_rate * (x.T @ error + l2 * weights)
+            bias -= learning_rate * error.sum(axis=0)
+
+        return cls(classes, mean, scale, weights, bias)
+
+    @classmethod
+    def load(cls, path):
+        data = np.load(path, allow_pickle=False)
+        return cls(
+            [str(c) for c in data["classes"]],
+            data["mean"], data["scale"], data["weights"], data["bias"]
+        )
+
+    @classmethod
+    def load_if_exists(cls, path):
+        """Load the model if path exists, otherwise return None"""
+        if not path or not os.path.exists(path):
+            return None
+        try:
+            model = cls.load(path)
+            logger.info(f"Loaded fallback feature model from {path}")
+            return model
+        except Exception as e:
+            logger.warning(f"Could not load fallback feature model from {path}: {str(e)}")
+            return None
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        np.savez(
+            path, classes=np.array(self.classes), mean=self.mean, scale=self.scale,
+            weights=self.weights, bias=self.bias, feature_names=np.array(FEATURE_NAMES)
+        )
+
+    def predict_proba(self, features):
+        x = (features - self.mean) / self.scale
+        return _softmax(x @ self.weights + self.bias)
+
+    def classify_features(self, features):
+        """Return a list of (category, waste_type, accuracy) tuples"""
+        probs = self.predict_proba(features)
+        best = probs.argmax(axis=1)
+        # Brightness is the mean of the r/g/b mean features
+        brightness = features[:, -6:-3].mean(axis=1)
+
+        results = []
+        for i, index in enumerate(best):
+            category = self.classes[index]
+            choices = CATEGORY_WASTE_TYPES.get(category, ['unknown'])
+            waste_type = choices[min(int(brightness[i] * len(choices)), len(choices) - 1)]
+            results.append((category, waste_type, round(float(probs[i, index]) * 100, 1)))
+        return results
+
+    def classify(self, images):
+        """Classify a list of PIL images (or paths)"""
+        if not images:
+            return []
+        return self.classify_features(features_for_images(images))
+
+
+def _softmax(logits):
+    logits = logits - logits.max(axis=1, keepdims=True)
+    exp = np.exp(logits)
+    return exp / exp.sum(axis=1, keepdims=True)
@@ -0,0 +1,234 @@
+"""
+History Store
+-------------
+Server-side record of every classification, kept in SQLite (WAL mode).
+Requests only enqueue results; a background writer thread commits them in
+batches so the classify path never waits on disk. Reads use one connection
+per thread and are served from indexes on the timestamp and category columns.
+"""
+
+import os
+import json
+import time
+import queue
+import sqlite3
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Bucket widths (seconds) supported by the counts query
+BUCKETS = {
+    "minute": 60,
+    "hour": 3600,
+    "day": 86400,
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS classifications (
+    id INTEGER PRIMARY KEY,
+    ts REAL NOT NULL,
+    category TEXT NOT NULL,
+    waste_type TEXT,
+    accuracy REAL,
+    source TEXT,
+    thumbnail_key TEXT,
+    details TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_classifications_ts ON classifications (ts);
+CREATE INDEX IF NOT EXISTS idx_classifications_category_ts ON classifications (category, ts);
+"""
+
+
+class HistoryStore:
+    """SQLite-backed classification history with a batching writer thread"""
+
+    def __init__(self, path, batch_size=256, flush_interval=0.5, max_pending=10000):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._local = threading.local()
+        self._writer = None
+        self._stopping = threading.Event()
+        self.dropped = 0
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=10, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        # WAL makes NORMAL durable across application crashes, which is enough here
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _reader(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._connect()
+            self._local.conn = conn
+        return conn
+
+    def start(self):
+        """Create the schema and start the writer thread"""
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        conn = self._connect()
+        conn.executescript(SCHEMA)
+        conn.close()
+
+        self._writer = threading.Thread(target=self._write_loop, name="history-writer", daemon=True)
+        self._writer.start()
+        logger.info(f"Classification history stored in {self.path}")
+
+    def close(self):
+        """Flush pending records and stop the writer"""
+        if self._writer is None:
+            return
+        self._stopping.set()
+        self._writer.join(timeout=5.0)
+        self._writer = None
+
+    def record(self, result, source="upload", thumbnail_key=None, timestamp=None):
+        """Queue a classification result for writing; never blocks the caller"""
+        row = (
+            timestamp or time.time(),
+            result.get("category"),
+            result.get("wasteType"),
+            result.get("accuracy"),
+            source,
+            thumbnail_key,
+            json.dumps(result.get("details", {})),
+        )
+        try:
+            self._queue.put_nowait(row)
+        except queue.Full:
+            self.dropped += 1
+            if self.dropped % 1000 == 1:
+                logger.warning(f"History queue full, dropped {self.dropped} records so far")
+
+    def _write_loop(self):
+        conn = self._connect()
+        try:
+            while not (self._stopping.is_set() and self._queue.empty()):
+                try:
+                    batch = [self._queue.get(timeout=self.flush_interval)]
+                except queue.Empty:
+                    continue
+
+                # Collect whatever else arrives within the flush interval
+                deadline = time.time() + self.flush_interval
+                while len(batch) < self.batch_size:
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        break
+                    try:
+                        batch.append(self._queue.get(timeout=remaining))
+                    except queue.Empty:
+                        break
+
+                try:
+                    with conn:
+                        conn.executemany(
+                            "INSERT INTO classifications "
+                            "(ts, category, waste_type, accuracy, source, thumbnail_key, details) "
+                            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                            batch
+                        )
+                except sqlite3.Error as e:
+                    logger.error(f"Error writing {len(batch)} history records: {str(e)}")
+        finally:
+            conn.close()
+
+    def history(self, limit=50, before_id=None, category=None):
+        """Return the newest records, paginated by id (pass the last id as before_id)"""
+        clauses, params = [], []
+        if before_id is not None:
+            clauses.append("id < ?")
+            params.append(before_id)
+        if category:
+            clauses.append("category = ?")
+            params.append(category)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+
+        rows = self._reader().execute(
+            f"SELECT id, ts, category, waste_type, accuracy, source, thumbnail_key, details "
+            f"FROM classifications {where} ORDER BY id DESC LIMIT ?",
+            (*params, limit)
+        ).fetchall()
+
+        return [
+            {
+                "id": row["id"],
+                "timestamp": row["ts"],
+                "category": row["category"],
+                "wasteType": row["waste_type"],
+                "accuracy": row["accuracy"],
+                "source": row["source"],
+                "thumbnailKey": row["thumbnail_key"],
+                "details": json.loads(row["details"]) if row["details"] else {},
+            }
+            for row in rows
+        ]
+
+    def counts(self, bucket="hour", since=None, until=None, max_id=None):
+        """Return per-category counts grouped into fixed-width time buckets"""
+        width = BUCKETS[bucket]
+        until = until or time.time()
+        since = since if since is not None else until - width * 24
+        id_clause = " AND id <= ?" if max_id is not None else ""
+
+        rows = self._reader().execute(
+            "SELECT CAST(ts / ? AS INTEGER) * ? AS bucket, category, COUNT(*) AS n "
+            f"FROM classifications WHERE ts >= ? AND ts < ?{id_clause} "
+            "GROUP BY bucket, category ORDER BY bucket",
+            (width, width, since, until) + ((max_id,) if max_id is not None else ())
+        ).fetchall()
+
+        buckets = {}
+        for row in rows:
+            buckets.setdefault(row["bucket"], {})[row["category"]] = row["n"]
+        return [{"start": start, "counts": counts} for start, counts in buckets.items()]
+
+    def category_summary(self, max_id=None):
+        """Return count, accuracy sum and hazardous count (details.hazardous) per category"""
+        id_clause = "WHERE id <= ? " if max_id is not None else ""
+        rows = self._reader().execute(
+            "SELECT category, COUNT(*) AS n, SUM(accuracy) AS accuracy_sum, "
+            "SUM(COALESCE(json_extract(details, '$.hazardous'), 0)) AS hazardous "
+            f"FROM classifications {id_clause}GROUP BY category",
+            (max_id,) if max_id is not None else ()
+        ).fetchall()
+        return [
+            {
+                "category": row["category"],
+                "count": row["n"],
+                "accuracySum": row["accuracy_sum"],
+                "hazardous": row["hazardous"] or 0,
+            }
+            for row in rows
+        ]
+
+    def rows_after(self, after_id):
+        """Return the fields the running stats need for every record newer than after_id"""
+        rows = self._reader().execute(
+            "SELECT id, ts, category, accuracy, "
+            "COALESCE(json_extract(details, '$.hazardous'), 0) AS hazardous "
+            "FROM classifications WHERE id > ? ORDER BY id",
+            (after_id,)
+        ).fetchall()
+        return [
+            {
+                "id": row["id"],
+                "timestamp": row["ts"],
+                "category": row["category"],
+                "accuracy": row["accuracy"],
+                "hazardous": bool(row["hazardous"]),
+            }
+            for row in rows
+        ]
+
+    def last_id(self):
+        """Id of the newest record, 0 when there are none"""
+        return self._reader().execute("SELECT COALESCE(MAX(id), 0) FROM classifications").fetchone()[0]
+
+    def total(self):
+        return self._reader().execute("SELECT COUNT(*) FROM classifications").fetchone()[0]
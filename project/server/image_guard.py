@@ -0,0 +1,88 @@
+"""
+Image Guard
+-----------
+Checks uploaded images from their headers before any pixels are decoded.
+Image.open only parses the header, which is enough to learn the format and
+dimensions. Images in a format the server doesn't accept, or with more pixels
+than the limit, are rejected at that point. A decompression bomb (a few KB of
+PNG declaring gigapixel dimensions) therefore costs nothing.
+
+Large images that are accepted are decoded at reduced size. JPEG decodes
+straight to 1/2, 1/4 or 1/8 scale via draft(), and other formats are shrunk
+right after decoding. A per-request pixel budget caps the total decoded across
+all images in one request.
+"""
+
+import io
+
+from PIL import Image
+
+DEFAULT_FORMATS = frozenset({'JPEG', 'PNG', 'WEBP', 'BMP', 'GIF'})
+
+
+class ImageRejected(Exception):
+    """Raised when an upload exceeds a limit; carries the HTTP status to send"""
+
+    def __init__(self, status, reason, code):
+        super().__init__(reason)
+        self.status = status
+        self.reason = reason
+        self.code = code    # short machine-readable cause, used as a metric label
+
+
+class PixelBudget:
+    """Pixels one request may still decode"""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.used = 0
+
+    def charge(self, pixels):
+        if self.used + pixels > self.limit:
+            raise ImageRejected(413, f"Request exceeds its budget of {self.limit} decoded pixels", "budget")
+        self.used += pixels
+
+
+def reduced_size(width, height, max_side):
+    """Size with the longer side scaled down to max_side, keeping the aspect ratio"""
+    scale = max_side / max(width, height)
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def open_image(data, max_pixels, max_side, formats=DEFAULT_FORMATS, budget=None):
+    """Decode image bytes to RGB within the limits.
+
+    Returns (image, info), where info has the format, the original size and
+    whether the image was downsampled. Raises ImageRejected before decoding when
+    a limit is exceeded.
+    """
+    try:
+        img = Image.open(io.BytesIO(data))
+    except Image.DecompressionBombError as e:
+        # Pillow's own check fires in open() above twice Image.MAX_IMAGE_PIXELS
+        raise ImageRejected(413, f"Image has more than the {max_pixels} pixel limit", "pixels") from e
+    width, height = img.size
+    info = {"format": img.format, "width": width, "height": height, "downsampled": False}
+
+    if formats and img.format not in formats:
+        raise ImageRejected(415, f"Unsupported image format {img.format}", "format")
+    if width * height > max_pixels:
+        raise ImageRejected(413, f"Image is {width}x{height}, more than the {max_pixels} pixel limit", "pixels")
+
+    if max(width, height) > max_side:
+        target = reduced_size(width, height, max_side)
+        # Only JPEG can skip work here; the draft keeps at least the target size
+        img.draft('RGB', target)
+        info["downsampled"] = True
+    else:
+        target = None
+
+    if budget is not None:
+        budget.charge(img.size[0] * img.size[1])
+
+    img.load()
+    if img.mode != 'RGB':
+        img = img.convert('RGB')
+    if target is not None and img.size != target:
+        img = img.resize(target, Image.BILINEAR)
+    return img, info
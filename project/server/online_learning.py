@@ -0,0 +1,229 @@
+"""
+Online Head Training
+--------------------
+Learns from labelled corrections posted to /api/train without retraining the
+whole network. Each corrected image goes through the frozen backbone once and
+its pooled features are kept. A background worker then refits only the Dense
+head on all corrections so far, starting each time from the original head
+weights and mixing in a small replay set of dataset images so classes without
+corrections aren't forgotten. The result is handed back for a hot swap.
+
+TensorFlow is imported lazily because the server only builds a trainer when
+the CNN model is available.
+"""
+
+import os
+import time
+import logging
+import threading
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def split_model(model):
+    """Split a build_model() network into (backbone layers up to pooling, head layers)"""
+    import tensorflow as tf
+    for i, layer in enumerate(model.layers):
+        if isinstance(layer, tf.keras.layers.GlobalAveragePooling2D):
+            return model.layers[:i + 1], model.layers[i + 1:]
+    raise ValueError("Model has no GlobalAveragePooling2D layer")
+
+
+def clone_head(head_layers, feature_dim, weights):
+    """Fresh copy of the head layers as a model over pooled features"""
+    import tensorflow as tf
+    head = tf.keras.Sequential(
+        [tf.keras.Input(shape=(feature_dim,))]
+        + [layer.__class__.from_config(layer.get_config()) for layer in head_layers]
+    )
+    head.set_weights(weights)
+    return head
+
+
+def attach_head(backbone_layers, head):
+    """Full model sharing the backbone layers with a new head"""
+    import tensorflow as tf
+    # An explicit input keeps the result usable as a functional graph, e.g. by build_embedding_model
+    inputs = tf.keras.Input(shape=tuple(backbone_layers[0].input.shape[1:]))
+    return tf.keras.Sequential([inputs] + list(backbone_layers) + list(head.layers))
+
+
+class OnlineHeadTrainer:
+    """Background worker that refits the classification head from buffered corrections"""
+
+    def __init__(self, model, class_names, extract_fn, swap_fn, status_fn=None, replay_fn=None,
+                 features_fn=None, state_path=None, debounce=2.0, max_samples=5000, epochs=30,
+                 learning_rate=1e-3):
+        self.class_names = list(class_names)
+        self.extract_fn = extract_fn    # list of PIL images -> (n, feature_dim) features
+        self.swap_fn = swap_fn          # called with the new full model
+        self.status_fn = status_fn or (lambda status: None)
+        self.replay_fn = replay_fn      # -> (PIL images, class indices) kept from the dataset
+        self.features_fn = features_fn  # called with each new batch's (features, class names)
+        self.state_path = state_path
+        self.debounce = debounce
+        self.max_samples = max_samples
+        self.epochs = epochs
+        self.learning_rate = learning_rate
+
+        self.backbone_layers, self.head_layers = split_model(model)
+        self.base_weights = [w for layer in self.head_layers for w in layer.get_weights()]
+        self.feature_dim = int(self.backbone_layers[-1].output.shape[-1])
+
+        self._cond = threading.Condition()
+        self._pending = []
+        self._features = np.zeros((0, self.feature_dim), dtype=np.float32)
+        self._labels = np.zeros(0, dtype=np.int64)
+        self._replay = None
+        self._thread = None
+        self._stopped = False
+        self.version = 0
+
+    def start(self):
+        self._load_state()
+        self._thread = threading.Thread(target=self._run, name="online-head-trainer", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+
+    def submit(self, images, labels):
+        """Queue labelled images; labels are class names. Returns the number accepted."""
+        accepted = [(img, self.class_names.index(label)) for img, label in zip(images, labels)
+                    if label in self.class_names]
+        if accepted:
+            with self._cond:
+                self._pending.extend(accepted)
+                self._cond.notify()
+        return len(accepted)
+
+    def stats(self):
+        with self._cond:
+            return {
+                "version": self.version,
+                "corrections": int(len(self._labels)),
+                "pending": len(self._pending),
+                "perClass": {name: int((self._labels == i).sum()) for i, name in enumerate(self.class_names)},
+            }
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._stopped:
+                    self._cond.wait()
+                if self._stopped:
+                    return
+            # Let a burst of corrections arrive so they train together
+            time.sleep(self.debounce)
+            with self._cond:
+                batch, self._pending = self._pending, []
+            try:
+                self._update(batch)
+            except Exception as e:
+                logger.error(f"Online head update failed: {str(e)}")
+                self.status_fn({"is_training": False, "progress": 0, "status": "error",
+                                "message": f"Training failed: {str(e)}"})
+
+    def _update(self, batch):
+        started = time.perf_counter()
+        self.status_fn({"is_training": True, "progress": 10, "status": "preparing",
+                        "message": f"Extracting features for {len(batch)} corrected images"})
+
+        features = self.extract_fn([img for img, _ in batch])
+        labels = np.array([label for _, label in batch], dtype=np.int64)
+        if self.features_fn is not None:
+            self.features_fn(features, [self.class_names[label] for label in labels])
+        with self._cond:
+            self._features = np.concatenate([self._features, features])[-self.max_samples:]
+            self._labels = np.concatenate([self._labels, labels])[-self.max_samples:]
+            train_x, train_y = self._features, self._labels
+
+        if self._replay is None and self.replay_fn is not None:
+            replay_images, replay_labels = self.replay_fn()
+            self._replay = (self.extract_fn(replay_images) if replay_images else np.zeros((0, self.feature_dim)),
+                            np.asarray(replay_labels, dtype=np.int64))
+        if self._replay is not None and len(self._replay[1]):
+            train_x = np.concatenate([train_x, self._replay[0]])
+            train_y = np.concatenate([train_y, self._replay[1]])
+
+        self.status_fn({"is_training": True, "progress": 40, "status": "training",
+                        "message": f"Updating classification head on {len(train_y)} samples"})
+
+        import tensorflow as tf
+        head = clone_head(self.head_layers, self.feature_dim, self.base_weights)
+        head.compile(optimizer=tf.keras.optimizers.Adam(self.learning_rate),
+                     loss='sparse_categorical_crossentropy', metrics=['accuracy'])
+        report_epoch = tf.keras.callbacks.LambdaCallback(on_epoch_end=lambda epoch, logs: self.status_fn({
+            "is_training": True,
+            "progress": round(40 + 55 * (epoch + 1) / self.epochs, 1),
+            "status": "training",
+            "message": f"Training epoch {epoch + 1}/{self.epochs}",
+            "epoch": epoch + 1,
+            "metrics": {name: round(float(value), 4) for name, value in (logs or {}).items()}
+        }))
+        history = head.fit(train_x, train_y, epochs=self.epochs, batch_size=32, shuffle=True, verbose=0,
+                           callbacks=[report_epoch])
+
+        # Corrections the user made should now be classified their way
+        correction_accuracy = float((head.predict(self._features, verbose=0).argmax(axis=1) == self._labels).mean())
+
+        self.swap_fn(attach_head(self.backbone_layers, head))
+        with self._cond:
+            self.version += 1
+        self._save_state(head)
+
+        seconds = time.perf_counter() - started
+        logger.info(f"Classification head v{self.version} swapped in after {seconds:.1f}s")
+        self.status_fn({
+            "is_training": False,
+            "progress": 100,
+            "status": "complete",
+            "message": "Classification head updated",
+            "results": {
+                "accuracy": round(float(history.history['accuracy'][-1]), 4),
+                "loss": round(float(history.history['loss'][-1]), 4),
+                "correctionAccuracy": round(correction_accuracy, 4),
+                "epochsCompleted": self.epochs,
+                "corrections": int(len(self._labels)),
+                "headVersion": self.version,
+                "seconds": round(seconds, 2),
+            }
+        })
+
+    def _save_state(self, head):
+        """Persist the buffered features and the current head so restarts keep the corrections"""
+        if not self.state_path:
+            return
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.state_path)), exist_ok=True)
+            weights = {f"w{i}": w for i, w in enumerate(head.get_weights())}
+            tmp_path = f"{self.state_path}.tmp.npz"
+            with self._cond:
+                np.savez(tmp_path, features=self._features, labels=self._labels, version=self.version, **weights)
+            os.replace(tmp_path, self.state_path)
+        except Exception as e:
+            logger.warning(f"Could not save online head state: {str(e)}")
+
+    def _load_state(self):
+        """Restore corrections and the head trained from them, if the shapes still match"""
+        if not self.state_path or not os.path.exists(self.state_path):
+            return
+        try:
+            with np.load(self.state_path) as state:
+                weights = [state[f"w{i}"] for i in range(len(self.base_weights))]
+                if state['features'].shape[1] != self.feature_dim or any(
+                        w.shape != b.shape for w, b in zip(weights, self.base_weights)):
+                    logger.warning("Saved online head doesn't match the model, ignoring it")
+                    return
+                self._features = state['features'].astype(np.float32)
+                self._labels = state['labels'].astype(np.int64)
+                self.version = int(state['version'])
+            head = clone_head(self.head_layers, self.feature_dim, weights)
+            self.swap_fn(attach_head(self.backbone_layers, head))
+            logger.info(f"Restored classification head v{self.version} trained on {len(self._labels)} corrections")
+        except Exception as e:
+            logger.warning(f"Could not load online head state: {str(e)}")
@@ -0,0 +1,277 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Prefork Server
+--------------
+Serves the app from several worker processes that accept on one shared socket.
+The parent imports the app, freezes the garbage collector's view of the
+imported objects and forks. Code and module state stay shared copy-on-write,
+so each worker doesn't hold its own copy of them.
+
+Models are loaded after the fork. TensorFlow's thread pools don't survive a
+fork, so a model loaded in the parent would hang the first prediction in a
+worker. With MODEL_FORMAT=tflite (the default here) each worker maps the same
+.tflite file read-only instead, and the weights are held once in the page
+cache. With MODEL_FORMAT=keras every worker has a private copy on its heap.
+
+Once every worker is ready, the parent prints each worker's startup time, RSS
+and PSS. RSS counts shared pages in full in every worker. PSS splits them, so
+the PSS total is the real footprint. --measure exits after the report, to
+compare formats:
+
+    python prefork.py --workers 4 --format keras --measure --output mem-keras.json
+    python prefork.py --workers 4 --format tflite --measure --output mem-tflite.json
+
+A worker that exits is replaced after RESTART_BACKOFF seconds, doubling up to
+RESTART_BACKOFF_MAX while it keeps exiting, and the delay resets once a worker
+has run for STABLE_SECONDS. start.py runs the API through this module.
+
+Each worker has its own in-process state, and requests land on whichever worker
+accepts them. With more than one worker the app therefore turns off the
+features that depend on one process's state: webcam capture, the /api/events
+stream and learning from /api/train corrections. /api/stats is built from the
+shared history database, so every worker reports the same numbers.
+"""
+
+import os
+import sys
+import gc
+import json
+import time
+import select
+import signal
+import socket
+import argparse
+
+# Replacement delays double from RESTART_BACKOFF up to RESTART_BACKOFF_MAX seconds,
+# and reset once a worker has run for STABLE_SECONDS
+RESTART_BACKOFF = 1.0
+RESTART_BACKOFF_MAX = 60.0
+STABLE_SECONDS = 60.0
+POLL_INTERVAL = 0.25
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Serve the API from pre-forked worker processes')
+    parser.add_argument('--workers', type=int, default=2, help='Worker processes')
+    parser.add_argument('--host', type=str, default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=5000)
+    parser.add_argument('--format', choices=('tflite', 'keras'), default=os.environ.get('MODEL_FORMAT', 'tflite'),
+                        help='Model format loaded by each worker')
+    parser.add_argument('--startup_timeout', type=float, default=300, help='Seconds to wait for workers to load')
+    parser.add_argument('--measure', action='store_true', help='Print the memory report and exit')
+    parser.add_argument('--output', type=str, help='Also write the memory report to this JSON file')
+    return parser.parse_args()
+
+
+def exit_on_sigterm(signum, frame):
+    """Exit through SystemExit so atexit handlers flush history and save the index"""
+    # A second SIGTERM (e.g. sent to the whole process group) mustn't interrupt them
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    sys.exit(0)
+
+
+def run_worker(server, listener, ready_fd, host, port):
+    """Body of a forked worker: load models, report readiness, serve until SIGTERM"""
+    from werkzeug.serving import make_server
+    from metrics import process_memory
+
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, exit_on_sigterm)
+
+    started = time.perf_counter()
+    server.load_model_on_startup()
+    httpd = make_server(host, port, server.app, threaded=True, fd=listener.fileno())
+    report = {"pid": os.getpid(), "startupSeconds": round(time.perf_counter() - started, 2),
+              "memoryAtReady": process_memory()}
+    os.write(ready_fd, (json.dumps(report) + "\n").encode())
+    httpd.serve_forever()
+
+
+class ReadyReports:
+    """Ready reports that workers write to the pipe, one JSON line each"""
+
+    def __init__(self, fd):
+        self.fd = fd
+        self.buffer = b""
+
+    def read(self, timeout):
+        """Reports that arrive within timeout seconds; empty if none did"""
+        if not select.select([self.fd], [], [], max(0, timeout))[0]:
+            return []
+        self.buffer += os.read(self.fd, 65536)
+        *lines, self.buffer = self.buffer.split(b"\n")
+        return [json.loads(line) for line in lines if line]
+
+
+def wait_for_workers(ready, count, timeout, stopped):
+    """Ready reports from count workers, or as many as arrived before the timeout"""
+    reports = []
+    deadline = time.monotonic() + timeout
+    while len(reports) < count and not stopped():
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        arrived = ready.read(remaining)
+        if not arrived:
+            break
+        reports.extend(arrived)
+    return reports
+
+
+def bind_listener(host, port):
+    """Listening socket that forked workers inherit and all accept on"""
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    listener.bind((host, port))
+    listener.listen(128)
+    listener.set_inheritable(True)
+    return listener
+
+
+class Slot:
+    """One worker position, kept across replacements so restarts can back off"""
+
+    def __init__(self, index):
+        self.index = index
+        self.pid = None
+        self.started_at = None
+        self.crashes = 0        # consecutive early exits, sets the backoff
+        self.restarts = 0
+        self.restart_at = None
+
+    def exited(self, now):
+        """Record the worker's exit and schedule its replacement; returns the delay"""
+        uptime = now - self.started_at
+        self.crashes = 1 if uptime >= STABLE_SECONDS else self.crashes + 1
+        delay = min(RESTART_BACKOFF_MAX, RESTART_BACKOFF * 2 ** (self.crashes - 1))
+        self.pid = None
+        self.restart_at = now + delay
+        return uptime, delay
+
+
+def memory_report(reports, model_format):
+    """Per-worker and total memory, read now so every worker is measured at the same moment"""
+    from metrics import process_memory
+
+    workers = []
+    for report in sorted(reports, key=lambda r: r["pid"]):
+        workers.append(dict(report, memory=process_memory(report["pid"])))
+    parent = process_memory()
+    processes = [w["memory"] for w in workers] + [parent]
+    return {
+        "format": model_format,
+        "workers": workers,
+        "parent": parent,
+        "totalRss": sum(m["rss"] for m in processes),
+        "totalPss": sum(m["pss"] or 0 for m in processes),
+    }
+
+
+def print_report(report):
+    mb = lambda value: f"{value / 1e6:10.1f}" if value is not None else f"{'-':>10}"
+    print(f"\nMemory with {len(report['workers'])} workers, model format {report['format']}:")
+    print(f"{'pid':>8} {'startup s':>10} {'RSS MB':>10} {'PSS MB':>10} {'shared MB':>10} {'private MB':>10}")
+    for worker in report["workers"]:
+        m = worker["memory"]
+        print(f"{worker['pid']:>8} {worker['startupSeconds']:>10.1f} "
+              f"{mb(m['rss'])} {mb(m['pss'])} {mb(m['shared'])} {mb(m['private'])}")
+    m = report["parent"]
+    print(f"{'parent':>8} {'':>10} {mb(m['rss'])} {mb(m['pss'])} {mb(m['shared'])} {mb(m['private'])}")
+    print(f"Total RSS {report['totalRss'] / 1e6:.1f} MB, total PSS {report['totalPss'] / 1e6:.1f} MB\n")
+
+
+def main():
+    """Fork the workers, report their memory and keep them running"""
+    args = parse_args()
+
+    # The app reads its configuration when it is imported; each worker tunes
+    # its threads for its share of the cores
+    os.environ['MODEL_FORMAT'] = args.format
+    os.environ['SERVER_WORKERS'] = str(args.workers)
+    os.environ.setdefault('AUTOTUNE_CPUS', str(max(1, (os.cpu_count() or 1) // args.workers)))
+    import app as server
+
+    # Benchmark once here (in child processes, without touching TensorFlow)
+    # so the workers all find the saved result instead of tuning at once
+    server.tune_threads()
+
+    listener = bind_listener(args.host, args.port)
+    ready_r, ready_w = os.pipe()
+    ready = ReadyReports(ready_r)
+
+    # Objects imported so far are never collected; keeping the collector off
+    # their headers stops it from dirtying (and so copying) the shared pages
+    gc.freeze()
+
+    slots = [Slot(i) for i in range(args.workers)]
+    by_pid = {}
+
+    def spawn(slot):
+        pid = os.fork()
+        if pid == 0:
+            os.close(ready_r)
+            run_worker(server, listener, ready_w, args.host, args.port)
+            # Never fall back into the parent's loop
+            sys.exit(0)
+        slot.pid, slot.started_at, slot.restart_at = pid, time.monotonic(), None
+        by_pid[pid] = slot
+
+    for slot in slots:
+        spawn(slot)
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(by_pid):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+
+    reports = wait_for_workers(ready, args.workers, args.startup_timeout, lambda: stopping)
+    if len(reports) < args.workers:
+        print(f"Only {len(reports)} of {args.workers} workers became ready within {args.startup_timeout}s")
+    report = memory_report(reports, args.format)
+    print_report(report)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=4)
+    if args.measure:
+        stop(None, None)
+    else:
+        print(f"Serving on http://{args.host}:{args.port} with {len(by_pid)} workers", flush=True)
+
+    while by_pid or not stopping:
+        try:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+        except ChildProcessError:
+            pid, status = 0, 0
+        if pid:
+            slot = by_pid.pop(pid, None)
+            if slot is not None and not stopping:
+                uptime, delay = slot.exited(time.monotonic())
+                print(f"Worker {pid} exited with status {status} after {uptime:.1f}s, "
+                      f"starting a replacement in {delay:.0f}s", flush=True)
+            continue
+
+        now = time.monotonic()
+        for slot in slots:
+            if not stopping and slot.pid is None and slot.restart_at is not None and now >= slot.restart_at:
+                slot.restarts += 1
+                spawn(slot)
+        # Also paces the loop while nothing happens
+        for worker in ready.read(POLL_INTERVAL):
+            slot = by_pid.get(worker["pid"])
+            if slot is not None:
+                print(f"Worker {worker['pid']} ready in {worker['startupSeconds']:.1f}s "
+                      f"(restart {slot.restarts} of slot {slot.index})", flush=True)
+
+
+if __name__ == "__main__":
+    main()
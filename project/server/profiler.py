@@ -0,0 +1,159 @@
+"""
+Profiler
+--------
+On-demand profiling for a live server. SamplingProfiler periodically snapshots
+the stacks of every thread via sys._current_frames() and aggregates them into
+the collapsed-stack format understood by flamegraph.pl and speedscope.
+RequestProfiler wraps a single request in cProfile and saves the stats. Only
+one request is profiled at a time: from Python 3.12 cProfile runs on
+sys.monitoring, which allows one active profiler per process.
+"""
+
+import os
+import sys
+import time
+import io
+import cProfile
+import pstats
+import threading
+from collections import Counter
+
+
+def _frame_label(frame):
+    code = frame.f_code
+    name = getattr(code, 'co_qualname', code.co_name)
+    return f"{os.path.basename(code.co_filename)}:{name}"
+
+
+class SamplingProfiler:
+    """Low-overhead wall-clock sampler across all threads, one run at a time"""
+
+    def __init__(self, max_depth=128):
+        self.max_depth = max_depth
+        self._busy = threading.Lock()
+
+    def run(self, duration, interval=0.005, skip_idle=True):
+        """Sample for duration seconds; returns (collapsed stacks text, sample count).
+
+        Raises RuntimeError if another profile is already running.
+        """
+        if not self._busy.acquire(blocking=False):
+            raise RuntimeError("A profile is already running")
+        try:
+            return self._sample(duration, interval, skip_idle)
+        finally:
+            self._busy.release()
+
+    def _sample(self, duration, interval, skip_idle):
+        stacks = Counter()
+        own_ident = threading.get_ident()
+        names = {}
+        samples = 0
+        deadline = time.perf_counter() + duration
+
+        while time.perf_counter() < deadline:
+            frames = sys._current_frames()
+            if len(names) != len(frames):
+                names = {t.ident: t.name for t in threading.enumerate()}
+
+            for ident, frame in frames.items():
+                # The requesting thread is just sleeping in this loop
+                if ident == own_ident:
+                    continue
+                parts = []
+                while frame is not None and len(parts) < self.max_depth:
+                    parts.append(_frame_label(frame))
+                    frame = frame.f_back
+                if skip_idle and parts and _is_idle(parts[0]):
+                    continue
+                parts.append(names.get(ident, f"thread-{ident}"))
+                stacks[";".join(reversed(parts))] += 1
+            samples += 1
+            time.sleep(interval)
+
+        lines = [f"{stack} {count}" for stack, count in stacks.most_common()]
+        return "\n".join(lines) + "\n", samples
+
+
+# Leaf frames that mean a thread is parked rather than doing work
+_IDLE_LEAVES = {
+    "threading.py:Condition.wait", "threading.py:Event.wait", "queue.py:Queue.get",
+    "selectors.py:PollSelector.select", "selectors.py:EpollSelector.select",
+    "socketserver.py:BaseServer.serve_forever", "socket.py:socket.accept",
+    "threading.py:Thread._wait_for_tstate_lock",
+}
+
+
+def _is_idle(leaf):
+    return leaf in _IDLE_LEAVES
+
+
+# pstats sort orders report() accepts
+REPORT_SORT_KEYS = ('cumulative', 'tottime', 'ncalls', 'pcalls', 'name', 'filename', 'line')
+
+
+class RequestProfiler:
+    """Per-request cProfile capture saved as .prof files, one request at a time"""
+
+    def __init__(self, output_dir, keep=50):
+        self.output_dir = output_dir
+        self.keep = keep
+        self._active = threading.Lock()
+
+    def start(self):
+        """Start profiling the calling request; returns None while another one is profiled"""
+        if not self._active.acquire(blocking=False):
+            return None
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Something else in the process (e.g. a debugger) holds the profiler
+            self._active.release()
+            return None
+        return profile
+
+    def discard(self, profile):
+        """Stop a profile without saving it"""
+        profile.disable()
+        self._active.release()
+
+    def finish(self, profile, label):
+        """Stop profiling and save the stats; returns the profile file name"""
+        self.discard(profile)
+        os.makedirs(self.output_dir, exist_ok=True)
+        safe_label = "".join(c if c.isalnum() or c in "-_" else "_" for c in label)
+        name = f"{int(time.time() * 1000)}-{safe_label}.prof"
+        profile.dump_stats(os.path.join(self.output_dir, name))
+        self._prune()
+        return name
+
+    def _prune(self):
+        files = sorted(f for f in os.listdir(self.output_dir) if f.endswith('.prof'))
+        for name in files[:-self.keep]:
+            try:
+                os.remove(os.path.join(self.output_dir, name))
+            except OSError:
+                pass
+
+    def path_for(self, name):
+        """Return the path of a saved profile, or None if the name is invalid"""
+        if os.path.basename(name) != name or not name.endswith('.prof'):
+            return None
+        path = os.path.join(self.output_dir, name)
+        return path if os.path.exists(path) else None
+
+    def report(self, name, sort='cumulative', limit=50):
+        """Render a saved profile as pstats text.
+
+        Raises ValueError for a sort key not in REPORT_SORT_KEYS.
+        """
+        if sort not in REPORT_SORT_KEYS:
+            raise ValueError(f"sort must be one of: {', '.join(REPORT_SORT_KEYS)}")
+        path = self.path_for(name)
+        if path is None:
+            return None
+        out = io.StringIO()
+        stats = pstats.Stats(path, stream=out)
+        stats.sort_stats(sort).print_stats(limit)
+        return out.getvalue()
@@ -0,0 +1,57 @@
+"""
+Response Serialization
+----------------------
+Content negotiation for classification responses. Clients that send
+`Accept: application/msgpack` get MessagePack, which is smaller and much
+cheaper to parse than JSON for batch clients. Everyone else gets JSON, encoded
+with orjson when it is installed and with compact stdlib json otherwise. Both
+libraries are optional.
+"""
+
+import json
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+try:
+    import msgpack
+    MSGPACK_AVAILABLE = True
+except ImportError:
+    MSGPACK_AVAILABLE = False
+
+JSON_MIMETYPE = 'application/json'
+MSGPACK_MIMETYPES = ('application/msgpack', 'application/x-msgpack', 'application/vnd.msgpack')
+
+
+def _default(value):
+    # NumPy scalars and arrays that slipped into a result
+    if hasattr(value, 'tolist'):
+        return value.tolist()
+    raise TypeError(f"Object of type {type(value).__name__} is not serializable")
+
+
+def negotiate(accept_mimetypes):
+    """Response mimetype for a request's Accept header (a werkzeug MIMEAccept)"""
+    if MSGPACK_AVAILABLE:
+        # JSON is listed first so it wins ties, e.g. for */* or no Accept header
+        return accept_mimetypes.best_match((JSON_MIMETYPE,) + MSGPACK_MIMETYPES, default=JSON_MIMETYPE)
+    return JSON_MIMETYPE
+
+
+def encode(payload, mimetype=JSON_MIMETYPE):
+    """Serialize a response payload to bytes in the given mimetype"""
+    if mimetype in MSGPACK_MIMETYPES:
+        return msgpack.packb(payload, use_bin_type=True, default=_default)
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(payload, default=_default, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(payload, separators=(',', ':'), default=_default).encode('utf-8')
+
+
+def stats():
+    return {
+        "json": "orjson" if ORJSON_AVAILABLE else "json",
+        "msgpack": MSGPACK_AVAILABLE,
+    }
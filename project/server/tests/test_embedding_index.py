@@ -0,0 +1,146 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+# Server modules are imported by name, as the server and CLI tools do
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from embedding_index import EmbeddingIndex, normalize
+
+
+def clustered(count=4000, dim=64, clusters=32, noise=0.3, seed=0):
+    """Unit vectors scattered around random centres, like embeddings of similar images"""
+    rng = np.random.default_rng(seed)
+    centres = rng.normal(size=(clusters, dim))
+    return normalize(centres[rng.integers(0, clusters, count)] + noise * rng.normal(size=(count, dim)))
+
+
+def items(count, start=0):
+    return [{"n": i} for i in range(start, start + count)]
+
+
+def test_exact_search_finds_the_query_first():
+    vectors = clustered(500)
+    index = EmbeddingIndex(vectors.shape[1])
+    assert index.add(vectors, items(len(vectors))) == list(range(len(vectors)))
+
+    results = index.search(vectors[42], k=5)
+    assert [r[1] for r in results][0] == 42
+    assert results[0][0] == pytest.approx(0.0, abs=1e-5)
+    assert results[0][2] == {"n": 42}
+    assert [r[0] for r in results] == sorted(r[0] for r in results)
+
+    # Distances match brute-force cosine distance
+    expected = np.sort(1.0 - vectors @ vectors[42])[:5]
+    np.testing.assert_allclose([r[0] for r in results], expected, atol=1e-5)
+
+
+def test_search_small_and_empty_indexes():
+    index = EmbeddingIndex(8)
+    assert index.search(np.ones(8), k=3) == []
+    index.add(np.eye(8)[:2], items(2))
+    assert [r[1] for r in index.search(np.eye(8)[1], k=10)] == [1, 0]
+
+
+def test_save_and_load_round_trip(tmp_path):
+    vectors = clustered(300)
+    index = EmbeddingIndex(vectors.shape[1])
+    index.add(vectors, items(len(vectors)))
+    index.update_item(3, label="corrected")
+    index.save(str(tmp_path))
+    assert not index.dirty
+
+    loaded = EmbeddingIndex.load(str(tmp_path))
+    assert len(loaded) == len(index) and not loaded.dirty
+    assert loaded.items[3] == {"n": 3, "label": "corrected"}
+    np.testing.assert_allclose(loaded.vector(10), vectors[10], atol=1e-6)
+    assert [r[1] for r in loaded.search(vectors[7], k=3)] == [r[1] for r in index.search(vectors[7], k=3)]
+
+    # The memory-mapped rows are copied on the first addition
+    loaded.add(vectors[:1], items(1, start=300))
+    assert len(loaded) == 301 and loaded.dirty
+
+
+def test_saves_from_two_processes_are_merged(tmp_path):
+    path = str(tmp_path)
+    vectors = clustered(40)
+    base = EmbeddingIndex(vectors.shape[1])
+    base.add(vectors[:10], items(10))
+    base.save(path)
+
+    first, second = EmbeddingIndex.load(path), EmbeddingIndex.load(path)
+    first.add(vectors[10:13], items(3, start=10))
+    second.add(vectors[13:15], items(2, start=13))
+    first.update_item(2, label="a")
+    second.update_item(4, label="b")
+    first.save(path)
+    second.save(path)
+
+    merged = EmbeddingIndex.load(path)
+    assert len(merged) == 15
+    assert sorted(item["n"] for item in merged.items) == list(range(15))
+    assert merged.items[2]["label"] == "a" and merged.items[4]["label"] == "b"
+    for n in range(15):
+        item_id = next(i for i, item in enumerate(merged.items) if item["n"] == n)
+        np.testing.assert_allclose(merged.vector(item_id), vectors[n], atol=1e-6)
+
+
+def test_rebuilt_index_replaces_the_saved_one(tmp_path):
+    path = str(tmp_path)
+    vectors = clustered(20)
+    old = EmbeddingIndex(vectors.shape[1])
+    old.add(vectors, items(20))
+    old.save(path)
+
+    rebuilt = EmbeddingIndex(vectors.shape[1])
+    rebuilt.add(vectors[:5], items(5))
+    rebuilt.save(path)
+    assert len(EmbeddingIndex.load(path)) == 5
+
+
+def test_ivf_lists_match_the_probe_order():
+    vectors = clustered()
+    index = EmbeddingIndex(vectors.shape[1], nlist=32, nprobe=1)
+    index.train(vectors)
+    index.add(vectors, items(len(vectors)))
+
+    # Every vector is found in the one list a query for it probes first
+    hits = sum(index.search(vectors[i], k=1)[0][1] == i for i in range(0, len(vectors), 4))
+    assert hits / len(range(0, len(vectors), 4)) == 1.0
+
+
+def test_ivf_recall_against_exact_search():
+    vectors = clustered(seed=1)
+    queries = clustered(200, seed=2)
+    exact = EmbeddingIndex(vectors.shape[1])
+    exact.add(vectors, items(len(vectors)))
+    ivf = EmbeddingIndex(vectors.shape[1], nlist=32, nprobe=4)
+    ivf.train(vectors)
+    ivf.add(vectors, items(len(vectors)))
+
+    recall = np.mean([exact.search(q, k=1)[0][1] == ivf.search(q, k=1)[0][1] for q in queries])
+    assert recall >= 0.95
+
+
+def test_pq_index_round_trip(tmp_path):
+    vectors = clustered()
+    index = EmbeddingIndex(vectors.shape[1], nlist=16, pq_m=8, nprobe=4)
+    index.train(vectors)
+    index.add(vectors, items(len(vectors)))
+    assert index.stats()["bytesPerVector"] == 8
+
+    # Compressed distances are approximate, so look for each vector in its top 5
+    recall = np.mean([i in [r[1] for r in index.search(vectors[i], k=5)] for i in range(0, 400, 4)])
+    assert recall >= 0.9
+
+    index.save(str(tmp_path))
+    loaded = EmbeddingIndex.load(str(tmp_path))
+    assert [r[1] for r in loaded.search(vectors[0], k=5)] == [r[1] for r in index.search(vectors[0], k=5)]
+
+
+def test_untrained_index_refuses_vectors():
+    index = EmbeddingIndex(8, nlist=4)
+    with pytest.raises(RuntimeError):
+        index.add(np.eye(8)[:1], items(1))
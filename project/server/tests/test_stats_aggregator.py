@@ -0,0 +1,70 @@
+import os
+import sys
+import time
+
+# Server modules are imported by name, as the server and CLI tools do
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from history_store import HistoryStore
+from stats_aggregator import StatsAggregator
+
+
+def wait_for_rows(history, count, timeout=5.0):
+    deadline = time.time() + timeout
+    while history.last_id() < count and time.time() < deadline:
+        time.sleep(0.02)
+    assert history.last_id() == count
+
+
+def test_processes_following_one_history_agree(tmp_path):
+    path = str(tmp_path / "history.db")
+    first, second = HistoryStore(path, flush_interval=0.02), HistoryStore(path, flush_interval=0.02)
+    first.start()
+    second.start()
+    try:
+        for i in range(4):
+            first.record({"category": "Recyclable", "accuracy": 90.0, "details": {"hazardous": i == 0}})
+        wait_for_rows(first, 4)
+
+        a, b = StatsAggregator(), StatsAggregator()
+        a.seed(first, follow=True)
+        b.seed(second, follow=True)
+
+        # Written after seeding, from either process
+        second.record({"category": "Biodegradable", "accuracy": 80.0, "details": {}})
+        first.record({"category": "Non-recyclable", "accuracy": 70.0, "details": {"hazardous": True}})
+        wait_for_rows(first, 6)
+        a.sync(first)
+        b.sync(second)
+        a.sync(first)
+
+        assert a.etag == b.etag == '"history-6"'
+        assert a.snapshot() == b.snapshot()
+        snapshot = a.snapshot()
+        assert snapshot["totals"] == {"Recyclable": 4, "Biodegradable": 1, "Non-recyclable": 1}
+        assert snapshot["binLevels"]["hazardous"] == 1.0
+        assert sum(sum(bucket["counts"].values()) for bucket in snapshot["buckets"]) == 6
+    finally:
+        first.close()
+        second.close()
+
+
+def test_single_process_stats_ignore_sync(tmp_path):
+    history = HistoryStore(str(tmp_path / "history.db"), flush_interval=0.02)
+    history.start()
+    try:
+        history.record({"category": "Recyclable", "accuracy": 90.0, "details": {}})
+        wait_for_rows(history, 1)
+        stats = StatsAggregator()
+        stats.seed(history)
+        etag = stats.etag
+
+        history.record({"category": "Recyclable", "accuracy": 90.0, "details": {}})
+        wait_for_rows(history, 2)
+        stats.sync(history)
+        assert stats.etag == etag and stats.snapshot()["totals"]["Recyclable"] == 1
+
+        stats.record({"category": "Biodegradable", "accuracy": 80.0})
+        assert stats.etag != etag
+    finally:
+        history.close()
@@ -0,0 +1,56 @@
+"""
+TFLite Model
+------------
+Runs a converted .tflite model behind the small part of the Keras model API the
+server uses (input_shape and predict). The TFLite runtime memory-maps the
+flatbuffer read-only rather than copying the weights onto the heap. Several
+worker processes serving the same file therefore share one copy of the weights
+through the page cache, and each worker only pays for its own activation buffers.
+
+tflite_runtime is used when installed, otherwise tf.lite from TensorFlow.
+"""
+
+import threading
+
+import numpy as np
+
+
+def _interpreter_class():
+    try:
+        from tflite_runtime.interpreter import Interpreter
+    except ImportError:
+        import tensorflow as tf
+        Interpreter = tf.lite.Interpreter
+    return Interpreter
+
+
+class TFLiteModel:
+    """Keras-compatible predict() over a memory-mapped TFLite interpreter"""
+
+    def __init__(self, model_path, num_threads=None):
+        self.model_path = model_path
+        # model_path (not model_content) is what makes the runtime mmap the file
+        self._interpreter = _interpreter_class()(model_path=model_path, num_threads=num_threads)
+        self._interpreter.allocate_tensors()
+        self._input = self._interpreter.get_input_details()[0]
+        self._output = self._interpreter.get_output_details()[0]
+        self._batch_size = 1
+        # An interpreter owns its tensors and can't run two invocations at once
+        self._lock = threading.Lock()
+
+    @property
+    def input_shape(self):
+        return (None, *(int(d) for d in self._input['shape'][1:]))
+
+    def predict(self, batch, batch_size=None, verbose=0):
+        batch = np.asarray(batch, dtype=self._input['dtype'])
+        if batch_size and len(batch) > batch_size:
+            return np.concatenate([self.predict(batch[i:i + batch_size]) for i in range(0, len(batch), batch_size)])
+        with self._lock:
+            if len(batch) != self._batch_size:
+                self._interpreter.resize_tensor_input(self._input['index'], [len(batch), *batch.shape[1:]])
+                self._interpreter.allocate_tensors()
+                self._batch_size = len(batch)
+            self._interpreter.set_tensor(self._input['index'], batch)
+            self._interpreter.invoke()
+            return self._interpreter.get_tensor(self._output['index']).copy()
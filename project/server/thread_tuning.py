@@ -0,0 +1,206 @@
+"""
+Thread Topology Tuning
+----------------------
+Picks how many threads each inference uses, how many inferences run at once
+and the batch size for bulk predictions, by measuring them on this host.
+
+A TFLite model runs one interpreter behind a lock, so concurrent inferences
+would only queue on it. For TFLite only the threads per inference are tuned,
+with one inference at a time.
+
+Each configuration runs in a fresh Python process. TensorFlow's thread pools
+can only be sized before its first op, so they can't be changed inside one
+process. A trial loads the model with the given intra-/inter-op pool sizes and
+drives it from N threads with a random warm-up input for a few seconds. It
+reports throughput and p95 latency. The fastest topology within the latency
+target wins. Batch sizes are then tried on that topology.
+
+The result is saved with a fingerprint of the host and model. Later starts
+reuse it until the model, format, CPU budget or target changes.
+"""
+
+import os
+import sys
+import json
+import time
+import logging
+import platform
+import threading
+import subprocess
+
+logger = logging.getLogger(__name__)
+
+TRIAL_TIMEOUT = 300
+# Bumped when the search changes, so results saved by an older tuner are redone
+TUNER_VERSION = 2
+
+
+def run_trial(spec):
+    """Measure one configuration; must run in a process that hasn't used TensorFlow yet"""
+    import numpy as np
+    import tensorflow as tf
+
+    tf.config.threading.set_intra_op_parallelism_threads(spec["intraOp"])
+    tf.config.threading.set_inter_op_parallelism_threads(spec["interOp"])
+    if spec["format"] == "tflite":
+        from tflite_model import TFLiteModel
+        model = TFLiteModel(spec["modelPath"], num_threads=spec["intraOp"])
+    else:
+        model = tf.keras.models.load_model(spec["modelPath"])
+
+    shape = tuple(int(d) for d in model.input_shape[1:])
+    batch = np.random.default_rng(0).random((spec["batchSize"], *shape), dtype=np.float32)
+    for _ in range(spec["warmup"]):
+        model.predict(batch, verbose=0)
+
+    latencies, lock = [], threading.Lock()
+    deadline = time.perf_counter() + spec["duration"]
+
+    def work():
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            model.predict(batch, verbose=0)
+            with lock:
+                latencies.append(time.perf_counter() - start)
+
+    threads = [threading.Thread(target=work) for _ in range(spec["concurrency"])]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "inferences": len(latencies),
+        "p50Ms": round(latencies[len(latencies) // 2] * 1000, 2),
+        "p95Ms": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] * 1000, 2),
+        "imagesPerSec": round(len(latencies) * spec["batchSize"] / wall, 2),
+    }
+
+
+def measure(spec):
+    """Run one trial in a child process; failures are returned as an error entry"""
+    try:
+        output = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), json.dumps(spec)],
+            capture_output=True, text=True, timeout=TRIAL_TIMEOUT, check=True
+        ).stdout
+        return dict(spec, **json.loads(output.strip().splitlines()[-1]))
+    except subprocess.CalledProcessError as e:
+        return dict(spec, error=(e.stderr or str(e)).strip()[-500:])
+    except (subprocess.SubprocessError, ValueError, IndexError) as e:
+        return dict(spec, error=str(e)[-500:])
+
+
+def candidate_topologies(cpus, max_concurrency=None):
+    """(threads per inference, concurrent inferences) pairs that don't oversubscribe cpus"""
+    counts = sorted({c for c in (1, 2, 4, 8, 16, 32, cpus) if c <= cpus})
+    return [(threads, concurrency) for threads in counts for concurrency in counts
+            if threads * concurrency <= cpus and concurrency <= (max_concurrency or cpus)]
+
+
+def choose(trials, latency_target_ms):
+    """Highest throughput within the latency target, else the lowest latency"""
+    trials = [t for t in trials if "error" not in t]
+    if not trials:
+        return None
+    within = [t for t in trials if t["p95Ms"] <= latency_target_ms]
+    if within:
+        return max(within, key=lambda t: t["imagesPerSec"])
+    return min(trials, key=lambda t: t["p95Ms"])
+
+
+def fingerprint(model_path, model_format, cpus, latency_target_ms):
+    stat = os.stat(model_path)
+    return {
+        "host": platform.node(),
+        "cpus": cpus,
+        "modelPath": os.path.abspath(model_path),
+        "modelBytes": stat.st_size,
+        "modelMtime": stat.st_mtime,
+        "format": model_format,
+        "latencyTargetMs": latency_target_ms,
+        "tunerVersion": TUNER_VERSION,
+    }
+
+
+def tune(model_path, model_format, cpus, latency_target_ms, batch_sizes=(1,), duration=3.0, warmup=3):
+    """Benchmark thread topologies, then batch sizes on the best one"""
+    def spec(threads, concurrency, batch_size):
+        # One inter-op thread per concurrent caller keeps them from queueing on each other
+        return {"modelPath": model_path, "format": model_format, "intraOp": threads, "interOp": concurrency,
+                "concurrency": concurrency, "batchSize": batch_size, "duration": duration, "warmup": warmup}
+
+    trials = []
+    # One TFLite interpreter serves one inference at a time
+    max_concurrency = 1 if model_format == 'tflite' else None
+    for threads, concurrency in candidate_topologies(cpus, max_concurrency):
+        trial = measure(spec(threads, concurrency, 1))
+        logger.info(f"Thread trial {threads} threads x {concurrency} concurrent: "
+                    f"{trial.get('imagesPerSec')} img/s, p95 {trial.get('p95Ms')} ms {trial.get('error', '')}")
+        trials.append(trial)
+    best = choose(trials, latency_target_ms)
+    if best is None:
+        return None
+
+    batch_trials = [best]
+    for batch_size in batch_sizes:
+        if batch_size > 1:
+            trial = measure(spec(best["intraOp"], best["concurrency"], batch_size))
+            logger.info(f"Batch trial {batch_size}: {trial.get('imagesPerSec')} img/s, p95 {trial.get('p95Ms')} ms")
+            trials.append(trial)
+            batch_trials.append(trial)
+    batch = choose(batch_trials, latency_target_ms)
+
+    return {
+        "chosen": {
+            "intraOp": best["intraOp"],
+            "interOp": best["interOp"],
+            "concurrency": best["concurrency"],
+            "batchSize": batch["batchSize"],
+            "p95Ms": best["p95Ms"],
+            "imagesPerSec": best["imagesPerSec"],
+        },
+        "trials": trials,
+        "tunedAt": time.time(),
+    }
+
+
+def load_or_tune(path, model_path, model_format, cpus, latency_target_ms, batch_sizes=(1,), retune=False):
+    """Saved tuning result for this host and model, tuning first if there is none.
+
+    Returns None when the model file is missing or every trial failed.
+    """
+    if not os.path.exists(model_path):
+        return None
+    current = fingerprint(model_path, model_format, cpus, latency_target_ms)
+    if not retune:
+        try:
+            with open(path) as f:
+                saved = json.load(f)
+            if saved.get("fingerprint") == current:
+                return dict(saved, source="saved")
+        except (OSError, ValueError):
+            pass
+
+    logger.info(f"Tuning inference threads for {cpus} CPUs and a {latency_target_ms:.0f} ms p95 target...")
+    result = tune(model_path, model_format, cpus, latency_target_ms, batch_sizes)
+    if result is None:
+        logger.warning("Every thread tuning trial failed, keeping TensorFlow's defaults")
+        return None
+    result["fingerprint"] = current
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(result, f, indent=4)
+    os.replace(tmp_path, path)
+    logger.info(f"Chose {result['chosen']}")
+    return dict(result, source="tuned")
+
+
+if __name__ == "__main__":
+    # Trial mode: measure the configuration given as JSON and print the result
+    print(json.dumps(run_trial(json.loads(sys.argv[1]))))
@@ -0,0 +1,198 @@
+"""
+Thumbnail Store
+---------------
+Generates small fixed-size thumbnails for dataset images and classified uploads
+in a background process pool. Thumbnails are stored on disk under the SHA-256 of
+the source bytes, so the same image always maps to the same immutable URL.
+"""
+
+import os
+import io
+import json
+import hashlib
+import logging
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from PIL import Image, features
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SIZE = 256
+DEFAULT_QUALITY = 80
+
+
+def _hash_bytes(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def _write_thumbnail(data, dest_path, size, fmt, quality):
+    """Decode image bytes and write a thumbnail atomically to dest_path"""
+    img = Image.open(io.BytesIO(data))
+    # Let the JPEG decoder do most of the downscaling for us
+    img.draft('RGB', (size, size))
+    if img.mode != 'RGB':
+        img = img.convert('RGB')
+    img.thumbnail((size, size))
+
+    tmp_path = f"{dest_path}.{os.getpid()}.tmp"
+    img.save(tmp_path, format=fmt, quality=quality)
+    os.replace(tmp_path, dest_path)
+
+
+def _render_bytes(data, cache_dir, size, fmt, quality):
+    """Worker: render a thumbnail for an in-memory upload"""
+    key = _hash_bytes(data)
+    dest_path = os.path.join(cache_dir, f"{key}.{fmt.lower()}")
+    if not os.path.exists(dest_path):
+        _write_thumbnail(data, dest_path, size, fmt, quality)
+    return key
+
+
+def _render_file(path, cache_dir, size, fmt, quality):
+    """Worker: hash and render a thumbnail for an image on disk"""
+    with open(path, 'rb') as f:
+        data = f.read()
+    return _render_bytes(data, cache_dir, size, fmt, quality)
+
+
+class ThumbnailStore:
+    """Content-addressed thumbnail cache backed by a process pool"""
+
+    def __init__(self, cache_dir, size=DEFAULT_SIZE, quality=DEFAULT_QUALITY, max_workers=None):
+        self.cache_dir = cache_dir
+        self.size = size
+        self.quality = quality
+        self.format = 'WEBP' if features.check('webp') else 'JPEG'
+        self.mimetype = f"image/{self.format.lower()}"
+        self.max_workers = max_workers or max(1, (os.cpu_count() or 2) - 1)
+
+        self._executor = None
+        self._lock = threading.Lock()
+        self._pending = {}
+        # Maps dataset file paths to their content key so list views don't re-hash
+        self._index_path = os.path.join(cache_dir, 'index.json')
+        self._index = {}
+
+    def start(self):
+        """Create the cache directory and worker pool.
+
+        Call this from the main thread before the model is loaded: on Linux the
+        pool forks all of its workers on first use, and forking is only safe
+        before TensorFlow and the request threads are running.
+        """
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._load_index()
+        self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+        # Force the workers to start now rather than on the first request
+        self._executor.submit(os.getpid).result()
+        logger.info(f"Thumbnail store started with {self.max_workers} workers ({self.format}, {self.size}px)")
+
+    def shutdown(self):
+        # Never started, so the in-memory index is empty; keep the saved one
+        if self._executor is None:
+            return
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self._executor = None
+        self._save_index()
+
+    def _load_index(self):
+        try:
+            with open(self._index_path) as f:
+                self._index = json.load(f)
+        except (OSError, ValueError):
+            self._index = {}
+
+    def _save_index(self):
+        with self._lock:
+            index = dict(self._index)
+        try:
+            # Per process: prefork workers all save the index at exit
+            tmp_path = f"{self._index_path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(index, f)
+            os.replace(tmp_path, self._index_path)
+        except OSError as e:
+            logger.warning(f"Could not save thumbnail index: {str(e)}")
+
+    def path_for(self, key):
+        return os.path.join(self.cache_dir, f"{key}.{self.format.lower()}")
+
+    def get(self, key, timeout=5.0):
+        """Return the thumbnail path for key, waiting briefly if it is still rendering"""
+        with self._lock:
+            future = self._pending.get(key)
+        if future is not None:
+            try:
+                future.result(timeout=timeout)
+            except Exception as e:
+                logger.error(f"Thumbnail generation failed for {key}: {str(e)}")
+                return None
+        path = self.path_for(key)
+        return path if os.path.exists(path) else None
+
+    def submit_bytes(self, data):
+        """Schedule a thumbnail for uploaded image bytes and return its key"""
+        key = _hash_bytes(data)
+        if self._executor is None or os.path.exists(self.path_for(key)):
+            return key
+
+        with self._lock:
+            if key not in self._pending:
+                future = self._executor.submit(
+                    _render_bytes, data, self.cache_dir, self.size, self.format, self.quality
+                )
+                self._pending[key] = future
+                future.add_done_callback(lambda _f, k=key: self._finish(k))
+        return key
+
+    def _finish(self, key):
+        with self._lock:
+            self._pending.pop(key, None)
+
+    def key_for_file(self, path):
+        """Return the cached content key for a dataset file, if it has been indexed"""
+        entry = self._index.get(path)
+        if entry is None:
+            return None
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        if entry['mtime'] != stat.st_mtime or entry['size'] != stat.st_size:
+            return None
+        return entry['key']
+
+    def warm(self, paths):
+        """Generate thumbnails for dataset images in the background"""
+        if self._executor is None:
+            return None
+
+        def run():
+            todo = [p for p in paths if self.key_for_file(p) is None]
+            if not todo:
+                logger.info("Thumbnail cache is already warm")
+                return
+
+            logger.info(f"Generating thumbnails for {len(todo)} dataset images")
+            futures = {
+                p: self._executor.submit(_render_file, p, self.cache_dir, self.size, self.format, self.quality)
+                for p in todo
+            }
+            done = 0
+            for path, future in futures.items():
+                try:
+                    key = future.result()
+                    stat = os.stat(path)
+                except Exception as e:
+                    logger.warning(f"Could not create thumbnail for {path}: {str(e)}")
+                    continue
+                with self._lock:
+                    self._index[path] = {'key': key, 'mtime': stat.st_mtime, 'size': stat.st_size}
+                done += 1
+            self._save_index()
+            logger.info(f"Generated {done} dataset thumbnails")
+
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        return thread
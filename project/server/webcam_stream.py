@@ -0,0 +1,225 @@
+"""
+Webcam Stream
+-------------
+Keeps the camera open in a background capture thread that only ever holds the
+newest frame, and classifies frames at a bounded rate for any subscribers
+(e.g. the Server-Sent Events endpoint in app.py). Results marked "sceneReused"
+by the classify function are not re-published.
+"""
+
+import time
+import queue
+import logging
+import threading
+
+try:
+    import cv2
+    OPENCV_AVAILABLE = True
+except ImportError:
+    OPENCV_AVAILABLE = False
+
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+
+class WebcamStream:
+    """Single long-lived camera reader shared by every request"""
+
+    def __init__(self, classify_fn, camera_index=0, min_interval=0.5, idle_timeout=60.0):
+        # classify_fn receives the raw BGR frame
+        self.classify_fn = classify_fn
+        self.camera_index = camera_index
+        # Never classify more often than min_interval
+        self.min_interval = min_interval
+        self.idle_timeout = idle_timeout
+
+        self._capture = None
+        self._lock = threading.Lock()
+        self._frame_ready = threading.Condition(self._lock)
+        self._frame = None
+        self._frame_id = 0
+        self._last_used = 0.0
+        self._running = False
+        self._threads = []
+
+        self._subscribers = set()
+        self._subscribers_lock = threading.Lock()
+        self.latest_result = None
+        self.frames_captured = 0
+        self.frames_published = 0
+
+    @property
+    def is_running(self):
+        return self._running
+
+    def start(self):
+        """Open the camera and start the capture and classification threads"""
+        with self._lock:
+            self._last_used = time.time()
+            if self._running:
+                return True
+
+            if not OPENCV_AVAILABLE:
+                raise RuntimeError("OpenCV is not available on the server")
+
+            capture = cv2.VideoCapture(self.camera_index)
+            if not capture.isOpened():
+                capture.release()
+                return False
+            # Ask the driver not to queue frames behind our back
+            capture.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+
+            self._capture = capture
+            self._running = True
+            self._threads = [
+                threading.Thread(target=self._capture_loop, name="webcam-capture", daemon=True),
+                threading.Thread(target=self._classify_loop, name="webcam-classify", daemon=True),
+            ]
+            for thread in self._threads:
+                thread.start()
+
+        logger.info(f"Webcam {self.camera_index} opened for streaming")
+        return True
+
+    def stop(self):
+        """Stop the threads and release the camera"""
+        with self._lock:
+            if not self._running:
+                return
+            self._running = False
+            self._frame_ready.notify_all()
+            threads, self._threads = self._threads, []
+
+        for thread in threads:
+            if thread is not threading.current_thread():
+                thread.join(timeout=2.0)
+
+        with self._lock:
+            if self._capture is not None:
+                self._capture.release()
+                self._capture = None
+            self._frame = None
+        logger.info("Webcam released")
+
+    def _capture_loop(self):
+        failures = 0
+        while self._running:
+            ret, frame = self._capture.read()
+            if not ret:
+                failures += 1
+                if failures > 50:
+                    logger.error("Webcam stopped delivering frames")
+                    break
+                time.sleep(0.02)
+                continue
+            failures = 0
+
+            with self._lock:
+                # Overwrite rather than queue: consumers only want the newest frame
+                self._frame = frame
+                self._frame_id += 1
+                self.frames_captured += 1
+                self._frame_ready.notify_all()
+                idle = (time.time() - self._last_used > self.idle_timeout
+                        and not self._subscribers)
+
+            if idle:
+                logger.info("Webcam idle, releasing device")
+                break
+
+        threading.Thread(target=self.stop, daemon=True).start()
+
+    def latest_frame(self, timeout=2.0, after_id=0):
+        """Return (frame_id, BGR frame) once a frame newer than after_id exists"""
+        deadline = time.time() + timeout
+        with self._lock:
+            self._last_used = time.time()
+            while self._running and self._frame_id <= after_id:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return None, None
+                self._frame_ready.wait(remaining)
+            if self._frame is None:
+                return None, None
+            return self._frame_id, self._frame
+
+    @staticmethod
+    def to_pil(frame):
+        """Convert a BGR OpenCV frame to an RGB PIL image"""
+        return Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+
+    def _classify_loop(self):
+        last_id = 0
+        last_time = 0.0
+
+        while self._running:
+            with self._subscribers_lock:
+                has_subscribers = bool(self._subscribers)
+            if not has_subscribers:
+                time.sleep(0.1)
+                continue
+
+            frame_id, frame = self.latest_frame(timeout=1.0, after_id=last_id)
+            if frame is None:
+                continue
+            last_id = frame_id
+
+            now = time.time()
+            wait = self.min_interval - (now - last_time)
+            if wait > 0:
+                time.sleep(wait)
+                continue
+
+            try:
+                result = self.classify_fn(frame)
+            except Exception as e:
+                logger.error(f"Error classifying webcam frame: {str(e)}")
+                continue
+
+            last_time = time.time()
+            if result is None or result.get("sceneReused"):
+                continue
+
+            result = dict(result, frameId=frame_id, timestamp=last_time)
+            self.latest_result = result
+            self.frames_published += 1
+            self._publish(result)
+
+    def subscribe(self, maxsize=4):
+        """Register a listener; returns a queue that receives classification results"""
+        q = queue.Queue(maxsize=maxsize)
+        with self._subscribers_lock:
+            self._subscribers.add(q)
+        return q
+
+    def unsubscribe(self, q):
+        with self._subscribers_lock:
+            self._subscribers.discard(q)
+
+    def _publish(self, result):
+        with self._subscribers_lock:
+            subscribers = list(self._subscribers)
+        for q in subscribers:
+            # Slow clients lose stale results instead of stalling the stream
+            while True:
+                try:
+                    q.put_nowait(result)
+                    break
+                except queue.Full:
+                    try:
+                        q.get_nowait()
+                    except queue.Empty:
+                        pass
+
+    def status(self):
+        with self._subscribers_lock:
+            subscribers = len(self._subscribers)
+        return {
+            "running": self._running,
+            "cameraIndex": self.camera_index,
+            "subscribers": subscribers,
+            "framesCaptured": self.frames_captured,
+            "framesPublished": self.frames_published,
+            "minInterval": self.min_interval,
+        }
@@ -91,11 +91,12 @@ const WasteUploader: React.FC = () => {
       const result = response.data;
       setClassificationResult(result);
       
-      // Add to recent classifications
+      // Add to recent classifications, keeping the server's small thumbnail
+      // rather than the full base64 upload whenever there is one
       addClassification({
         id: Date.now().toString(),
         timestamp: new Date().toISOString(),
-        imageUrl: previewUrl || '',
+        imageUrl: result.thumbnailUrl ? `${API_BASE_URL}${result.thumbnailUrl}` : previewUrl || '',
         category: result.category,
         accuracy: result.accuracy,
         wasteType: result.wasteType
@@ -1,17 +1,23 @@
 import React, { useState, useEffect } from 'react';
-import { Camera, RefreshCw, AlertCircle, Upload } from 'lucide-react';
+import { Camera, RefreshCw, AlertCircle, Upload, Radio } from 'lucide-react';
 import axios from 'axios';
 import { useWasteData } from '../../context/WasteDataContext';
 
 // API base URL
 const API_BASE_URL = 'http://localhost:5000';
 
+// History entries are kept in localStorage, so store the server's small
+// thumbnail rather than the full base64 frame whenever there is one
+const historyImageUrl = (result: any): string =>
+  result.thumbnailUrl ? `${API_BASE_URL}${result.thumbnailUrl}` : result.imageData || '';
+
 const WebcamCapture: React.FC = () => {
   const [imageData, setImageData] = useState<string | null>(null);
   const [isCapturing, setIsCapturing] = useState<boolean>(false);
   const [isClassifying, setIsClassifying] = useState<boolean>(false);
   const [error, setError] = useState<string | null>(null);
   const [classificationResult, setClassificationResult] = useState<any>(null);
+  const [isLive, setIsLive] = useState<boolean>(false);
   const { addClassification } = useWasteData();
   
   // Check server status on component mount
@@ -19,6 +25,35 @@ const WebcamCapture: React.FC = () => {
     checkServerStatus();
   }, []);
   
+  // Subscribe to the server's continuous classification stream while live
+  useEffect(() => {
+    if (!isLive) return;
+    
+    const source = new EventSource(`${API_BASE_URL}/api/webcam-stream`);
+    
+    source.addEventListener('classification', (event) => {
+      const result = JSON.parse((event as MessageEvent).data);
+      setImageData(result.imageData);
+      setClassificationResult(result);
+      
+      addClassification({
+        id: `${result.frameId}-${Date.now()}`,
+        timestamp: new Date().toISOString(),
+        imageUrl: historyImageUrl(result),
+        category: result.category,
+        accuracy: result.accuracy,
+        wasteType: result.wasteType
+      });
+    });
+    
+    source.onerror = () => {
+      setError("Live stream disconnected. Make sure a webcam is connected to the server.");
+      setIsLive(false);
+    };
+    
+    return () => source.close();
+  }, [isLive]);
+  
   const checkServerStatus = async () => {
     try {
       await axios.get(`${API_BASE_URL}/api/health`);
@@ -49,7 +84,7 @@ const WebcamCapture: React.FC = () => {
       addClassification({
         id: Date.now().toString(),
         timestamp: new Date().toISOString(),
-        imageUrl: result.imageData || '',
+        imageUrl: historyImageUrl(result),
         category: result.category,
         accuracy: result.accuracy,
         wasteType: result.wasteType
@@ -128,6 +163,7 @@ const WebcamCapture: React.FC = () => {
   };
   
   const resetCapture = () => {
+    setIsLive(false);
     setImageData(null);
     setClassificationResult(null);
     setError(null);
@@ -224,7 +260,7 @@ const WebcamCapture: React.FC = () => {
               className="w-full mt-3 flex items-center justify-center px-4 py-2 text-sm font-medium text-white bg-blue-600 rounded-md hover:bg-blue-700 focus:outline-none focus:ring-2 focus:ring-offset-2 focus:ring-blue-500"
             >
               <RefreshCw size={16} className="mr-1" />
-              Capture Again
+              {isLive ? 'Stop Live Feed' : 'Capture Again'}
             </button>
           </div>
         ) : (
@@ -264,6 +300,19 @@ const WebcamCapture: React.FC = () => {
                 )}
               </button>
               
+              <button
+                onClick={() => { setError(null); setIsLive(true); }}
+                disabled={isCapturing || isLive}
+                className={`flex-1 flex items-center justify-center px-4 py-2 text-sm font-medium text-white rounded-md focus:outline-none focus:ring-2 focus:ring-offset-2 focus:ring-green-500 ${
+                  isCapturing || isLive
+                    ? 'bg-gray-400 cursor-not-allowed'
+                    : 'bg-green-600 hover:bg-green-700'
+                }`}
+              >
+                <Radio size={16} className="mr-1" />
+                {isLive ? 'Waiting for frames...' : 'Go Live'}
+              </button>
+              
               <button
                 onClick={() => useSampleImage('Recyclable')}
                 disabled={isCapturing}
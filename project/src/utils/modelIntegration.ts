@@ -14,6 +14,7 @@ const API_CONFIG = {
   endpoints: {
     classify: '/api/classify',
     train: '/api/train',
+    events: '/api/events',
   }
 };
 
@@ -179,4 +180,30 @@ export const getTrainingStatus = async (): Promise<{
       message: 'Failed to get training status'
     };
   }
-}; 
\ No newline at end of file
+}; 
+/**
+ * Subscribe to training progress pushed by the server instead of polling
+ * @param onStatus Called with each training status update, starting with the current one
+ * @returns Function that closes the subscription
+ */
+export const subscribeToTrainingStatus = (onStatus: (status: {
+  isTraining: boolean;
+  progress: number;
+  message: string;
+}) => void): (() => void) => {
+  const source = new EventSource(`${API_CONFIG.baseUrl}${API_CONFIG.endpoints.events}?topics=training`);
+  
+  source.addEventListener('training', (event) => {
+    const data = JSON.parse((event as MessageEvent).data);
+    onStatus({
+      isTraining: data.is_training,
+      progress: data.progress,
+      message: data.message
+    });
+  });
+  
+  // EventSource reconnects on its own and resumes from the last event it saw
+  source.onerror = () => console.warn('Training event stream interrupted, reconnecting...');
+  
+  return () => source.close();
+};
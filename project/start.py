@@ -1,17 +1,36 @@
 #!/usr/bin/env python
+"""
+Application Launcher
+--------------------
+Starts the Flask API and the React client and opens the browser once both
+answer. The API is served by server/prefork.py, which runs N worker processes
+on one listening socket, reports each worker's startup time and replaces
+crashed workers with exponential backoff. The launcher waits for /api/ready
+instead of sleeping for a fixed time.
+"""
+
 import os
 import sys
+import argparse
 import subprocess
 import time
 import threading
 import webbrowser
 import signal
+import urllib.request
 
 # Get the project root directory
 PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
 SERVER_DIR = os.path.join(PROJECT_ROOT, 'server')
 CLIENT_DIR = os.path.join(PROJECT_ROOT, 'src')
 
+SERVER_PORT = int(os.environ.get('SERVER_PORT', '5000'))
+CLIENT_URL = "http://localhost:3000"
+READY_POLL_INTERVAL = 0.25
+# Connections queue on the listening socket while no worker is accepting, so a
+# probe waits rather than being refused; keep that wait short
+READY_PROBE_TIMEOUT = 0.5
+
 # Colors for terminal output
 class Colors:
     HEADER = '\033[95m'
@@ -96,11 +115,79 @@ def check_python_packages():
     print_success("All required Python packages are installed")
     return True
 
+def monitor_output(process, prefix):
+    """Print a child process's output with a prefix"""
+    for line in process.stdout:
+        print(f"[{prefix}] {line.strip()}")
+
+def url_ready(url, timeout=1.0):
+    """Body of a 2xx response from url, or None if it isn't answering yet"""
+    try:
+        with urllib.request.urlopen(url, timeout=timeout) as response:
+            return response.read()
+    except OSError:
+        return None
+
+def server_command(workers, port):
+    """Command line for the API server process"""
+    if os.name == 'nt':
+        # prefork.py forks its workers, which Windows can't do
+        if workers > 1:
+            print_warning("Several server workers need fork(), which Windows doesn't support; starting one")
+        return [sys.executable, 'app.py']
+    # Keras unless MODEL_FORMAT says otherwise, as when app.py is run directly;
+    # MODEL_FORMAT=tflite shares the weights between workers (see export_tflite.py)
+    return [sys.executable, 'prefork.py', '--workers', str(workers), '--port', str(port),
+            '--format', os.environ.get('MODEL_FORMAT', 'keras')]
+
+class ServerProcess:
+    """The API server process, whose workers prefork.py supervises"""
+
+    def __init__(self, workers, port=SERVER_PORT):
+        self.command = server_command(workers, port)
+        self.port = port
+        self.ready_url = f"http://127.0.0.1:{port}/api/ready"
+        self.process = None
+        self.started_at = None
+
+    def start(self):
+        self.process = subprocess.Popen(
+            self.command,
+            cwd=SERVER_DIR,
+            env=dict(os.environ, SERVER_PORT=str(self.port), SERVER_SUPERVISED='1', PYTHONUNBUFFERED='1'),
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            universal_newlines=True,
+            bufsize=1
+        )
+        self.started_at = time.monotonic()
+        threading.Thread(target=monitor_output, args=(self.process, "SERVER"), daemon=True).start()
+
+    def wait_until_ready(self, timeout):
+        """Block until a worker answers /api/ready; returns whether one did in time"""
+        deadline = time.monotonic() + timeout
+        while url_ready(self.ready_url, READY_PROBE_TIMEOUT) is None:
+            if self.process.poll() is not None:
+                print_error(f"Flask server exited with code {self.process.returncode}")
+                return False
+            if time.monotonic() > deadline:
+                return False
+            time.sleep(READY_POLL_INTERVAL)
+        return True
+
+    def stop(self):
+        if self.process is None or self.process.poll() is not None:
+            return
+        # prefork.py passes SIGTERM on to its workers, which save their state on exit
+        self.process.terminate()
+        try:
+            self.process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+
 # Start the Flask server
-def start_server():
-    print_header("Starting Flask server")
-    
-    os.chdir(SERVER_DIR)
+def start_server(workers, ready_timeout):
+    print_header(f"Starting Flask server ({workers} worker{'s' if workers != 1 else ''})")
     
     # Create models directory if it doesn't exist
     models_dir = os.path.join(PROJECT_ROOT, 'models')
@@ -108,37 +195,23 @@ def start_server():
         os.makedirs(models_dir)
         print_info(f"Created models directory: {models_dir}")
     
-    # Start the Flask server
-    server_process = subprocess.Popen(
-        [sys.executable, 'app.py'],
-        stdout=subprocess.PIPE,
-        stderr=subprocess.STDOUT,
-        universal_newlines=True,
-        bufsize=1
-    )
-    
-    print_info("Flask server is starting...")
+    server = ServerProcess(workers)
+    server.start()
     
-    # Function to read and print server output
-    def monitor_server_output():
-        for line in server_process.stdout:
-            print(f"[SERVER] {line.strip()}")
+    print_info("Flask server is starting, waiting for /api/ready...")
     
-    # Start a thread to monitor server output
-    threading.Thread(target=monitor_server_output, daemon=True).start()
+    # Boot as fast as the models load instead of guessing with a fixed sleep
+    if server.wait_until_ready(ready_timeout):
+        print_success(f"Flask server started in {time.monotonic() - server.started_at:.1f}s")
+    else:
+        print_warning(f"Flask server was not ready after {ready_timeout:.0f}s, continuing anyway")
     
-    # Wait for the server to start
-    time.sleep(2)
-    print_success("Flask server started")
-    
-    return server_process
+    return server
 
 # Start the React client
-def start_client():
+def start_client(ready_timeout):
     print_header("Starting React client")
     
-    os.chdir(CLIENT_DIR)
-    
     # Check if npm is installed
     try:
         subprocess.check_output(['npm', '--version'])
@@ -150,6 +223,7 @@ def start_client():
     # Start the React development server
     client_process = subprocess.Popen(
         ['npm', 'start'],
+        cwd=CLIENT_DIR,
         stdout=subprocess.PIPE,
         stderr=subprocess.STDOUT,
         universal_newlines=True,
@@ -158,16 +232,19 @@ def start_client():
     
     print_info("React client is starting...")
     
-    # Function to read and print client output
-    def monitor_client_output():
-        for line in client_process.stdout:
-            print(f"[CLIENT] {line.strip()}")
-    
     # Start a thread to monitor client output
-    threading.Thread(target=monitor_client_output, daemon=True).start()
-    
-    # Wait for the client to start
-    time.sleep(5)
+    threading.Thread(target=monitor_output, args=(client_process, "CLIENT"), daemon=True).start()
+    
+    # Wait until the dev server answers rather than for a fixed time
+    deadline = time.monotonic() + ready_timeout
+    while url_ready(CLIENT_URL) is None:
+        if client_process.poll() is not None:
+            print_error(f"React client exited with code {client_process.returncode}")
+            return None
+        if time.monotonic() > deadline:
+            print_warning(f"React client did not answer at {CLIENT_URL} within {ready_timeout:.0f}s")
+            return client_process
+        time.sleep(READY_POLL_INTERVAL)
     print_success("React client started")
     
     return client_process
@@ -176,7 +253,7 @@ def start_client():
 def open_browser():
     print_header("Opening web browser")
     
-    client_url = "http://localhost:3000"
+    client_url = CLIENT_URL
     print_info(f"Opening {client_url} in default browser")
     
     # Open the client URL in the default browser
@@ -184,8 +261,24 @@ def open_browser():
     
     print_success("Browser opened")
 
+# Main function
+def parse_args():
+    parser = argparse.ArgumentParser(description='Start the Waste Segregation Application')
+    parser.add_argument('--workers', type=int, default=int(os.environ.get('SERVER_WORKERS', '1')),
+                        help='Flask server worker processes sharing the API port')
+    parser.add_argument('--ready-timeout', type=float, default=300,
+                        help='Seconds to wait for the server workers and the client to answer')
+    parser.add_argument('--server-only', action='store_true',
+                        help="Only run the API server, without the React client or browser")
+    return parser.parse_args()
+
+def stop_on_sigterm(signum, frame):
+    # Shut down the same way as Ctrl+C when a service manager stops us
+    raise KeyboardInterrupt
+
 # Main function
 def main():
+    args = parse_args()
     print_header("Starting Waste Segregation Application")
     
     # Check if required directories exist
@@ -197,41 +290,46 @@ def main():
     if not check_python_packages():
         print_warning("Some required packages are missing. The application may not work correctly.")
     
-    # Start the Flask server
-    server_process = start_server()
-    if not server_process:
-        print_error("Failed to start Flask server. Exiting.")
-        return
-    
-    # Start the React client
-    client_process = start_client()
-    if not client_process:
-        print_error("Failed to start React client. Stopping server.")
-        server_process.terminate()
-        return
+    signal.signal(signal.SIGTERM, stop_on_sigterm)
     
-    # Open the web browser
-    open_browser()
+    # Start the Flask server
+    server = start_server(max(1, args.workers), args.ready_timeout)
+    
+    client_process = None
+    if not args.server_only:
+        # Start the React client
+        client_process = start_client(args.ready_timeout)
+        if not client_process:
+            print_error("Failed to start React client. Stopping server.")
+            server.stop()
+            return
+        
+        # Open the web browser
+        open_browser()
     
     print_header("Application started successfully")
     print_info("Press Ctrl+C to stop all processes and exit")
     
     try:
-        # Keep the script running
-        while True:
+        # Keep the script running; prefork.py replaces crashed workers
+        while server.process.poll() is None:
             time.sleep(1)
+        print_error(f"Flask server exited with code {server.process.returncode}")
     except KeyboardInterrupt:
-        print_header("Stopping application")
-        
-        # Stop the client process
+        pass
+    
+    print_header("Stopping application")
+    
+    # Stop the client process
+    if client_process is not None:
         print_info("Stopping React client...")
         client_process.terminate()
-        
-        # Stop the server process
-        print_info("Stopping Flask server...")
-        server_process.terminate()
-        
-        print_success("All processes stopped")
+    
+    # Stop the server and its workers
+    print_info("Stopping Flask server...")
+    server.stop()
+    
+    print_success("All processes stopped")
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Fallback Model Training
+-----------------------
+Trains the lightweight colour/texture model the server uses when TensorFlow is
+not installed. Features are extracted from the dataset with a process pool and
+a softmax linear model is fitted and saved as a NumPy .npz file.
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+from multiprocessing import Pool
+
+import numpy as np
+
+# Add server directory to path so we can import the feature_model module
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'server'))
+
+from feature_model import FeatureModelClassifier, extract_features, load_thumbnails
+from colour_fallback import list_images
+
+DEFAULT_OUTPUT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'models', 'fallback_model.npz')
+CHUNK_SIZE = 256
+# Test images classified from their files to time the end-to-end rate
+END_TO_END_SAMPLE = 1000
+
+
+def _extract_chunk(paths):
+    """Worker: extract features for a chunk of paths, skipping unreadable files"""
+    good, rgb, hsv = [], [], []
+    for i, path in enumerate(paths):
+        try:
+            thumbnail, thumbnail_hsv = load_thumbnails(path)
+        except Exception:
+            continue
+        good.append(i)
+        rgb.append(thumbnail)
+        hsv.append(thumbnail_hsv)
+    if not good:
+        return good, None
+    return good, extract_features(np.stack(rgb), np.stack(hsv))
+
+
+def extract_dataset(paths, labels, workers):
+    """Extract features for all paths in parallel; returns (features, labels)"""
+    chunks = [paths[i:i + CHUNK_SIZE] for i in range(0, len(paths), CHUNK_SIZE)]
+    features, kept_labels = [], []
+    with Pool(workers) as pool:
+        for chunk_index, (good, chunk_features) in enumerate(pool.imap(_extract_chunk, chunks)):
+            if chunk_features is None:
+                continue
+            offset = chunk_index * CHUNK_SIZE
+            features.append(chunk_features)
+            kept_labels.extend(labels[offset + i] for i in good)
+            print(f"\rExtracted {min(offset + CHUNK_SIZE, len(paths))}/{len(paths)} images", end='')
+    print()
+    return np.concatenate(features), np.array(kept_labels)
+
+
+def main():
+    """Main function to train and evaluate the fallback model"""
+    parser = argparse.ArgumentParser(description='Train the lightweight fallback classifier')
+    parser.add_argument('--train_dir', type=str, default='DATASET/TRAIN', help='Directory containing training data')
+    parser.add_argument('--test_dir', type=str, default='DATASET/TEST', help='Directory containing test data')
+    parser.add_argument('--output', type=str, default=DEFAULT_OUTPUT, help='Path of the saved .npz model')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Feature extraction processes')
+    parser.add_argument('--limit', type=int, default=None, help='Maximum images per category')
+    parser.add_argument('--epochs', type=int, default=500, help='Gradient descent iterations')
+
+    args = parser.parse_args()
+
+    print("Extracting training features...")
+    paths, labels = list_images(args.train_dir, args.limit)
+    if not paths:
+        print(f"Error: no images found under {args.train_dir}")
+        sys.exit(1)
+    train_x, train_y = extract_dataset(paths, labels, args.workers)
+
+    print("Fitting model...")
+    start = time.perf_counter()
+    model = FeatureModelClassifier.fit(train_x, train_y, epochs=args.epochs)
+    print(f"Fitted on {len(train_y)} images in {time.perf_counter() - start:.2f}s")
+
+    train_accuracy = float(np.mean(np.array(model.classes)[model.predict_proba(train_x).argmax(axis=1)] == train_y))
+    metrics = {"trainAccuracy": train_accuracy, "classes": model.classes}
+
+    test_paths, test_labels = list_images(args.test_dir)
+    if test_paths:
+        print("Evaluating on test set...")
+        test_x, test_y = extract_dataset(test_paths, test_labels, args.workers)
+        predicted = np.array(model.classes)[model.predict_proba(test_x).argmax(axis=1)]
+        metrics["testAccuracy"] = float(np.mean(predicted == test_y))
+
+        # Single-core throughput of the model alone, on precomputed features
+        start = time.perf_counter()
+        model.classify_features(test_x)
+        metrics["classifyImagesPerSec"] = round(len(test_x) / (time.perf_counter() - start), 1)
+
+        # Single-core throughput as the server sees it: decode, features and model
+        sample = test_paths[:END_TO_END_SAMPLE]
+        start = time.perf_counter()
+        model.classify(sample)
+        metrics["endToEndImagesPerSec"] = round(len(sample) / (time.perf_counter() - start), 1)
+
+    model.save(args.output)
+
+    start = time.perf_counter()
+    FeatureModelClassifier.load(args.output)
+    metrics["loadMilliseconds"] = round((time.perf_counter() - start) * 1000, 2)
+
+    print(json.dumps(metrics, indent=4))
+    print(f"Model saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
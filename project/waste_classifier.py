@@ -8,7 +8,9 @@ A CNN-based model for classifying waste images into recyclable, biodegradable, a
 """
 
 import os
+import gzip
 import json
+import time
 import numpy as np
 import tensorflow as tf
 from tensorflow.keras import layers, models, optimizers
@@ -28,11 +30,16 @@ EPOCHS = 20
 NUM_CLASSES = 3  # Recyclable, Biodegradable, Non-recyclable
 CLASS_NAMES = ['Recyclable', 'Biodegradable', 'Non-recyclable']
 
-def build_model():
-    """Build and return the CNN model"""
+def build_model(alpha=1.0, image_size=IMAGE_SIZE):
+    """Build and return the CNN model
+    
+    A width multiplier (alpha) below 1.0 and a smaller image size give the
+    faster, less accurate model the server falls back to under load.
+    """
     # Use MobileNetV2 as base model (efficient and works well on mobile devices)
     base_model = MobileNetV2(
-        input_shape=(*IMAGE_SIZE, 3),
+        input_shape=(*image_size, 3),
+        alpha=alpha,
         include_top=False,
         weights='imagenet'
     )
@@ -58,7 +65,49 @@ def build_model():
     
     return model
 
-def prepare_data(train_dir, test_dir):
+def load_dataset_skips(data_dir):
+    """Absolute paths that scan_dataset.py marked as unusable for the dataset containing data_dir"""
+    root = os.path.dirname(os.path.abspath(data_dir))
+    try:
+        with open(os.path.join(root, 'manifest.json')) as f:
+            return {os.path.join(root, *path.split('/')) for path in json.load(f).get('skip', [])}
+    except (OSError, ValueError):
+        return set()
+
+def flow_from_directory(datagen, directory, image_size, shuffle=True):
+    """flow_from_directory, leaving out files the dataset manifest says to skip"""
+    directory = os.path.abspath(directory)
+    skips = {path for path in load_dataset_skips(directory) if path.startswith(directory + os.sep)}
+    if not skips:
+        return datagen.flow_from_directory(
+            directory,
+            target_size=image_size,
+            batch_size=BATCH_SIZE,
+            class_mode='categorical',
+            shuffle=shuffle
+        )
+    
+    import pandas as pd
+    classes = sorted(d for d in os.listdir(directory) if os.path.isdir(os.path.join(directory, d)))
+    rows = [
+        (os.path.join(directory, label, name), label)
+        for label in classes
+        for name in sorted(os.listdir(os.path.join(directory, label)))
+        if name.lower().endswith(('.jpg', '.jpeg', '.png', '.bmp')) and os.path.join(directory, label, name) not in skips
+    ]
+    print(f"Skipping {len(skips)} files listed in the dataset manifest under {directory}")
+    return datagen.flow_from_dataframe(
+        pd.DataFrame(rows, columns=['filename', 'class']),
+        x_col='filename',
+        y_col='class',
+        classes=classes,
+        target_size=image_size,
+        batch_size=BATCH_SIZE,
+        class_mode='categorical',
+        shuffle=shuffle
+    )
+
+def prepare_data(train_dir, test_dir, image_size=IMAGE_SIZE):
     """Prepare data generators for training and testing"""
     # Data augmentation for training
     train_datagen = ImageDataGenerator(
@@ -72,29 +121,19 @@ def prepare_data(train_dir, test_dir):
         fill_mode='nearest'
     )
     
+    # Training generator
+    train_generator = flow_from_directory(train_datagen, train_dir, image_size)
+    
+    return train_generator, prepare_test_data(test_dir, image_size)
+
+def prepare_test_data(test_dir, image_size=IMAGE_SIZE):
+    """Unshuffled, unaugmented generator for evaluation"""
     # Only rescaling for validation/test data
     test_datagen = ImageDataGenerator(
         preprocessing_function=preprocess_input
     )
     
-    # Training generator
-    train_generator = train_datagen.flow_from_directory(
-        train_dir,
-        target_size=IMAGE_SIZE,
-        batch_size=BATCH_SIZE,
-        class_mode='categorical'
-    )
-    
-    # Test generator
-    test_generator = test_datagen.flow_from_directory(
-        test_dir,
-        target_size=IMAGE_SIZE,
-        batch_size=BATCH_SIZE,
-        class_mode='categorical',
-        shuffle=False
-    )
-    
-    return train_generator, test_generator
+    return flow_from_directory(test_datagen, test_dir, image_size, shuffle=False)
 
 def train_model(model, train_generator, test_generator, output_dir):
     """Train the model and save it"""
@@ -221,20 +260,303 @@ def save_model_for_web(model, output_dir):
         print(f"Warning: Could not convert model to TensorFlow.js format. Error: {e}")
         print("You can manually convert the model later using the tensorflowjs_converter command.")
 
+class Distiller(models.Model):
+    """Trains a student to match a teacher's softened predictions as well as the labels
+    
+    Batches arrive at the teacher's input size and are resized for the student,
+    so one data pipeline serves both models.
+    """
+    
+    def __init__(self, student, teacher, temperature=4.0, distill_weight=0.9):
+        super().__init__()
+        self.student = student
+        self.teacher = teacher
+        self.temperature = temperature
+        self.distill_weight = distill_weight
+        self.student_size = student.input_shape[1:3]
+        self.label_loss = tf.keras.losses.CategoricalCrossentropy()
+        self.distill_loss = tf.keras.losses.KLDivergence()
+    
+    def _soften(self, probabilities):
+        # Both models end in softmax, so log-probabilities stand in for logits
+        return tf.nn.softmax(tf.math.log(probabilities + 1e-7) / self.temperature)
+    
+    def call(self, x, training=False):
+        return self.student(tf.image.resize(x, self.student_size), training=training)
+    
+    def train_step(self, data):
+        x, y = data
+        teacher_probs = self.teacher(x, training=False)
+        
+        with tf.GradientTape() as tape:
+            student_probs = self(x, training=True)
+            label_loss = self.label_loss(y, student_probs)
+            distill_loss = self.distill_loss(self._soften(teacher_probs), self._soften(student_probs))
+            # T^2 keeps the soft-target gradients on the same scale as the label loss
+            loss = ((1 - self.distill_weight) * label_loss
+                    + self.distill_weight * distill_loss * self.temperature ** 2)
+        
+        variables = self.student.trainable_variables
+        self.optimizer.apply_gradients(zip(tape.gradient(loss, variables), variables))
+        
+        self.compiled_metrics.update_state(y, student_probs)
+        return dict({m.name: m.result() for m in self.metrics}, loss=loss, distill_loss=distill_loss)
+    
+    def test_step(self, data):
+        x, y = data
+        student_probs = self(x, training=False)
+        self.compiled_metrics.update_state(y, student_probs)
+        return dict({m.name: m.result() for m in self.metrics}, loss=self.label_loss(y, student_probs))
+
+def count_flops(model):
+    """Floating point operations for one forward pass, or None if TensorFlow can't profile it"""
+    try:
+        from tensorflow.python.framework.convert_to_constants import convert_variables_to_constants_v2
+        spec = tf.TensorSpec([1, *model.input_shape[1:]], tf.float32)
+        frozen = convert_variables_to_constants_v2(tf.function(model).get_concrete_function(spec))
+        options = tf.compat.v1.profiler.ProfileOptionBuilder.float_operation()
+        options['output'] = 'none'
+        info = tf.compat.v1.profiler.profile(
+            graph=frozen.graph, run_meta=tf.compat.v1.RunMetadata(), cmd='op', options=options
+        )
+        return int(info.total_float_ops)
+    except Exception as e:
+        print(f"Warning: could not count FLOPs: {e}")
+        return None
+
+def model_report(model_path, test_dir, latency_runs=50, custom_objects=None):
+    """Size on disk, load time, single-image latency, FLOPs and test accuracy of a saved model"""
+    start = time.perf_counter()
+    model = tf.keras.models.load_model(model_path, custom_objects=custom_objects)
+    load_seconds = time.perf_counter() - start
+    
+    image_size = tuple(model.input_shape[1:3])
+    sample = np.zeros((1, *image_size, 3), dtype=np.float32)
+    model.predict(sample, verbose=0)
+    start = time.perf_counter()
+    for _ in range(latency_runs):
+        model.predict(sample, verbose=0)
+    latency = (time.perf_counter() - start) / latency_runs
+    
+    test_generator = prepare_test_data(test_dir, image_size)
+    predictions = model.predict(test_generator, verbose=0)
+    accuracy = float(np.mean(np.argmax(predictions, axis=1) == test_generator.classes))
+    
+    return {
+        'path': model_path,
+        'image_size': image_size[0],
+        'parameters': int(model.count_params()),
+        'size_mb': round(os.path.getsize(model_path) / 1e6, 2),
+        # Pruned and clustered weights only pay off once the file is compressed
+        'gzip_mb': round(gzipped_size(model_path) / 1e6, 2),
+        'load_seconds': round(load_seconds, 3),
+        'latency_ms': round(latency * 1000, 3),
+        'flops': count_flops(model),
+        'accuracy': round(accuracy, 4),
+    }
+
+def gzipped_size(path):
+    """Size in bytes of the file after gzip compression"""
+    with open(path, 'rb') as f:
+        return len(gzip.compress(f.read()))
+
+def print_comparison(reports):
+    """Print model reports side by side, relative to the first one"""
+    baseline = reports[0][1]
+    print(f"\n{'model':<12} {'accuracy':>9} {'size MB':>9} {'gzip MB':>9} {'load s':>8} "
+          f"{'latency ms':>11} {'MFLOPs':>9} {'speedup':>8}")
+    for name, report in reports:
+        mflops = f"{report['flops'] / 1e6:.1f}" if report['flops'] else 'n/a'
+        speedup = baseline['latency_ms'] / report['latency_ms'] if report['latency_ms'] else 0
+        print(f"{name:<12} {report['accuracy']:>9.4f} {report['size_mb']:>9.2f} {report['gzip_mb']:>9.2f} "
+              f"{report['load_seconds']:>8.2f} {report['latency_ms']:>11.2f} {mflops:>9} {speedup:>7.2f}x")
+
+def distill_model(teacher_path, train_dir, test_dir, output_dir, alpha, image_size,
+                  temperature=4.0, distill_weight=0.9):
+    """Train a compact student against a trained teacher and compare the two"""
+    os.makedirs(output_dir, exist_ok=True)
+    
+    teacher = tf.keras.models.load_model(teacher_path)
+    teacher.trainable = False
+    teacher_size = tuple(teacher.input_shape[1:3])
+    
+    # Batches are produced at the teacher's resolution and downsized for the student
+    train_generator, test_generator = prepare_data(train_dir, test_dir, teacher_size)
+    
+    student = build_model(alpha, image_size)
+    distiller = Distiller(student, teacher, temperature, distill_weight)
+    distiller.compile(optimizer=optimizers.Adam(learning_rate=0.001), metrics=['accuracy'])
+    
+    distiller.fit(
+        train_generator,
+        epochs=EPOCHS,
+        validation_data=test_generator,
+        callbacks=[EarlyStopping(monitor='val_accuracy', patience=5, restore_best_weights=True)]
+    )
+    
+    student_path = os.path.join(output_dir, 'waste_classifier_student.h5')
+    student.save(student_path)
+    print(f"Student model saved to {student_path}")
+    
+    reports = [
+        ('teacher', model_report(teacher_path, test_dir)),
+        ('student', model_report(student_path, test_dir)),
+    ]
+    print_comparison(reports)
+    
+    report = {
+        'temperature': temperature,
+        'distill_weight': distill_weight,
+        'student_alpha': alpha,
+        **dict(reports),
+    }
+    with open(os.path.join(output_dir, 'distillation_report.json'), 'w') as f:
+        json.dump(report, f, indent=4)
+    
+    return student, report
+
+def map_layers(model, fn):
+    """Rebuild a Sequential model with fn applied to the nested backbone and each Dense layer
+    
+    The model optimization toolkit can't wrap a model nested inside another, so
+    the MobileNetV2 backbone is wrapped as a model of its own. Stripping the
+    wrappers afterwards does handle nesting and is applied to the whole model.
+    """
+    rebuilt = []
+    for layer in model.layers:
+        if isinstance(layer, (models.Model, layers.Dense)):
+            rebuilt.append(fn(layer))
+        else:
+            rebuilt.append(layer)
+    return models.Sequential(rebuilt)
+
+def fine_tune(model, train_generator, test_generator, epochs, callbacks=()):
+    """Short low learning rate fine-tuning of every layer"""
+    for layer in model.layers:
+        layer.trainable = True
+    model.compile(
+        optimizer=optimizers.Adam(learning_rate=1e-4),
+        loss='categorical_crossentropy',
+        metrics=['accuracy']
+    )
+    model.fit(train_generator, epochs=epochs, validation_data=test_generator, callbacks=list(callbacks))
+    return model
+
+def optimize_model(model_path, train_dir, test_dir, output_dir, sparsity=0.5, structured=False,
+                   clusters=16, finetune_epochs=2):
+    """Prune, then cluster, a trained model with short fine-tuning after each step"""
+    try:
+        import tensorflow_model_optimization as tfmot
+    except ImportError:
+        print("Error: model optimisation needs tensorflow-model-optimization (pip install tensorflow-model-optimization)")
+        return None
+    
+    os.makedirs(output_dir, exist_ok=True)
+    model = tf.keras.models.load_model(model_path)
+    image_size = tuple(model.input_shape[1:3])
+    train_generator, test_generator = prepare_data(train_dir, test_dir, image_size)
+    steps = max(1, len(train_generator) * finetune_epochs)
+    
+    # Magnitude pruning ramps sparsity up over fine-tuning; 2:4 pruning zeroes
+    # two of every four weights, which sparse kernels can skip outright
+    if structured:
+        prune_params = {'sparsity_m_by_n': (2, 4)}
+    else:
+        prune_params = {'pruning_schedule': tfmot.sparsity.keras.PolynomialDecay(
+            initial_sparsity=0.0, final_sparsity=sparsity, begin_step=0, end_step=steps
+        )}
+    pruned = map_layers(model, lambda layer: tfmot.sparsity.keras.prune_low_magnitude(layer, **prune_params))
+    
+    print(f"Fine-tuning pruned model ({'2:4 structured' if structured else f'{sparsity:.0%} magnitude'})...")
+    fine_tune(pruned, train_generator, test_generator, finetune_epochs,
+              [tfmot.sparsity.keras.UpdatePruningStep()])
+    pruned = tfmot.sparsity.keras.strip_pruning(pruned)
+    pruned_path = os.path.join(output_dir, 'waste_classifier_pruned.h5')
+    pruned.save(pruned_path, include_optimizer=False)
+    
+    # Weight clustering shares a few centroid values per layer and keeps the zeros
+    Centroids = tfmot.clustering.keras.CentroidInitialization
+    cluster_params = {
+        'number_of_clusters': clusters,
+        'cluster_centroids_init': Centroids.KMEANS_PLUS_PLUS,
+        'preserve_sparsity': True,
+    }
+    clustered = map_layers(pruned, lambda layer: tfmot.clustering.keras.cluster_weights(layer, **cluster_params))
+    
+    print(f"Fine-tuning clustered model ({clusters} clusters)...")
+    fine_tune(clustered, train_generator, test_generator, finetune_epochs)
+    clustered = tfmot.clustering.keras.strip_clustering(clustered)
+    clustered_path = os.path.join(output_dir, 'waste_classifier_optimized.h5')
+    clustered.save(clustered_path, include_optimizer=False)
+    print(f"Optimised model saved to {clustered_path}")
+    
+    reports = [
+        ('baseline', model_report(model_path, test_dir)),
+        ('pruned', model_report(pruned_path, test_dir)),
+        ('clustered', model_report(clustered_path, test_dir)),
+    ]
+    print_comparison(reports)
+    
+    report = {
+        'sparsity': '2:4' if structured else sparsity,
+        'clusters': clusters,
+        'finetune_epochs': finetune_epochs,
+        **dict(reports),
+    }
+    with open(os.path.join(output_dir, 'optimization_report.json'), 'w') as f:
+        json.dump(report, f, indent=4)
+    
+    return report
+
 def main():
     """Main function to train and evaluate the model"""
     parser = argparse.ArgumentParser(description='Train a waste classification model')
     parser.add_argument('--train_dir', type=str, required=True, help='Directory containing training data')
     parser.add_argument('--test_dir', type=str, required=True, help='Directory containing test data')
     parser.add_argument('--output_dir', type=str, default='./model_output', help='Directory to save model and results')
+    parser.add_argument('--alpha', type=float,
+                        help='MobileNetV2 width multiplier (0.35, 0.5, 0.75 or 1.0); smaller is faster. '
+                             'Default 1.0, or 0.35 when distilling')
+    parser.add_argument('--image_size', type=int,
+                        help='Square input size (96, 128, 160, 192 or 224). Default 224, or 128 when distilling')
+    parser.add_argument('--distill_from', type=str,
+                        help='Trained teacher model (.h5); trains a compact student against it instead')
+    parser.add_argument('--temperature', type=float, default=4.0, help='Distillation softmax temperature')
+    parser.add_argument('--distill_weight', type=float, default=0.9,
+                        help='Weight of the teacher loss versus the label loss when distilling')
+    
+    parser.add_argument('--optimize', type=str,
+                        help='Trained model (.h5) to prune and cluster instead of training a new one')
+    parser.add_argument('--sparsity', type=float, default=0.5, help='Target fraction of zero weights when pruning')
+    parser.add_argument('--structured', action='store_true', help='Use 2:4 structured pruning instead of magnitude')
+    parser.add_argument('--clusters', type=int, default=16, help='Weight clusters per layer')
+    parser.add_argument('--finetune_epochs', type=int, default=2, help='Fine-tuning epochs after each step')
     
     args = parser.parse_args()
     
+    if args.optimize:
+        print(f"Optimising {args.optimize}...")
+        report = optimize_model(args.optimize, args.train_dir, args.test_dir, args.output_dir,
+                                args.sparsity, args.structured, args.clusters, args.finetune_epochs)
+        if report is not None:
+            print(f"\nOptimisation completed successfully! All outputs saved to: {args.output_dir}")
+        return
+    
+    if args.distill_from:
+        alpha = args.alpha or 0.35
+        image_size = (args.image_size or 128,) * 2
+        print(f"Distilling a MobileNetV2 (alpha={alpha}) at {image_size[0]}px from {args.distill_from}...")
+        distill_model(args.distill_from, args.train_dir, args.test_dir, args.output_dir, alpha, image_size,
+                      args.temperature, args.distill_weight)
+        print(f"\nDistillation completed successfully! All outputs saved to: {args.output_dir}")
+        return
+    
     print("Preparing data...")
-    train_generator, test_generator = prepare_data(args.train_dir, args.test_dir)
+    image_size = (args.image_size or IMAGE_SIZE[0],) * 2
+    train_generator, test_generator = prepare_data(args.train_dir, args.test_dir, image_size)
     
     print("Building model...")
-    model = build_model()
+    model = build_model(args.alpha or 1.0, image_size)
     
     print("Training model...")
     history, model = train_model(model, train_generator, test_generator, args.output_dir)